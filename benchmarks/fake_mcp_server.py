@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+"""
+Fake MCP Server
+stdio MCP tool server that answers any tool after a configurable delay
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+from typing import Any, Dict
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from stdio_server import serve_stdio
+
+
+def make_handler(latency: float, size: int):
+    payload = "x" * size
+
+    async def handle_request(request: Dict[str, Any]) -> Dict[str, Any]:
+        method = request.get("method")
+        if method == "tools/list":
+            return {"result": {"tools": [{"name": "echo", "description": "Answers any tool name",
+                                          "inputSchema": {"type": "object", "properties": {}}}]}}
+        if method == "tools/call":
+            await asyncio.sleep(latency)
+            name = (request.get("params") or {}).get("name")
+            return {"result": {"content": [{"type": "text", "text": f"{name} ok {payload}"}]}}
+        return {"error": {"code": -32601, "message": "Method not found"}}
+
+    return handle_request
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve a fake MCP tool server on stdio")
+    parser.add_argument("--latency", type=float, default=0.01, help="Seconds per tool call")
+    parser.add_argument("--size", type=int, default=256, help="Bytes of filler in each tool result")
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve_stdio(make_handler(args.latency, args.size)))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Fake Ollama
+Local stand-in for the Ollama HTTP API with configurable latency and token rate
+"""
+
+import argparse
+import asyncio
+import json
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Optional
+
+from aiohttp import web
+
+
+class FakeOllama:
+    """Answers /api/generate, /api/chat, /api/tags and /api/ps like Ollama does
+
+    `latency` is the time to the first token (prompt evaluation), after which
+    `tokens` tokens are emitted at `tokens_per_second`. `parallel` caps the
+    requests generating at once the way OLLAMA_NUM_PARALLEL does (0 = no cap).
+    """
+
+    def __init__(self, latency: float = 0.05, tokens_per_second: float = 100, tokens: int = 40,
+                 parallel: int = 0, model: str = "qwen:0.5b"):
+        self.latency = latency
+        self.tokens_per_second = tokens_per_second
+        self.tokens = tokens
+        self.model = model
+        self.requests = 0
+        self._slots = asyncio.Semaphore(parallel) if parallel > 0 else None
+        self._runner: Optional[web.AppRunner] = None
+        self.url = ""
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post("/api/generate", self._generate)
+        app.router.add_post("/api/chat", self._chat)
+        app.router.add_get("/api/tags", self._tags)
+        app.router.add_get("/api/ps", self._ps)
+        return app
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        """Start serving; port 0 picks a free one. Returns the base URL"""
+        self._runner = web.AppRunner(self.app(), access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.url = f"http://{host}:{port}"
+        return self.url
+
+    async def close(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    def _token(self, index: int) -> str:
+        return f"tok{index} "
+
+    def _final(self, started: float) -> Dict[str, Any]:
+        # Real Ollama reports durations in nanoseconds
+        return {"done": True, "eval_count": self.tokens,
+                "eval_duration": int(self.tokens / self.tokens_per_second * 1e9),
+                "total_duration": int((time.perf_counter() - started) * 1e9)}
+
+    async def _respond(self, request: web.Request, wrap) -> web.StreamResponse:
+        body = await request.json()
+        self.requests += 1
+        if not body.get("prompt") and "messages" not in body:
+            # Empty prompt: a model load, as sent by the model warmer
+            return web.json_response({"model": body.get("model"), "response": "", "done": True})
+        if self._slots is not None:
+            await self._slots.acquire()
+        try:
+            started = time.perf_counter()
+            await asyncio.sleep(self.latency)
+            interval = 1 / self.tokens_per_second
+            if not body.get("stream", True):
+                await asyncio.sleep(self.tokens * interval)
+                text = "".join(self._token(i) for i in range(self.tokens))
+                return web.json_response({**wrap(text), **self._final(started)})
+            response = web.StreamResponse(headers={"Content-Type": "application/x-ndjson"})
+            await response.prepare(request)
+            first_token = time.perf_counter()
+            for index in range(self.tokens):
+                await response.write((json.dumps({**wrap(self._token(index)), "done": False}) + "\n").encode())
+                # Pace against the schedule, not the previous sleep, so timer slack doesn't add up
+                await asyncio.sleep(max(0.0, first_token + (index + 1) * interval - time.perf_counter()))
+            await response.write((json.dumps({**wrap(""), **self._final(started)}) + "\n").encode())
+            await response.write_eof()
+            return response
+        finally:
+            if self._slots is not None:
+                self._slots.release()
+
+    async def _generate(self, request: web.Request) -> web.StreamResponse:
+        return await self._respond(request, lambda text: {"model": self.model, "response": text})
+
+    async def _chat(self, request: web.Request) -> web.StreamResponse:
+        return await self._respond(request, lambda text: {
+            "model": self.model, "message": {"role": "assistant", "content": text}})
+
+    async def _tags(self, request: web.Request) -> web.Response:
+        return web.json_response({"models": [{"name": self.model}]})
+
+    async def _ps(self, request: web.Request) -> web.Response:
+        expires = (datetime.now(timezone.utc) + timedelta(minutes=30)).isoformat()
+        return web.json_response({"models": [{"name": self.model, "size_vram": 2**30, "expires_at": expires}]})
+
+
+async def _serve(args: argparse.Namespace):
+    fake = FakeOllama(args.latency, args.tokens_per_second, args.tokens, args.parallel, args.model)
+    url = await fake.start(args.host, args.port)
+    print(f"Fake Ollama on {url} (first token {args.latency}s, {args.tokens} tokens at {args.tokens_per_second}/s)")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await fake.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve a fake Ollama API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11434)
+    parser.add_argument("--latency", type=float, default=0.05, help="Seconds to the first token")
+    parser.add_argument("--tokens-per-second", type=float, default=100)
+    parser.add_argument("--tokens", type=int, default=40, help="Tokens per answer")
+    parser.add_argument("--parallel", type=int, default=0, help="Concurrent generations (0 = unlimited)")
+    parser.add_argument("--model", default="qwen:0.5b")
+    try:
+        asyncio.run(_serve(parser.parse_args()))
+    except KeyboardInterrupt:
+        pass
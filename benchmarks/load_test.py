@@ -0,0 +1,364 @@
+#!/usr/bin/env python3
+"""
+Offline Load Test
+Drives DiscordBot.process_message and DiscordLLMIntegration.handle_request with synthetic
+traffic against a fake Ollama and fake MCP servers; reports throughput, latency and event-loop lag
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_ollama import FakeOllama
+
+DEFAULT_SCENARIOS = ("bot_command", "bot_ask", "mcp_ask", "mcp_target", "mcp_scan")
+
+
+class FakeMessage:
+    def __init__(self, channel: "FakeChannel", content: str = ""):
+        self.channel = channel
+        self.content = content
+        self.edits = 0
+
+    async def edit(self, content: str = ""):
+        self.content = content
+        self.edits += 1
+
+
+class FakeTyping:
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+class FakeChannel:
+    """Records what the bot sends; errors are messages starting with ❌"""
+
+    def __init__(self, channel_id: int):
+        self.id = channel_id
+        self.sent = 0
+        self.errors = 0
+
+    async def send(self, content: str = "", **kwargs) -> FakeMessage:
+        self.sent += 1
+        if content.startswith("❌"):
+            self.errors += 1
+        return FakeMessage(self, content)
+
+    def typing(self) -> FakeTyping:
+        return FakeTyping()
+
+
+class FakeUser:
+    def __init__(self, user_id: int):
+        self.id = user_id
+
+
+class SyntheticMessage:
+    def __init__(self, content: str, author: FakeUser, channel: FakeChannel):
+        self.content = content
+        self.author = author
+        self.channel = channel
+        # Like a DM; guild-scoped target context is exercised through mcp_target
+        self.guild = None
+
+
+def _percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class LoopLagMonitor:
+    """Samples how late a short sleep wakes up; a busy or blocked loop shows up as lag"""
+
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self.samples: List[float] = []
+        self._task: Optional[asyncio.Task] = None
+
+    async def _run(self):
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            self.samples.append(max(0.0, time.perf_counter() - start - self.interval))
+
+    def start(self):
+        self.samples = []
+        self._task = asyncio.ensure_future(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+
+
+def _mcp_text(result: Dict[str, Any]) -> str:
+    content = (result.get("result") or {}).get("content") or [{}]
+    return content[0].get("text", "")
+
+
+def _mcp_failed(result: Dict[str, Any]) -> bool:
+    return "error" in result or _mcp_text(result).startswith("❌")
+
+
+class Harness:
+    """A fresh DiscordBot wired to the fake backends"""
+
+    def __init__(self, args: argparse.Namespace):
+        from discord_bot import DiscordBot
+        from mcp_session import MCPSessionPool
+        self.args = args
+        self.bot = DiscordBot()
+        self.integration = self.bot.integration
+        fake_server = [sys.executable, "-u", os.path.join(os.path.dirname(os.path.abspath(__file__)), "fake_mcp_server.py"),
+                       "--latency", str(args.mcp_latency), "--size", str(args.mcp_size)]
+        self.integration.mcp_sessions = MCPSessionPool({name: fake_server for name in self.integration.mcp_servers})
+        self.integration.streamer = self.bot.stream_ask
+        self.channels = [FakeChannel(1000 + i) for i in range(args.channels)]
+        self.users = [FakeUser(5000 + i) for i in range(args.users)]
+        # Job progress goes to the fake channels instead of a Discord lookup
+        self.integration.notifier = self.notify
+        for channel in self.channels:
+            self.integration.contexts.set("channel", "", str(channel.id), target=f"scan{channel.id}.example.com")
+
+    async def notify(self, channel_id: str, text: str):
+        await self.channels[int(channel_id) - 1000].send(text)
+
+    def message(self, content: str, index: int) -> SyntheticMessage:
+        return SyntheticMessage(content, self.users[index % len(self.users)], self.channels[index % len(self.channels)])
+
+    @property
+    def channel_errors(self) -> int:
+        return sum(channel.errors for channel in self.channels)
+
+    async def close(self):
+        await self.bot.outbox.close()
+        await self.integration.close()
+
+
+async def _bot_command(harness: Harness, index: int) -> bool:
+    content = ("!help", "!jobs", "!reset", "!result")[index % 4]
+    await harness.bot.process_message(harness.message(content, index))
+    return True
+
+
+async def _bot_ask(harness: Harness, index: int) -> bool:
+    # Unique questions so every request reaches the (fake) model instead of the answer cache
+    await harness.bot.process_message(harness.message(f"!ask benchmark question {index}", index))
+    return True
+
+
+async def _mcp_ask(harness: Harness, index: int) -> bool:
+    result = await harness.integration.handle_request({
+        "method": "tools/call",
+        "params": {"name": "ask_llm", "arguments": {
+            "question": f"benchmark question {index}",
+            "user_id": str(5000 + index % harness.args.users),
+            "channel_id": str(1000 + index % harness.args.channels)}}
+    })
+    return not _mcp_failed(result)
+
+
+async def _mcp_target(harness: Harness, index: int) -> bool:
+    # !target over the MCP interface: a target context update, spread over the channels
+    result = await harness.integration.handle_request({
+        "method": "tools/call",
+        "params": {"name": "discord_command", "arguments": {
+            "user_id": str(5000 + index % harness.args.users), "command": "!target",
+            "args": [f"host{index}.example.com"], "channel_id": str(1000 + index % harness.args.channels)}}
+    })
+    return not _mcp_failed(result)
+
+
+async def _mcp_scan(harness: Harness, index: int) -> bool:
+    # !scan recon over the MCP interface, timed until the job's tool call through MCPSessionPool
+    # to the fake recon server has come back (so it includes the SCAN_WORKERS queue)
+    result = await harness.integration.handle_request({
+        "method": "tools/call",
+        "params": {"name": "discord_command", "arguments": {
+            "user_id": str(5000 + index % harness.args.users), "command": "!scan", "args": ["recon"],
+            "channel_id": str(1000 + index % harness.args.channels)}}
+    })
+    if _mcp_failed(result):
+        return False
+    job = harness.integration.jobs.get(_mcp_text(result).split("`")[1])
+    while job.status in ("queued", "running"):
+        await asyncio.sleep(0.001)
+    return job.status == "done" and not job.result_text().startswith("❌")
+
+
+SCENARIOS: Dict[str, Callable[[Harness, int], Awaitable[bool]]] = {
+    "bot_command": _bot_command,
+    "bot_ask": _bot_ask,
+    "mcp_ask": _mcp_ask,
+    "mcp_target": _mcp_target,
+    "mcp_scan": _mcp_scan
+}
+
+
+async def run_level(args: argparse.Namespace, scenario: str, concurrency: int) -> Dict[str, Any]:
+    """`args.requests` requests of one scenario with `concurrency` in flight"""
+    harness = Harness(args)
+    run_one = SCENARIOS[scenario]
+    try:
+        # Warm-up: spawn MCP servers, open connections, fill code paths
+        await asyncio.gather(*(run_one(harness, -1 - i) for i in range(min(concurrency, 4))))
+        errors_before = harness.channel_errors
+        latencies: List[float] = []
+        failures = 0
+        next_index = 0
+
+        async def worker():
+            nonlocal next_index, failures
+            while next_index < args.requests:
+                index = next_index
+                next_index += 1
+                start = time.perf_counter()
+                try:
+                    ok = await run_one(harness, index)
+                except Exception:
+                    ok = False
+                latencies.append(time.perf_counter() - start)
+                failures += not ok
+
+        monitor = LoopLagMonitor()
+        monitor.start()
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+        await monitor.stop()
+        errors = failures + harness.channel_errors - errors_before
+        return {
+            "scenario": scenario,
+            "concurrency": concurrency,
+            "requests": len(latencies),
+            "errors": errors,
+            "seconds": round(elapsed, 4),
+            "throughput_rps": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+            "latency_ms": {name: round(_percentile(latencies, q) * 1000, 2)
+                           for name, q in (("p50", 0.5), ("p90", 0.9), ("p99", 0.99), ("max", 1.0))},
+            "loop_lag_ms": {name: round(_percentile(monitor.samples, q) * 1000, 2)
+                            for name, q in (("p50", 0.5), ("p99", 0.99), ("max", 1.0))}
+        }
+    finally:
+        await harness.close()
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def _print_table(results: List[Dict[str, Any]], baseline: Optional[Dict[tuple, Dict[str, Any]]] = None):
+    header = f"{'scenario':<12} {'conc':>4} {'req/s':>9} {'p50 ms':>9} {'p99 ms':>9} {'lag p99':>8} {'errors':>6}"
+    print(header + ("   vs baseline" if baseline else ""))
+    for result in results:
+        line = (f"{result['scenario']:<12} {result['concurrency']:>4} {result['throughput_rps']:>9.1f} "
+                f"{result['latency_ms']['p50']:>9.1f} {result['latency_ms']['p99']:>9.1f} "
+                f"{result['loop_lag_ms']['p99']:>8.1f} {result['errors']:>6}")
+        old = (baseline or {}).get((result["scenario"], result["concurrency"]))
+        if old and old["throughput_rps"] and old["latency_ms"]["p99"]:
+            line += (f"   {result['throughput_rps'] / old['throughput_rps']:.2f}x req/s, "
+                     f"{result['latency_ms']['p99'] / old['latency_ms']['p99']:.2f}x p99")
+        print(line)
+
+
+async def main(args: argparse.Namespace) -> Dict[str, Any]:
+    fakes = [FakeOllama(args.latency, args.tokens_per_second, args.tokens, args.ollama_parallel)
+             for _ in range(args.ollama_nodes)]
+    urls = [await fake.start() for fake in fakes]
+    # Several nodes go through OllamaPool, one through the plain client
+    os.environ["OLLAMA_URLS" if len(urls) > 1 else "OLLAMA_URL"] = ",".join(urls)
+    results = []
+    try:
+        for scenario in args.scenarios:
+            for concurrency in args.concurrency:
+                result = await run_level(args, scenario, concurrency)
+                results.append(result)
+                print(f"  {scenario} x{concurrency}: {result['throughput_rps']} req/s, "
+                      f"p99 {result['latency_ms']['p99']}ms", file=sys.stderr)
+    finally:
+        for fake in fakes:
+            await fake.close()
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "config": {key: value for key, value in vars(args).items() if key not in ("output", "compare")},
+        "results": results
+    }
+
+
+def _configure_environment(args: argparse.Namespace):
+    """Settings that model Discord or operators, not this code, are switched off unless asked for"""
+    defaults = {
+        "LLM_CACHE_PATH": "",          # memory-only answer cache, nothing written to ~/.cache
+        "SHARED_STATE_PATH": ":memory:",  # same for targets, conversations and jobs
+        "OLLAMA_PRELOAD": "false",
+        "METRICS_PORT": "0",
+        "DOCKER_SOCKET": "/nonexistent"
+    }
+    if not args.discord_pacing:
+        defaults.update({"DISCORD_SEND_RATE": "1000000/1", "DISCORD_GLOBAL_RATE": "1000000/1",
+                         "DISCORD_MERGE_WINDOW": "0"})
+    for key, value in defaults.items():
+        os.environ.setdefault(key, value)
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Offline load test against fake Ollama and MCP backends")
+    parser.add_argument("--scenarios", nargs="+", default=list(DEFAULT_SCENARIOS), choices=list(SCENARIOS))
+    parser.add_argument("--concurrency", nargs="+", type=int, default=[1, 8, 32])
+    parser.add_argument("--requests", type=int, default=100, help="Measured requests per scenario and level")
+    parser.add_argument("--channels", type=int, default=16)
+    parser.add_argument("--users", type=int, default=64)
+    parser.add_argument("--latency", type=float, default=0.02, help="Fake Ollama seconds to first token")
+    parser.add_argument("--tokens-per-second", type=float, default=400)
+    parser.add_argument("--tokens", type=int, default=40)
+    parser.add_argument("--ollama-parallel", type=int, default=4, help="Fake Ollama concurrent generations")
+    parser.add_argument("--ollama-nodes", type=int, default=1,
+                        help="Fake Ollama servers; more than one are load-balanced through OLLAMA_URLS")
+    parser.add_argument("--mcp-latency", type=float, default=0.005, help="Fake MCP seconds per tool call")
+    parser.add_argument("--mcp-size", type=int, default=256)
+    parser.add_argument("--discord-pacing", action="store_true",
+                        help="Keep Discord rate limits and the merge window")
+    parser.add_argument("--output", help="Results JSON (default: benchmarks/results/<time>-<commit>.json)")
+    parser.add_argument("--compare", help="Earlier results JSON to compare against")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    arguments = parse_args()
+    _configure_environment(arguments)
+    report = asyncio.run(main(arguments))
+    baseline = None
+    if arguments.compare:
+        with open(arguments.compare) as f:
+            baseline = {(r["scenario"], r["concurrency"]): r for r in json.load(f)["results"]}
+    _print_table(report["results"], baseline)
+    output = arguments.output or os.path.join(
+        ROOT, "benchmarks", "results",
+        f"{datetime.now(timezone.utc):%Y%m%dT%H%M%SZ}-{report['commit'] or 'unknown'}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {output}")
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+Startup Benchmark
+Cold start of each MCP server (spawn to first tools/list response) plus a -X importtime report;
+fails when a server gets slower than the budget or starts importing heavy dependencies
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# (name, script, extra environment, modules that must not be imported at startup)
+SERVERS: List[Tuple[str, str, Dict[str, str], Tuple[str, ...]]] = [
+    ("discord_integration", "discord_integration.py", {"MODE": "mcp"}, ("discord", "aiohttp")),
+    ("target_config_service", "target_config_service.py", {}, ("discord", "aiohttp")),
+    ("integration_service", "integration_service.py", {}, ("discord", "aiohttp")),
+]
+
+# Interpreter plus asyncio and json: the floor every stdio server pays before any of our code runs
+FLOOR_SCRIPT = ("import asyncio, json, sys; sys.stdin.readline(); "
+                "sys.stdout.write(json.dumps({'jsonrpc': '2.0', 'id': 1, 'result': {}}) + '\\n'); sys.stdout.flush()")
+
+TOOLS_LIST = (json.dumps({"jsonrpc": "2.0", "id": 1, "method": "tools/list", "params": {}}) + "\n").encode()
+
+
+def _environment(workdir: str, extra: Dict[str, str]) -> Dict[str, str]:
+    env = dict(os.environ)
+    env.update({
+        "LLM_CACHE_PATH": os.path.join(workdir, "llm_cache.db"),
+        "SHARED_STATE_PATH": os.path.join(workdir, "shared_state.db"),
+        "METRICS_PORT": "0"
+    })
+    env.update(extra)
+    return env
+
+
+def cold_start(command: List[str], env: Dict[str, str]) -> float:
+    """Seconds from spawning the process to reading its tools/list response"""
+    started = time.perf_counter()
+    process = subprocess.Popen(command, cwd=ROOT, env=env, stdin=subprocess.PIPE,
+                               stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    try:
+        process.stdin.write(TOOLS_LIST)
+        process.stdin.flush()
+        while True:
+            line = process.stdout.readline()
+            if not line:
+                raise RuntimeError(f"{' '.join(command)} exited before answering tools/list")
+            try:
+                message = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if isinstance(message, dict) and message.get("id") == 1:
+                return time.perf_counter() - started
+    finally:
+        process.stdin.close()
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+
+
+def import_report(script: str, env: Dict[str, str], top: int) -> Dict[str, Any]:
+    """-X importtime for importing the server module: total, slowest modules and what got loaded"""
+    module = os.path.splitext(script)[0]
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"], cwd=ROOT, env=env,
+                            capture_output=True, text=True, timeout=120)
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        rows.append((name.strip(), int(self_us), int(cumulative_us)))
+    total = next((cumulative for name, _, cumulative in rows if name == module), 0)
+    slowest = sorted(rows, key=lambda row: -row[1])[:top]
+    return {
+        "import_ms": round(total / 1000, 2),
+        "slowest_self_ms": {name: round(self_us / 1000, 2) for name, self_us, _ in slowest},
+        "modules": {name.split(".")[0] for name, _, _ in rows}
+    }
+
+
+def run(args: argparse.Namespace) -> Dict[str, Any]:
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        floor_env = _environment(workdir, {})
+        floor = statistics.median(cold_start([sys.executable, "-c", FLOOR_SCRIPT], floor_env)
+                                  for _ in range(args.runs))
+        for name, script, extra, forbidden in SERVERS:
+            if args.servers and name not in args.servers:
+                continue
+            env = _environment(workdir, extra)
+            timings = [cold_start([sys.executable, "-u", script], env) for _ in range(args.runs)]
+            report = import_report(script, env, args.top)
+            median = statistics.median(timings)
+            results.append({
+                "server": name,
+                "cold_start_ms": round(median * 1000, 2),
+                "cold_start_min_ms": round(min(timings) * 1000, 2),
+                "over_floor_ms": round((median - floor) * 1000, 2),
+                "import_ms": report["import_ms"],
+                "slowest_imports_ms": report["slowest_self_ms"],
+                "forbidden_imported": sorted(set(forbidden) & report["modules"])
+            })
+    return {"floor_ms": round(floor * 1000, 2), "budget_ms": args.budget_ms, "absolute": args.absolute,
+            "python": sys.version.split()[0], "results": results}
+
+
+def check(report: Dict[str, Any]) -> List[str]:
+    """Budget and dependency violations, one line each"""
+    problems = []
+    for result in report["results"]:
+        measured = result["cold_start_ms"] if report["absolute"] else result["over_floor_ms"]
+        if measured > report["budget_ms"]:
+            what = "cold start" if report["absolute"] else "cold start above the interpreter+asyncio floor"
+            problems.append(f"{result['server']}: {what} {measured:.1f}ms > {report['budget_ms']}ms")
+        if result["forbidden_imported"]:
+            problems.append(f"{result['server']}: imports {', '.join(result['forbidden_imported'])} at startup")
+    return problems
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="MCP server cold-start benchmark and regression guard")
+    parser.add_argument("--runs", type=int, default=7, help="Cold starts per server (median is reported)")
+    parser.add_argument("--budget-ms", type=float, default=50)
+    parser.add_argument("--absolute", action="store_true",
+                        help="Apply the budget to the whole cold start instead of the part above the floor")
+    parser.add_argument("--top", type=int, default=8, help="Slowest imports listed per server")
+    parser.add_argument("--servers", nargs="*", help="Only these servers")
+    parser.add_argument("--output", help="Write the report as JSON")
+    arguments = parser.parse_args()
+    result = run(arguments)
+    print(f"floor (python + asyncio + json): {result['floor_ms']:.1f}ms")
+    for entry in result["results"]:
+        print(f"{entry['server']:<24} cold start {entry['cold_start_ms']:>7.1f}ms "
+              f"(+{entry['over_floor_ms']:.1f}ms over floor), import {entry['import_ms']:.1f}ms")
+        print("    slowest: " + ", ".join(f"{name} {ms:.1f}" for name, ms in entry["slowest_imports_ms"].items()))
+    if arguments.output:
+        with open(arguments.output, "w") as f:
+            json.dump(result, f, indent=2)
+    failures = check(result)
+    for problem in failures:
+        print(f"FAIL {problem}")
+    sys.exit(1 if failures else 0)
@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+"""
+Command Router
+One table of bot commands shared by every entry point: parse once, O(1) lookup, middleware chain
+"""
+
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from metrics import REGISTRY, MetricsRegistry
+
+Handler = Callable[["CommandContext"], Awaitable[Any]]
+Middleware = Callable[["CommandContext", Callable[[], Awaitable[Any]]], Awaitable[Any]]
+Responder = Callable[["CommandContext", str], Awaitable[Any]]
+
+
+class CommandContext:
+    """Everything a handler needs about one command invocation"""
+
+    __slots__ = ("command", "raw_args", "user_id", "channel_id", "guild_id", "message", "router", "_args")
+
+    def __init__(self, command: str, raw_args: str = "", user_id: str = "", channel_id: str = "",
+                 message: Any = None, guild_id: str = ""):
+        self.command = command
+        # Text after the command, untouched (questions keep their spacing)
+        self.raw_args = raw_args
+        self.user_id = user_id
+        self.channel_id = channel_id
+        # Empty for DMs and MCP callers that don't name a guild
+        self.guild_id = guild_id
+        # The discord.Message when the command came from Discord, None for MCP callers
+        self.message = message
+        self.router: Optional["CommandRouter"] = None
+        self._args: Optional[List[str]] = None
+
+    @property
+    def args(self) -> List[str]:
+        """Whitespace-split arguments, computed on first use"""
+        if self._args is None:
+            self._args = self.raw_args.split()
+        return self._args
+
+    async def reply(self, text: str) -> Any:
+        """Answer through the router's responder (return value or channel send, per bot)"""
+        return await self.router.respond(self, text)
+
+
+class CommandRouter:
+    """Command name -> handler table with a middleware chain around every call
+
+    Middleware is called as `await middleware(ctx, call_next)` in the order it
+    was added and can short-circuit by returning without calling call_next.
+    `respond(ctx, text)` turns a plain message (denials, usage, unknown
+    command) into whatever the bot returns or sends.
+    """
+
+    def __init__(self, respond: Responder, prefix: str = "!"):
+        self.respond = respond
+        self.prefix = prefix
+        self.handlers: Dict[str, Handler] = {}
+        self.descriptions: Dict[str, str] = {}
+        self.middleware: List[Middleware] = []
+        self.unknown: Optional[Handler] = None
+
+    def add(self, name: str, handler: Handler, description: str = "", aliases: Tuple[str, ...] = ()):
+        for key in (name,) + aliases:
+            self.handlers[key] = handler
+        if description:
+            self.descriptions[name] = description
+
+    def command(self, name: str, description: str = "", aliases: Tuple[str, ...] = ()):
+        """Decorator form of add()"""
+        def register(handler: Handler) -> Handler:
+            self.add(name, handler, description, aliases)
+            return handler
+        return register
+
+    def use(self, middleware: Middleware):
+        self.middleware.append(middleware)
+
+    def parse(self, content: str) -> Optional[Tuple[str, str]]:
+        """(command, raw_args) for a message starting with the prefix, else None"""
+        if not content.startswith(self.prefix):
+            return None
+        parts = content.split(None, 1)
+        if not parts:
+            return None
+        return parts[0].lower(), parts[1].strip() if len(parts) > 1 else ""
+
+    def context(self, content: str, user_id: str = "", channel_id: str = "",
+                message: Any = None, guild_id: str = "") -> Optional[CommandContext]:
+        parsed = self.parse(content)
+        if parsed is None:
+            return None
+        return CommandContext(parsed[0], parsed[1], user_id, channel_id, message, guild_id)
+
+    async def dispatch(self, ctx: CommandContext) -> Any:
+        """Run the middleware chain and then the handler (or the unknown-command handler)"""
+        handler = self.handlers.get(ctx.command) or self.unknown
+        if handler is None:
+            return None
+        ctx.router = self
+        chain = self.middleware
+
+        async def call(index: int) -> Any:
+            if index == len(chain):
+                return await handler(ctx)
+            return await chain[index](ctx, lambda: call(index + 1))
+
+        return await call(0)
+
+    async def handle_message(self, message: Any) -> Any:
+        """Parse a discord.Message once and dispatch it; None when it isn't a command"""
+        guild = getattr(message, "guild", None)
+        ctx = self.context(message.content, str(message.author.id), str(message.channel.id), message,
+                           str(guild.id) if guild is not None else "")
+        if ctx is None:
+            return None
+        return await self.dispatch(ctx)
+
+
+def permission_middleware(check: Callable[[str, str], bool],
+                          denied: str = "❌ You don't have permission to use this command") -> Middleware:
+    """Reject commands that `check(user_id, command)` does not allow"""
+    async def middleware(ctx: CommandContext, call_next):
+        if ctx.command in ctx.router.handlers and not check(ctx.user_id, ctx.command):
+            return await ctx.reply(denied)
+        return await call_next()
+    return middleware
+
+
+class RateLimiter:
+    """Per-user token bucket over all commands; refuses instead of queueing
+
+    COMMAND_RATE is "count/seconds", e.g. 6/30; unset (the default) means no
+    limit. Users idle long enough to have a full bucket again are forgotten,
+    so the table stays small.
+    """
+
+    def __init__(self, spec: Optional[str] = None, exempt: Tuple[str, ...] = ("!help",)):
+        count, _, seconds = (spec if spec is not None else os.getenv("COMMAND_RATE", "")).partition("/")
+        self.capacity = float(count or 0)
+        self.per = float(seconds or 1)
+        self.rate = self.capacity / self.per
+        self.exempt = frozenset(exempt)
+        self.refused = REGISTRY.counter("bot_commands_refused_total", "Commands refused by the per-user rate limit")
+        self._buckets: Dict[str, Tuple[float, float]] = {}
+
+    def allow(self, user_id: str) -> Tuple[bool, float]:
+        """(allowed, seconds until the next token)"""
+        if self.capacity <= 0:
+            return True, 0.0
+        now = time.monotonic()
+        tokens, updated = self._buckets.get(user_id, (self.capacity, now))
+        tokens = min(self.capacity, tokens + (now - updated) * self.rate)
+        if tokens < 1:
+            self._buckets[user_id] = (tokens, now)
+            return False, (1 - tokens) / self.rate
+        self._buckets[user_id] = (tokens - 1, now)
+        if len(self._buckets) > 1024:
+            self._prune(now)
+        return True, 0.0
+
+    def _prune(self, now: float):
+        for user_id, (_, updated) in list(self._buckets.items()):
+            if now - updated >= self.per:
+                del self._buckets[user_id]
+
+    def middleware(self) -> Middleware:
+        async def middleware(ctx: CommandContext, call_next):
+            if ctx.command not in self.exempt and ctx.command in ctx.router.handlers:
+                allowed, retry = self.allow(ctx.user_id)
+                if not allowed:
+                    self.refused.inc()
+                    return await ctx.reply(f"⏳ Slow down, try again in {retry:.0f}s")
+            return await call_next()
+        return middleware
+
+
+class CommandTimings:
+    """Latency histogram and error count per command, exported through the metrics registry"""
+
+    def __init__(self, registry: MetricsRegistry = REGISTRY):
+        self.seconds = registry.histogram("bot_command_seconds", "Command handling time including the reply",
+                                          ("command",))
+        self.errors = registry.counter("bot_command_errors_total", "Commands whose handler raised", ("command",))
+
+    def record(self, command: str, seconds: float, failed: bool = False):
+        self.seconds.observe(seconds, command)
+        if failed:
+            self.errors.inc(command)
+
+    def middleware(self) -> Middleware:
+        async def middleware(ctx: CommandContext, call_next):
+            start = time.perf_counter()
+            failed = True
+            try:
+                result = await call_next()
+                failed = False
+                return result
+            finally:
+                # Unknown commands share one label so typos can't grow the series count
+                self.record(ctx.command if ctx.command in ctx.router.handlers else "unknown",
+                            time.perf_counter() - start, failed)
+        return middleware
@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+"""
+Conversation Memory
+Bounded per-channel chat history for Ollama /api/chat, with LRU eviction of idle channels
+"""
+
+import asyncio
+import os
+import sys
+import time
+from collections import OrderedDict, deque
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Tuple
+
+from prompt_builder import ModelLimits, trim_to
+from shared_state import SharedState
+
+Turn = Tuple[str, str]
+Summarizer = Callable[[str], Awaitable[str]]
+
+
+class Conversation:
+    """Recent turns of one channel plus a running summary of the turns that fell out"""
+
+    def __init__(self, max_turns: int, channel_id: str = ""):
+        self.channel_id = channel_id
+        self.turns: Deque[Turn] = deque(maxlen=max_turns)
+        self.summary = ""
+        self.last_used = time.monotonic()
+        self._summarizing: Optional[asyncio.Task] = None
+
+    @property
+    def chars(self) -> int:
+        return len(self.summary) + sum(len(q) + len(a) for q, a in self.turns)
+
+    def __bool__(self) -> bool:
+        return bool(self.turns or self.summary)
+
+
+def _gist(question: str, answer: str) -> str:
+    """One summary line for a turn: the question and the first sentence of the answer"""
+    answer = " ".join(answer.split())
+    end = answer.find(". ")
+    first = answer[:end + 1] if 0 < end < 200 else answer[:200]
+    return f"- Q: {' '.join(question.split())[:120]} A: {first}"
+
+
+class ConversationStore:
+    """Per-channel conversations kept in memory
+
+    Each channel holds at most `max_turns` question/answer pairs and
+    `max_chars` characters; older turns are folded into a short summary
+    instead of being resent on every follow-up. At most `max_channels`
+    conversations are kept (least recently used go first), and any idle for
+    `idle_ttl` seconds are dropped.
+
+    With a shared `state`, every change is also written there and a channel
+    missing from memory is loaded from it, so a restarted shard carries on
+    where its previous run stopped. Memory stays authoritative while the
+    process runs: Discord delivers a channel's messages to one shard only.
+    """
+
+    def __init__(self, max_turns: Optional[int] = None, max_chars: Optional[int] = None,
+                 max_channels: Optional[int] = None, idle_ttl: Optional[float] = None,
+                 summarizer: Optional[Summarizer] = None, state: Optional[SharedState] = None):
+        self.max_turns = int(max_turns or os.getenv("CHAT_MAX_TURNS", "8"))
+        self.max_chars = int(max_chars or os.getenv("CHAT_MAX_CHARS", "6000"))
+        self.max_channels = int(max_channels or os.getenv("CHAT_MAX_CHANNELS", "256"))
+        self.idle_ttl = float(idle_ttl or os.getenv("CHAT_IDLE_TTL", "3600"))
+        # Optional async (text) -> summary, e.g. a background LLM call; extractive otherwise
+        self.summarizer = summarizer
+        self.summary_chars = max(200, self.max_chars // 4)
+        self.state = state
+        self._channels: "OrderedDict[str, Conversation]" = OrderedDict()
+        if state is not None:
+            state.write(state.expire, "conversation", self.idle_ttl, on_error=self._report_state_error)
+
+    def _load(self, channel_id: str) -> Optional[Conversation]:
+        if self.state is None:
+            return None
+        stored = self.state.get("conversation", channel_id)
+        if not stored or time.time() - stored["updated"] >= self.idle_ttl:
+            return None
+        conversation = Conversation(self.max_turns, channel_id)
+        conversation.turns.extend((question, answer) for question, answer in stored["turns"])
+        conversation.summary = stored["summary"]
+        conversation.last_used = time.monotonic() - (time.time() - stored["updated"])
+        return conversation
+
+    @staticmethod
+    def _report_state_error(error: BaseException):
+        print(f"Conversations: saving to shared state failed: {error}", file=sys.stderr)
+
+    def _persist(self, conversation: Conversation):
+        if self.state is None:
+            return
+        self.state.write(self.state.set, "conversation", conversation.channel_id, {
+            "turns": list(conversation.turns), "summary": conversation.summary, "updated": time.time()},
+            on_error=self._report_state_error)
+
+    def _evict(self):
+        now = time.monotonic()
+        while self._channels:
+            channel_id, conversation = next(iter(self._channels.items()))
+            if len(self._channels) <= self.max_channels and now - conversation.last_used < self.idle_ttl:
+                break
+            del self._channels[channel_id]
+
+    def get(self, channel_id: str) -> Conversation:
+        """The channel's conversation (created empty), marked as most recently used"""
+        self._evict()
+        conversation = self._channels.get(channel_id)
+        if conversation is None:
+            conversation = self._load(channel_id) or Conversation(self.max_turns, channel_id)
+            self._channels[channel_id] = conversation
+        else:
+            self._channels.move_to_end(channel_id)
+        conversation.last_used = time.monotonic()
+        return conversation
+
+    def has_history(self, channel_id: str) -> bool:
+        conversation = self._channels.get(channel_id)
+        if conversation is None:
+            conversation = self._load(channel_id)
+            if conversation is not None:
+                self._channels[channel_id] = conversation
+        return bool(conversation) and time.monotonic() - conversation.last_used < self.idle_ttl
+
+    def reset(self, channel_id: str) -> bool:
+        """Forget a channel's conversation; returns False if there was none"""
+        conversation = self._channels.pop(channel_id, None)
+        if conversation is not None and conversation._summarizing is not None:
+            conversation._summarizing.cancel()
+        stored = self.state is not None and self.state.get("conversation", channel_id) is not None
+        if stored:
+            self.state.write(self.state.delete, "conversation", channel_id, on_error=self._report_state_error)
+        return bool(conversation) or stored
+
+    def messages(self, channel_id: str, system: str, user_content: str,
+                 limits: Optional[ModelLimits] = None) -> List[Dict[str, str]]:
+        """Chat messages for a follow-up: system (+ summary), recent turns, then the new question
+
+        With `limits`, the oldest turns are left out until the whole request fits
+        the model's prompt budget; they stay in memory for later, shorter questions.
+        """
+        conversation = self.get(channel_id)
+        if conversation.summary:
+            system = f"{system}\n\nEarlier in this conversation:\n{conversation.summary}"
+        turns = list(conversation.turns)
+        if limits is not None:
+            budget = limits.chars(limits.prompt_tokens) - len(system) - len(user_content)
+            while turns and sum(len(q) + len(a) for q, a in turns) > budget:
+                turns.pop(0)
+        messages = [{"role": "system", "content": system}]
+        for question, answer in turns:
+            messages.append({"role": "user", "content": question})
+            messages.append({"role": "assistant", "content": answer})
+        messages.append({"role": "user", "content": user_content})
+        return messages
+
+    def record(self, channel_id: str, question: str, answer: str):
+        """Append a finished turn, folding whatever no longer fits into the summary"""
+        conversation = self.get(channel_id)
+        dropped: List[Turn] = []
+        if len(conversation.turns) == conversation.turns.maxlen:
+            dropped.append(conversation.turns[0])
+        conversation.turns.append((question, answer))
+        while len(conversation.turns) > 1 and conversation.chars > self.max_chars:
+            dropped.append(conversation.turns.popleft())
+        if dropped:
+            self._fold(conversation, dropped)
+        self._persist(conversation)
+
+    def _fold(self, conversation: Conversation, dropped: List[Turn]):
+        lines = [conversation.summary] if conversation.summary else []
+        lines.extend(_gist(q, a) for q, a in dropped)
+        # Extractive summary right away; keep the newest lines when it grows too long
+        summary = "\n".join(lines)
+        if len(summary) > self.summary_chars:
+            cut = summary.find("\n", len(summary) - self.summary_chars)
+            summary = summary[cut + 1:] if cut != -1 else summary[-self.summary_chars:]
+        conversation.summary = summary
+        if self.summarizer is not None and conversation._summarizing is None:
+            conversation._summarizing = asyncio.ensure_future(self._summarize(conversation))
+
+    async def _summarize(self, conversation: Conversation):
+        """Replace the extractive summary with a model-written one, off the request path"""
+        source = conversation.summary
+        try:
+            summary = (await self.summarizer(source)).strip()
+            # Lines folded in while the summarizer ran are kept after its output
+            added = conversation.summary[len(source):] if conversation.summary.startswith(source) else ""
+            if summary:
+                conversation.summary = trim_to(summary, self.summary_chars)[0] + added
+                self._persist(conversation)
+        except Exception as e:
+            print(f"Conversation summary failed, keeping extractive summary: {e}", file=sys.stderr)
+        finally:
+            conversation._summarizing = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "channels": len(self._channels),
+            "turns": sum(len(c.turns) for c in self._channels.values()),
+            "chars": sum(c.chars for c in self._channels.values())
+        }
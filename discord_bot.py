@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+Discord Bot
+Discord front end for DiscordLLMIntegration (MODE=discord); kept apart so MCP mode never imports discord.py
+"""
+
+import asyncio
+import os
+import signal
+import discord
+from discord.ext import commands
+from ollama_client import OllamaError
+from discord_streaming import StreamingReply
+from discord_outbox import Outbox
+from discord_integration import DiscordLLMIntegration
+from metrics import start_metrics_server
+from sharding import shard_config
+
+class DiscordBot(commands.AutoShardedBot):
+    def __init__(self):
+        intents = discord.Intents.default()
+        # Try without privileged intents first
+        intents.guilds = True
+        intents.messages = True
+        try:
+            intents.message_content = True
+        except:
+            print("⚠️  message_content intent not enabled - bot may not see all messages")
+        # SHARD_COUNT/SHARD_IDS are set per worker by the shard supervisor
+        super().__init__(command_prefix='!', intents=intents, **shard_config())
+        self.integration = DiscordLLMIntegration()
+        self.outbox = Outbox()
+        self.metrics_server = None
+
+    async def on_ready(self):
+        print(f'🤖 Bot logged in as {self.user}')
+        if self.user:
+            print(f'Bot ID: {self.user.id}')
+        print('Ready to respond to commands!')
+
+    async def setup_hook(self):
+        # Load the model before the first !ask instead of during it
+        self.integration.warmer.start()
+        self.integration.docker_state.ensure_started()
+        self.integration.health.start()
+        self.integration.notifier = self.send_to_channel
+        self.integration.streamer = self.stream_ask
+        self.metrics_server = await start_metrics_server(default_port=9464)
+
+    async def close(self):
+        if self.metrics_server is not None:
+            self.metrics_server.close()
+        await self.outbox.close()
+        await self.integration.close()
+        await super().close()
+
+    async def send_to_channel(self, channel_id: str, text: str):
+        """Post background job output to a channel by id (progress lines close together are merged)"""
+        channel = self.get_channel(int(channel_id)) or await self.fetch_channel(int(channel_id))
+        await self.outbox.send(channel, text, wait=False)
+
+    async def on_message(self, message):
+        # Don't respond to own messages
+        if message.author == self.user:
+            return
+
+        # Commands are parsed once and dispatched through the integration's router
+        if message.content.startswith('!'):
+            await self.process_message(message)
+
+    async def process_message(self, message):
+        """Process Discord messages using the integration"""
+        try:
+            result = await self.integration.router.handle_message(message)
+            if result is None:
+                # Streamed straight into the channel (or not a command)
+                return
+            
+            # Send response back to Discord
+            if "result" in result and "content" in result["result"]:
+                for content_item in result["result"]["content"]:
+                    if content_item.get("type") == "text":
+                        await self.outbox.send(message.channel, content_item["text"])
+            elif "error" in result:
+                await message.channel.send(f"❌ Error: {result['error'].get('message', 'Unknown error')}")
+                
+        except Exception as e:
+            await message.channel.send(f"❌ Bot error: {str(e)}")
+
+    async def stream_ask(self, message, question: str, no_cache: bool = False):
+        """Post the answer on the first token and keep editing it as the rest arrives"""
+        reply = StreamingReply(message.channel, "🤖 **Security AI Response:**\n",
+                               continuation_header="🤖 **Security AI Response (cont.):**\n", limit=1990,
+                               limiter=self.outbox.sender(message.channel).acquire)
+        try:
+            async for token in self.integration.stream_llm(question, no_cache=no_cache,
+                                                           user_id=str(message.author.id),
+                                                           channel_id=str(message.channel.id),
+                                                           guild_id=str(message.guild.id) if message.guild else ""):
+                await reply.feed(token)
+        except OllamaError as e:
+            if not reply.started:
+                await message.channel.send("❌ LLM service unavailable" if e.status else f"❌ LLM query failed: {str(e)}")
+                return
+            await reply.feed("\n\n⚠️ Response interrupted")
+        await reply.finish()
+
+async def run_discord_bot():
+    """Run Discord bot"""
+    bot = DiscordBot()
+    token = os.getenv("DISCORD_TOKEN") or "MTQ3MDQ0OTg4Mzk1MjcwOTcxNA.GELb3A.85d6D4V3UO9b7Wa8yqRuKnFkvLrustjmcnNORg"
+    
+    if not token:
+        print("❌ Discord token not found in environment variables")
+        print("Set the DISCORD_TOKEN environment variable")
+        return
+    
+    try:
+        # The shard supervisor stops workers with SIGTERM: close cleanly so job state is saved
+        asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, lambda: asyncio.ensure_future(bot.close()))
+    except (NotImplementedError, RuntimeError):
+        pass
+    try:
+        await bot.start(token)
+    except discord.errors.LoginFailure:
+        print("❌ Invalid Discord token - check your bot token")
+    except Exception as e:
+        print(f"❌ Bot startup error: {str(e)}")
+
+if __name__ == "__main__":
+    print("🚀 Starting Discord Bot...")
+    asyncio.run(run_discord_bot())
@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+"""
+Discord Outbox
+Per-channel outbound queue: packs text on line/code-fence boundaries, merges bursts of small
+messages and paces sends to Discord's rate limits before they turn into 429s
+"""
+
+import asyncio
+import io
+import os
+import sys
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from metrics import gauge, histogram
+
+DISCORD_LIMIT = 2000
+FENCE = "```"
+
+SEND_SECONDS = histogram("discord_send_seconds", "Discord API time per outbound message", ("kind",))
+PACING_SECONDS = histogram("discord_pacing_seconds", "Time outbound messages waited for the rate limit")
+
+
+def _split_long_line(line: str, room: int) -> List[str]:
+    """Break one over-long line on spaces, or hard at `room` when there are none"""
+    pieces = []
+    while len(line) > room:
+        cut = line.rfind(" ", 0, room)
+        if cut <= 0:
+            cut = room
+        pieces.append(line[:cut])
+        line = line[cut:].lstrip(" ")
+    pieces.append(line)
+    return pieces
+
+
+def pack_text(text: str, limit: int = DISCORD_LIMIT) -> List[str]:
+    """Split text into messages of at most `limit` chars on line boundaries
+
+    A code block that spans messages is closed at the end of one and reopened
+    (with the same language tag) at the start of the next, so every message
+    renders on its own.
+    """
+    chunks: List[str] = []
+    current: List[str] = []
+    size = 0
+    fence: Optional[str] = None
+
+    def flush():
+        nonlocal current, size
+        if not current:
+            return
+        chunks.append("\n".join(current) + ("\n" + FENCE if fence else ""))
+        current = [fence] if fence else []
+        size = len(fence) + 1 if fence else 0
+
+    for line in text.split("\n"):
+        # Inside a code block, leave room for the reopened fence line and the closer
+        room = limit - (len(fence) + len(FENCE) + 2 if fence else 0)
+        for piece in _split_long_line(line, max(1, room)):
+            closer = len(FENCE) + 1 if fence else 0
+            if current and size + len(piece) + 1 + closer > limit:
+                flush()
+            current.append(piece)
+            size += len(piece) + 1
+        if line.lstrip().startswith(FENCE):
+            fence = None if fence else line.strip()
+    flush()
+    return [chunk for chunk in chunks if chunk.strip()]
+
+
+def merge_chunks(chunks: List[str], limit: int = DISCORD_LIMIT) -> List[str]:
+    """Join neighbouring chunks while they still fit in one message"""
+    merged: List[str] = []
+    for chunk in chunks:
+        if merged and len(merged[-1]) + 1 + len(chunk) <= limit:
+            merged[-1] += "\n" + chunk
+        else:
+            merged.append(chunk)
+    return merged
+
+
+class TokenBucket:
+    """`capacity` sends per `per` seconds, waited for before sending instead of after a 429"""
+
+    def __init__(self, capacity: int, per: float):
+        self.capacity = capacity
+        self.rate = capacity / per
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self.waited = 0.0
+
+    async def acquire(self):
+        while True:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            delay = (1 - self.tokens) / self.rate
+            self.waited += delay
+            await asyncio.sleep(delay)
+
+
+def _parse_rate(spec: str) -> Tuple[int, float]:
+    count, _, seconds = spec.partition("/")
+    return int(count), float(seconds or 1)
+
+
+class ChannelSender:
+    """Delivers queued text to one channel in order, one worker task per channel"""
+
+    def __init__(self, channel: Any, outbox: "Outbox"):
+        self.channel = channel
+        self.outbox = outbox
+        self.bucket = TokenBucket(*outbox.channel_rate)
+        self.sent = 0
+        self._queue: "asyncio.Queue[Optional[Tuple[str, Optional[asyncio.Future]]]]" = asyncio.Queue()
+        self._task: Optional[asyncio.Task] = None
+
+    def enqueue(self, text: str, future: Optional[asyncio.Future]):
+        self._queue.put_nowait((text, future))
+        if self._task is None or self._task.done():
+            self._task = asyncio.ensure_future(self._run())
+
+    async def acquire(self):
+        """Wait for both the channel and the global rate limit"""
+        started = time.perf_counter()
+        await self.outbox.global_bucket.acquire()
+        await self.bucket.acquire()
+        PACING_SECONDS.observe(time.perf_counter() - started)
+
+    async def _run(self):
+        closing = False
+        while not closing:
+            try:
+                first = await asyncio.wait_for(self._queue.get(), self.outbox.idle_timeout)
+            except asyncio.TimeoutError:
+                return
+            if first is None:
+                return
+            # Give whatever else is about to be said a moment to join this batch
+            await asyncio.sleep(self.outbox.merge_window)
+            batch = [first]
+            while not self._queue.empty():
+                item = self._queue.get_nowait()
+                if item is None:
+                    closing = True
+                    break
+                batch.append(item)
+            futures = [future for _, future in batch if future is not None]
+            try:
+                await self._deliver([text for text, _ in batch])
+            except Exception as e:
+                if not futures:
+                    print(f"Discord send to {getattr(self.channel, 'id', '?')} failed: {e}", file=sys.stderr)
+                for future in futures:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            for future in futures:
+                if not future.done():
+                    future.set_result(None)
+
+    async def _deliver(self, texts: List[str]):
+        limit = self.outbox.limit
+        chunks: List[str] = []
+        for text in texts:
+            if len(text) > self.outbox.attach_over:
+                await self._send_chunks(merge_chunks(chunks, limit))
+                chunks = []
+                await self._send_file(text)
+            else:
+                chunks.extend(pack_text(text, limit))
+        await self._send_chunks(merge_chunks(chunks, limit))
+
+    async def _send_chunks(self, chunks: List[str]):
+        for chunk in chunks:
+            await self.acquire()
+            with SEND_SECONDS.time("message"):
+                await self.channel.send(chunk)
+            self.sent += 1
+
+    async def _send_file(self, text: str):
+        """Too long to be readable as messages: short preview plus the full text as a file"""
+        import discord
+        preview = pack_text(text, self.outbox.limit - 80)[0]
+        note = f"\n📎 Full output attached ({len(text):,} chars)"
+        await self.acquire()
+        with SEND_SECONDS.time("file"):
+            await self.channel.send(preview + note,
+                                    file=discord.File(io.BytesIO(text.encode()), filename="output.txt"))
+        self.sent += 1
+
+
+class Outbox:
+    """One ChannelSender per channel, created on first use
+
+    DISCORD_SEND_RATE (per channel) and DISCORD_GLOBAL_RATE are "count/seconds";
+    the defaults match Discord's 5 messages per 5s per channel and stay
+    under its 50 requests/s per bot. Output longer than DISCORD_ATTACH_OVER chars goes out as a
+    text file.
+    """
+
+    def __init__(self, limit: int = DISCORD_LIMIT, merge_window: Optional[float] = None,
+                 attach_over: Optional[int] = None):
+        self.limit = limit
+        self.merge_window = float(merge_window if merge_window is not None else os.getenv("DISCORD_MERGE_WINDOW", "0.25"))
+        self.attach_over = int(attach_over or os.getenv("DISCORD_ATTACH_OVER", str(limit * 4)))
+        self.channel_rate = _parse_rate(os.getenv("DISCORD_SEND_RATE", "5/5"))
+        self.global_bucket = TokenBucket(*_parse_rate(os.getenv("DISCORD_GLOBAL_RATE", "45/1")))
+        # Workers exit after this long without output; the sender is kept for its bucket state
+        self.idle_timeout = 60.0
+        self._senders: Dict[Any, ChannelSender] = {}
+        gauge("discord_outbox_queued", "Outbound texts waiting in channel queues").set_function(
+            lambda: sum(sender._queue.qsize() for sender in self._senders.values()))
+
+    def sender(self, channel: Any) -> ChannelSender:
+        key = getattr(channel, "id", id(channel))
+        sender = self._senders.get(key)
+        if sender is None:
+            sender = self._senders[key] = ChannelSender(channel, self)
+        return sender
+
+    async def send(self, channel: Any, text: str, wait: bool = True):
+        """Queue text for a channel; with wait, return once it has been delivered (or raise)"""
+        if not text:
+            return
+        future = asyncio.get_running_loop().create_future() if wait else None
+        self.sender(channel).enqueue(text, future)
+        if future is not None:
+            await future
+
+    async def close(self):
+        """Deliver everything still queued and stop the workers"""
+        tasks = []
+        for sender in self._senders.values():
+            if sender._task is not None and not sender._task.done():
+                sender._queue.put_nowait(None)
+                tasks.append(sender._task)
+        if tasks:
+            _, stuck = await asyncio.wait(tasks, timeout=10)
+            for task in stuck:
+                task.cancel()
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Discord Streaming Replies
+Post an LLM answer as soon as the first token arrives and edit it as the rest streams in
+"""
+
+import os
+import time
+from typing import Any, Awaitable, Callable, List, Optional
+
+
+class StreamingReply:
+    """Progressively edited Discord reply that rolls over into new messages at the size limit"""
+
+    def __init__(self, channel: Any, header: str, continuation_header: Optional[str] = None,
+                 limit: int = 1900, edit_interval: Optional[float] = None,
+                 limiter: Optional[Callable[[], Awaitable[None]]] = None):
+        self.channel = channel
+        self.header = header
+        self.continuation_header = continuation_header or header
+        self.limit = limit
+        # Discord allows roughly 5 edits per 5 seconds per channel
+        self.edit_interval = edit_interval if edit_interval is not None else float(
+            os.getenv("DISCORD_EDIT_INTERVAL", "1.2"))
+        # Awaited before each new message, e.g. the channel's outbox rate limit
+        self.limiter = limiter
+        self.messages: List[Any] = []
+        self._current = None
+        self._shown: Optional[str] = None
+        self._text = ""
+        self._last_edit = 0.0
+
+    def _current_header(self) -> str:
+        return self.header if not self.messages or self.messages[0] is self._current else self.continuation_header
+
+    async def _publish(self, content: str):
+        """Send the current message if it doesn't exist yet, otherwise edit it"""
+        if self._current is None:
+            if self.limiter is not None:
+                await self.limiter()
+            self._current = await self.channel.send(content)
+            self.messages.append(self._current)
+        elif content != self._shown:
+            await self._current.edit(content=content)
+        self._shown = content
+        self._last_edit = time.monotonic()
+
+    async def _rollover(self):
+        """Close the current message on a line or word boundary and start a new one"""
+        header = self._current_header()
+        room = self.limit - len(header)
+        cut = self._text.rfind("\n", 0, room)
+        if cut <= 0:
+            cut = self._text.rfind(" ", 0, room)
+        if cut <= 0:
+            head, tail = self._text[:room], self._text[room:]
+        else:
+            head, tail = self._text[:cut], self._text[cut + 1:]
+        await self._publish(header + head)
+        self._current = None
+        self._shown = None
+        self._text = tail
+
+    async def feed(self, token: str):
+        """Add a token; the first one is posted immediately, later ones are throttled edits"""
+        self._text += token
+        while len(self._current_header() + self._text) > self.limit:
+            await self._rollover()
+        if self._current is None or time.monotonic() - self._last_edit >= self.edit_interval:
+            await self._publish(self._current_header() + self._text)
+
+    async def finish(self, fallback: str = "No response"):
+        """Flush whatever is still pending once the stream ends"""
+        if self._current is None and not self._text:
+            if self.messages:
+                return
+            self._text = fallback
+        await self._publish(self._current_header() + self._text)
+
+    @property
+    def started(self) -> bool:
+        return bool(self.messages)
@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+"""
+Docker State Cache
+In-process container table filled once from the Docker API and kept current from its events stream
+"""
+
+import asyncio
+import json
+import os
+import time
+from datetime import datetime
+from typing import TYPE_CHECKING, Dict, List, Any, Optional
+from urllib.parse import quote
+
+if TYPE_CHECKING:
+    import aiohttp
+
+
+def _parse_docker_time(value: str) -> Optional[float]:
+    """Parse Docker's RFC 3339 timestamps (nanosecond precision) into epoch seconds"""
+    if not value or value.startswith("0001-"):
+        return None
+    value = value.replace("Z", "+00:00")
+    if "." in value:
+        head, rest = value.split(".", 1)
+        digits = "".join(c for c in rest if c.isdigit())
+        value = f"{head}.{digits[:6]}{rest[len(digits):]}"
+    try:
+        return datetime.fromisoformat(value).timestamp()
+    except ValueError:
+        return None
+
+
+def _humanize(seconds: float) -> str:
+    """Render a duration the way `docker ps` does"""
+    if seconds < 60:
+        return "Less than a minute"
+    for unit, size in (("days", 86400), ("hours", 3600), ("minutes", 60)):
+        if seconds >= size:
+            count = int(seconds // size)
+            return f"{count} {unit[:-1] if count == 1 else unit}"
+    return ""
+
+
+class DockerStateCache:
+    """Container state table driven by the Docker events stream over the daemon's Unix socket
+
+    aiohttp is imported when the sync task starts, not at module import.
+    """
+
+    def __init__(self, socket_path: Optional[str] = None, retry_interval: float = 5):
+        self.socket_path = socket_path or os.getenv("DOCKER_SOCKET", "/var/run/docker.sock")
+        self.retry_interval = retry_interval
+        self.containers: Dict[str, Dict[str, Any]] = {}
+        self.error: Optional[str] = None
+        self._ready: Optional[asyncio.Event] = None
+        self._attempted: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._session: Optional["aiohttp.ClientSession"] = None
+
+    def ensure_started(self):
+        """Start the background sync task if it isn't running yet"""
+        if self._task is None or self._task.done():
+            self._ready = asyncio.Event()
+            self._attempted = asyncio.Event()
+            self._task = asyncio.ensure_future(self._run())
+
+    async def wait_ready(self, timeout: float = 2) -> bool:
+        """Wait for the first full sync; returns False if the daemon hasn't answered yet"""
+        self.ensure_started()
+        try:
+            # Resolves after the first sync attempt, whether it succeeded or not
+            await asyncio.wait_for(self._attempted.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        return self.ready
+
+    @property
+    def ready(self) -> bool:
+        return self._ready is not None and self._ready.is_set()
+
+    async def _get_json(self, path: str) -> Any:
+        import aiohttp
+        async with self._session.get(f"http://docker{path}") as response:
+            if response.status != 200:
+                raise aiohttp.ClientResponseError(response.request_info, (), status=response.status)
+            return await response.json(content_type=None)
+
+    async def _refresh(self, container_id: str):
+        """Re-read one container after an event"""
+        import aiohttp
+        try:
+            info = await self._get_json(f"/containers/{container_id}/json")
+        except aiohttp.ClientResponseError as e:
+            if e.status == 404:
+                self.containers.pop(container_id, None)
+                return
+            raise
+        state = info.get("State", {})
+        self.containers[container_id] = {
+            "id": container_id,
+            "name": info.get("Name", "").lstrip("/"),
+            "image": info.get("Config", {}).get("Image", ""),
+            "state": state.get("Status", "unknown"),
+            "started_at": _parse_docker_time(state.get("StartedAt", "")),
+            "finished_at": _parse_docker_time(state.get("FinishedAt", "")),
+            "exit_code": state.get("ExitCode")
+        }
+
+    async def _sync(self):
+        """Rebuild the whole table from /containers/json"""
+        listing = await self._get_json("/containers/json?all=1")
+        self.containers = {}
+        await asyncio.gather(*(self._refresh(c["Id"]) for c in listing))
+
+    async def _watch_events(self, since: int):
+        import aiohttp
+        filters = quote(json.dumps({"type": ["container"]}))
+        timeout = aiohttp.ClientTimeout(total=None, sock_read=None)
+        async with self._session.get(f"http://docker/events?since={since}&filters={filters}",
+                                     timeout=timeout) as response:
+            if response.status != 200:
+                raise aiohttp.ClientResponseError(response.request_info, (), status=response.status)
+            async for line in response.content:
+                if not line.strip():
+                    continue
+                event = json.loads(line)
+                container_id = event.get("id") or event.get("Actor", {}).get("ID")
+                if not container_id:
+                    continue
+                if event.get("Action", event.get("status")) == "destroy":
+                    self.containers.pop(container_id, None)
+                else:
+                    await self._refresh(container_id)
+
+    async def _run(self):
+        """Sync, then follow events; on any daemon error resync after retry_interval"""
+        import aiohttp
+        self._session = aiohttp.ClientSession(connector=aiohttp.UnixConnector(path=self.socket_path))
+        try:
+            while True:
+                try:
+                    # Replay events from just before the listing so nothing slips in between
+                    since = int(time.time()) - 1
+                    await self._sync()
+                    self.error = None
+                    self._ready.set()
+                    self._attempted.set()
+                    await self._watch_events(since)
+                except (aiohttp.ClientError, OSError, ValueError) as e:
+                    self.error = str(e) or e.__class__.__name__
+                    self._ready.clear()
+                    self._attempted.set()
+                await asyncio.sleep(self.retry_interval)
+        finally:
+            await self._session.close()
+
+    def find(self, name: str) -> List[Dict[str, Any]]:
+        """Containers whose name contains `name`, like `docker ps --filter name=`"""
+        return [c for c in self.containers.values() if name in c["name"]]
+
+    def describe(self, container: Dict[str, Any]) -> str:
+        """Human-readable status, computed from the cached timestamps"""
+        now = time.time()
+        if container["state"] == "running" and container["started_at"]:
+            return f"Up {_humanize(now - container['started_at'])}"
+        if container["state"] == "exited":
+            ago = f" {_humanize(now - container['finished_at'])} ago" if container["finished_at"] else ""
+            return f"Exited ({container['exit_code']}){ago}"
+        return container["state"].capitalize()
+
+    def running_status(self, name: str) -> Optional[str]:
+        """Status text of the first running container matching `name`, or None"""
+        for container in self.find(name):
+            if container["state"] == "running":
+                return self.describe(container)
+        return None
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+"""
+Backend Health
+Circuit breakers for Ollama and the MCP servers, and a background monitor that
+probes each backend on an interval so commands and !status read cached state
+"""
+
+import asyncio
+import os
+import sys
+import time
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from metrics import counter, gauge
+
+CLOSED = "closed"
+HALF_OPEN = "half-open"
+OPEN = "open"
+STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+REJECTED = counter("circuit_rejected_total", "Calls failed fast because the backend's circuit was open", ("backend",))
+TRANSITIONS = counter("circuit_transitions_total", "Circuit breaker state changes", ("backend", "state"))
+
+_breakers: Dict[str, "CircuitBreaker"] = {}
+gauge("circuit_state", "Circuit breaker state (0 closed, 1 half-open, 2 open)", ("backend",)).set_function(
+    lambda: {(name,): STATE_VALUES[breaker.state] for name, breaker in _breakers.items()})
+
+# async () -> detail text; raises when the backend is unhealthy, ProbeSkipped when it can't tell
+Probe = Callable[[], Awaitable[Optional[str]]]
+
+
+class ProbeSkipped(Exception):
+    """Raised by a probe that has nothing to check yet; the backend's state stays as it was"""
+
+
+class CircuitBreaker:
+    """Per-backend breaker: closed -> open -> half-open -> closed
+
+    Closed passes every call. After `failure_threshold` consecutive failures
+    (or a failed health probe) it opens and allow() refuses calls for
+    `reset_timeout` seconds, so callers fail in microseconds instead of
+    waiting for their own timeout. Then it goes half-open and lets a single
+    trial call through: success closes it, failure opens it again. A trial
+    that never reports back (caller cancelled) is replaced after
+    `reset_timeout`.
+    """
+
+    def __init__(self, name: str, failure_threshold: Optional[int] = None, reset_timeout: Optional[float] = None):
+        self.name = name
+        self.failure_threshold = int(failure_threshold or os.getenv("CIRCUIT_FAILURES", "3"))
+        self.reset_timeout = float(reset_timeout or os.getenv("CIRCUIT_RESET_TIMEOUT", "30"))
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.last_error: Optional[str] = None
+        self._trial_started: Optional[float] = None
+        _breakers[name] = self
+
+    def _set(self, state: str):
+        if state != self.state:
+            self.state = state
+            TRANSITIONS.inc(self.name, state)
+            # stderr: stdout carries the protocol when this runs inside an MCP stdio server
+            print(f"🔌 {self.name} circuit {state}" + (f": {self.last_error}" if state == OPEN else ""),
+                  file=sys.stderr)
+
+    def allow(self) -> bool:
+        """Whether a call may go out now (counts a refusal when not)"""
+        now = time.monotonic()
+        if self.state == OPEN:
+            if now - self.opened_at < self.reset_timeout:
+                REJECTED.inc(self.name)
+                return False
+            self._set(HALF_OPEN)
+            self._trial_started = None
+        if self.state == HALF_OPEN:
+            if self._trial_started is not None and now - self._trial_started < self.reset_timeout:
+                REJECTED.inc(self.name)
+                return False
+            self._trial_started = now
+        return True
+
+    def retry_in(self) -> float:
+        """Seconds until an open circuit lets a trial call through"""
+        if self.state != OPEN:
+            return 0.0
+        return max(0.0, self.opened_at + self.reset_timeout - time.monotonic())
+
+    def record_success(self):
+        self.failures = 0
+        self._trial_started = None
+        self._set(CLOSED)
+
+    def record_failure(self, error: str = ""):
+        self.failures += 1
+        self._trial_started = None
+        if error:
+            self.last_error = error
+        if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+            self.trip()
+
+    def trip(self, error: str = ""):
+        """Open now, e.g. after a failed health probe"""
+        if error:
+            self.last_error = error
+        self.opened_at = time.monotonic()
+        self._trial_started = None
+        self._set(OPEN)
+
+    def unavailable(self, what: str) -> str:
+        """Error text for a call refused by this breaker"""
+        return f"{what} is unavailable ({self.last_error or 'failing'}); retrying in {self.retry_in():.0f}s"
+
+
+class BackendHealth:
+    """Last probe result of one backend"""
+
+    __slots__ = ("healthy", "detail", "latency", "checked")
+
+    def __init__(self, healthy: Optional[bool] = None, detail: str = "not checked yet", latency: float = 0.0,
+                 checked: float = 0.0):
+        self.healthy = healthy
+        self.detail = detail
+        self.latency = latency
+        self.checked = checked
+
+
+class HealthMonitor:
+    """Probes every registered backend each `interval` seconds (each probe capped at `timeout`)
+
+    A failed probe trips the backend's breaker, so requests stop waiting on a
+    dead backend before they pile up; a passing probe closes it again.
+    """
+
+    def __init__(self, interval: Optional[float] = None, timeout: Optional[float] = None):
+        # 0 disables the background loop; check_all() can still be awaited directly
+        self.interval = float(interval if interval is not None else os.getenv("HEALTH_INTERVAL", "15"))
+        self.timeout = float(timeout or os.getenv("HEALTH_TIMEOUT", "3"))
+        self.backends: Dict[str, Tuple[Probe, Optional[CircuitBreaker]]] = {}
+        self.status: Dict[str, BackendHealth] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def add(self, name: str, probe: Probe, breaker: Optional[CircuitBreaker] = None):
+        self.backends[name] = (probe, breaker)
+        self.status.setdefault(name, BackendHealth())
+
+    def start(self):
+        """Start probing in the background (idempotent)"""
+        if self.interval > 0 and (self._task is None or self._task.done()):
+            self._task = asyncio.ensure_future(self._run())
+
+    async def _run(self):
+        while True:
+            await self.check_all()
+            await asyncio.sleep(self.interval)
+
+    async def check_all(self):
+        await asyncio.gather(*(self.check(name) for name in list(self.backends)))
+
+    async def check(self, name: str) -> BackendHealth:
+        probe, breaker = self.backends[name]
+        started = time.perf_counter()
+        try:
+            detail = await asyncio.wait_for(probe(), self.timeout)
+            health = BackendHealth(True, detail or "ok", time.perf_counter() - started, time.time())
+            if breaker is not None:
+                breaker.record_success()
+        except ProbeSkipped as e:
+            health = self.status.get(name) or BackendHealth()
+            health.detail = str(e) or health.detail
+            return health
+        except Exception as e:
+            error = str(e) or f"no answer within {self.timeout:.0f}s"
+            health = BackendHealth(False, error, time.perf_counter() - started, time.time())
+            if breaker is not None:
+                breaker.trip(error)
+        self.status[name] = health
+        return health
+
+    def healthy(self, name: str) -> Optional[bool]:
+        """Cached verdict: True/False, or None before the first probe"""
+        health = self.status.get(name)
+        return health.healthy if health is not None else None
+
+    def describe(self, name: str) -> str:
+        """One status line from cached state (no I/O)"""
+        health = self.status.get(name) or BackendHealth()
+        breaker = self.backends.get(name, (None, None))[1]
+        if health.healthy is None:
+            line = f"❓ {name}: {health.detail}"
+        elif health.healthy:
+            line = f"✅ {name}: {health.detail} ({health.latency * 1000:.0f}ms)"
+        else:
+            line = f"❌ {name}: {health.detail}"
+        if breaker is not None and breaker.state != CLOSED:
+            line += f" - circuit {breaker.state}" + (f", retry in {breaker.retry_in():.0f}s"
+                                                    if breaker.state == OPEN else "")
+        if health.checked:
+            line += f" · checked {time.time() - health.checked:.0f}s ago"
+        return line
+
+    def summary(self) -> List[str]:
+        return [self.describe(name) for name in self.backends]
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
@@ -10,11 +10,17 @@ import sys
 import os
 from typing import Dict, List, Any, Optional
 from pathlib import Path
+from stdio_server import serve_stdio
+from docker_state import DockerStateCache
+from write_behind import WriteBehindFile
+from metrics import METRICS_TOOL, metrics_tool_result
 
 class CleanMCPServer:
     def __init__(self, config_file: str = "/app/config/personal_config.json"):
         self.config_file = config_file
         self.config = self._load_config()
+        self.config_writer = WriteBehindFile(self.config_file, lambda: self.config)
+        self.docker_state = DockerStateCache()
         
     def _load_config(self) -> Dict[str, Any]:
         """Load personal configuration"""
@@ -94,7 +100,8 @@ class CleanMCPServer:
                             "type": "object",
                             "properties": {}
                         }
-                    }
+                    },
+                    METRICS_TOOL
                 ]
             }
         }
@@ -123,10 +130,8 @@ class CleanMCPServer:
                 
                 if section in self.config:
                     self.config[section].update(updates)
-                    # Save config
-                    try:
-                        with open(self.config_file, 'w') as f:
-                            json.dump(self.config, f, indent=2)
+                    # Save config (coalesced with other updates in the same window)
+                    if self.config_writer.mark_dirty():
                         return {
                             "result": {
                                 "content": [{
@@ -135,30 +140,21 @@ class CleanMCPServer:
                                 }]
                             }
                         }
-                    except Exception as e:
-                        return {"error": {"code": -32603, "message": f"Save failed: {str(e)}"}}
+                    return {"error": {"code": -32603, "message": f"Save failed: could not write {self.config_file}"}}
                 else:
                     return {"error": {"code": -32602, "message": f"Section {section} not found"}}
             
             elif tool_name == "integration_status":
                 status_info = []
                 
-                # Check Docker containers
-                try:
-                    import subprocess
-                    result = subprocess.run(['docker', 'ps', '--format', 'json'], 
-                                      capture_output=True, text=True)
-                    if result.returncode == 0:
-                        containers = json.loads(result.stdout)
-                        security_containers = [c for c in containers if 'security' in c.get('Names', [''])[0].lower()]
-                        status_info.append(f"Security containers: {len(security_containers)}")
-                        for container in security_containers:
-                            name = container.get('Names', [''])[0]
-                            state = container.get('State', 'unknown')
-                            status_info.append(f"  - {name}: {state}")
-                    else:
-                        status_info.append("Docker status check failed")
-                except:
+                # Check running Docker containers (as `docker ps` did) from the event-driven state table
+                if await self.docker_state.wait_ready():
+                    security_containers = [c for c in self.docker_state.containers.values()
+                                           if 'security' in c['name'].lower() and c['state'] == 'running']
+                    status_info.append(f"Security containers: {len(security_containers)}")
+                    for container in security_containers:
+                        status_info.append(f"  - {container['name']}: {container['state']}")
+                else:
                     status_info.append("Docker integration: Not available")
                 
                 # Check config files
@@ -176,6 +172,9 @@ class CleanMCPServer:
                     }
                 }
             
+            elif tool_name == "get_metrics":
+                return metrics_tool_result(arguments)
+            
             else:
                 return {"error": {"code": -32602, "message": f"Tool '{tool_name}' not found"}}
                 
@@ -185,26 +184,12 @@ class CleanMCPServer:
     async def run_stdio_server(self):
         """Run MCP server using stdio"""
         print("Clean MCP Integration Server started", file=sys.stderr)
-        
-        while True:
-            try:
-                line = sys.stdin.readline()
-                if not line:
-                    break
-                
-                request = json.loads(line.strip())
-                response = await self.handle_request(request)
-                
-                print(json.dumps(response))
-                sys.stdout.flush()
-                
-            except json.JSONDecodeError:
-                continue
-            except KeyboardInterrupt:
-                break
-            except Exception as e:
-                print(json.dumps({"error": {"code": -32603, "message": str(e)}}))
-                sys.stdout.flush()
+        # The Docker table syncs on the first integration_status call, keeping cold start short
+        try:
+            await serve_stdio(self.handle_request)
+        finally:
+            await self.docker_state.close()
+            self.config_writer.flush()
 
 if __name__ == "__main__":
     server = CleanMCPServer()
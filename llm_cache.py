@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+LLM Answer Cache
+In-memory LRU with TTL in front of an on-disk SQLite store that survives restarts
+"""
+
+import asyncio
+import hashlib
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Any, Optional, Tuple
+
+
+def normalize_question(question: str) -> str:
+    """Fold case, whitespace and trailing punctuation so trivial rewordings share an entry"""
+    return re.sub(r"\s+", " ", question).strip().lower().rstrip("?!. ")
+
+
+class LLMCache:
+    """Two-tier answer cache keyed by question, model, prompt template version and target"""
+
+    def __init__(self, path: Optional[str] = None, max_entries: Optional[int] = None,
+                 ttl: Optional[float] = None):
+        if path is None:
+            path = os.getenv("LLM_CACHE_PATH", os.path.join(
+                os.path.expanduser("~"), ".cache", "security-bot", "llm_cache.db"))
+        self.path = path
+        self.max_entries = int(max_entries or os.getenv("LLM_CACHE_SIZE", "512"))
+        self.ttl = float(ttl or os.getenv("LLM_CACHE_TTL", "86400"))
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._memory: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self._db: Optional[sqlite3.Connection] = None
+        self._db_lock = threading.Lock()
+        if self.path:
+            self._open_db()
+
+    def _open_db(self):
+        """Open the disk tier; the cache keeps working memory-only if this fails"""
+        try:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._db = sqlite3.connect(self.path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS llm_cache (key TEXT PRIMARY KEY, answer TEXT, expires REAL)")
+            self._db.execute("DELETE FROM llm_cache WHERE expires < ?", (time.time(),))
+            self._db.commit()
+        except sqlite3.Error as e:
+            print(f"LLM cache disk store unavailable: {e}", file=sys.stderr)
+            self._db = None
+
+    @staticmethod
+    def make_key(question: str, model: str, template_version: str, target: Optional[str]) -> str:
+        raw = "\x1f".join([normalize_question(question), model, template_version, target or ""])
+        return hashlib.sha256(raw.encode()).hexdigest()
+
+    def _remember(self, key: str, expires: float, answer: str):
+        self._memory[key] = (expires, answer)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def _disk_get(self, key: str) -> Optional[Tuple[float, str]]:
+        with self._db_lock:
+            row = self._db.execute(
+                "SELECT expires, answer FROM llm_cache WHERE key = ?", (key,)).fetchone()
+        return row
+
+    def _disk_put(self, key: str, expires: float, answer: str):
+        with self._db_lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, answer, expires) VALUES (?, ?, ?)",
+                (key, answer, expires))
+            self._db.commit()
+
+    async def get(self, key: str) -> Optional[str]:
+        """Return a cached answer, checking memory first and then disk"""
+        now = time.time()
+        entry = self._memory.get(key)
+        if entry and entry[0] > now:
+            self._memory.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+        if entry:
+            del self._memory[key]
+        if self._db is not None:
+            try:
+                row = await asyncio.get_running_loop().run_in_executor(None, self._disk_get, key)
+            except sqlite3.Error:
+                row = None
+            if row and row[0] > now:
+                self._remember(key, row[0], row[1])
+                self.hits += 1
+                self.disk_hits += 1
+                return row[1]
+        self.misses += 1
+        return None
+
+    async def put(self, key: str, answer: str):
+        """Store an answer in both tiers"""
+        expires = time.time() + self.ttl
+        self._remember(key, expires, answer)
+        if self._db is not None:
+            try:
+                await asyncio.get_running_loop().run_in_executor(None, self._disk_put, key, expires, answer)
+            except sqlite3.Error as e:
+                print(f"LLM cache write failed: {e}", file=sys.stderr)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "entries": len(self._memory)
+        }
+
+    def summary(self) -> str:
+        return f"{self.hits} hits ({self.disk_hits} from disk) / {self.misses} misses"
+
+
+def split_bypass_flag(question: str) -> Tuple[str, bool]:
+    """Strip a leading --fresh flag from a question; returns (question, bypass_cache)"""
+    stripped = question.lstrip()
+    if stripped.startswith("--fresh"):
+        return stripped[len("--fresh"):].strip(), True
+    return question, False
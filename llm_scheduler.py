@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+LLM Scheduler
+Fair, priority-aware admission in front of the Ollama backend
+"""
+
+import asyncio
+import os
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Deque, Dict, Hashable, Optional, Tuple
+
+from metrics import gauge, histogram
+
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BACKGROUND = 1
+
+WAIT_SECONDS = histogram("llm_queue_wait_seconds", "Time LLM requests waited for a backend slot")
+
+
+class FairScheduler:
+    """Per-(user, channel) queues served round-robin, with a cap on concurrent backend calls
+
+    Interactive requests are always admitted before background ones. Within a
+    priority, each (user, channel) queue gets one turn in rotation, so one user
+    spamming !ask only delays their own later questions.
+    """
+
+    def __init__(self, max_concurrent: Optional[int] = None):
+        # Each node in OLLAMA_URLS runs OLLAMA_NUM_PARALLEL generations at once
+        nodes = max(1, len([url for url in os.getenv("OLLAMA_URLS", "").split(",") if url.strip()]))
+        self.max_concurrent = int(max_concurrent or os.getenv(
+            "LLM_MAX_CONCURRENT", int(os.getenv("OLLAMA_NUM_PARALLEL", "4")) * nodes))
+        self.active = 0
+        self.admitted = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.last_wait = 0.0
+        # priority -> queue key -> waiting futures; the OrderedDict order is the rotation
+        self._queues: Dict[int, "OrderedDict[Hashable, Deque[Tuple[asyncio.Future, float]]]"] = {
+            PRIORITY_INTERACTIVE: OrderedDict(),
+            PRIORITY_BACKGROUND: OrderedDict()
+        }
+        gauge("llm_queue_depth", "LLM requests waiting for a slot", ("priority",)).set_function(lambda: {
+            ("interactive",): self.queue_depth(PRIORITY_INTERACTIVE),
+            ("background",): self.queue_depth(PRIORITY_BACKGROUND)
+        })
+        gauge("llm_active", "LLM requests currently sent to Ollama").set_function(lambda: self.active)
+
+    def _next_waiter(self) -> Optional[Tuple[asyncio.Future, float]]:
+        for priority in sorted(self._queues):
+            queues = self._queues[priority]
+            while queues:
+                key, waiters = next(iter(queues.items()))
+                waiter = waiters.popleft()
+                # Move this key to the back of the rotation (or drop it when drained)
+                del queues[key]
+                if waiters:
+                    queues[key] = waiters
+                if not waiter[0].done():
+                    return waiter
+        return None
+
+    def _dispatch(self):
+        while self.active < self.max_concurrent:
+            waiter = self._next_waiter()
+            if waiter is None:
+                return
+            future, enqueued = waiter
+            waited = time.monotonic() - enqueued
+            self.active += 1
+            self.admitted += 1
+            self.total_wait += waited
+            self.last_wait = waited
+            self.max_wait = max(self.max_wait, waited)
+            WAIT_SECONDS.observe(waited)
+            future.set_result(None)
+
+    def _release(self):
+        self.active -= 1
+        self._dispatch()
+
+    @asynccontextmanager
+    async def slot(self, user_id: Any = None, channel_id: Any = None,
+                   priority: int = PRIORITY_INTERACTIVE) -> AsyncIterator[None]:
+        """Wait for this user's turn and a free backend slot; held for the duration of the block"""
+        future = asyncio.get_running_loop().create_future()
+        key = (user_id, channel_id)
+        self._queues[priority].setdefault(key, deque()).append((future, time.monotonic()))
+        self._dispatch()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Admitted just as the caller gave up - hand the slot on
+                self._release()
+            else:
+                future.cancel()
+            raise
+        try:
+            yield
+        finally:
+            self._release()
+
+    def queue_depth(self, priority: Optional[int] = None) -> int:
+        priorities = [priority] if priority is not None else list(self._queues)
+        return sum(sum(1 for f, _ in waiters if not f.done())
+                   for p in priorities for waiters in self._queues[p].values())
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "active": self.active,
+            "max_concurrent": self.max_concurrent,
+            "queued_interactive": self.queue_depth(PRIORITY_INTERACTIVE),
+            "queued_background": self.queue_depth(PRIORITY_BACKGROUND),
+            "admitted": self.admitted,
+            "avg_wait": self.total_wait / self.admitted if self.admitted else 0.0,
+            "max_wait": self.max_wait,
+            "last_wait": self.last_wait
+        }
+
+    def summary(self) -> str:
+        stats = self.stats()
+        return (f"{stats['active']}/{stats['max_concurrent']} running, "
+                f"{stats['queued_interactive'] + stats['queued_background']} queued, "
+                f"avg wait {stats['avg_wait']:.2f}s (max {stats['max_wait']:.2f}s)")
+
+
+_shared_scheduler: Optional[FairScheduler] = None
+
+
+def get_llm_scheduler() -> FairScheduler:
+    """Return the process-wide LLM scheduler"""
+    global _shared_scheduler
+    if _shared_scheduler is None:
+        _shared_scheduler = FairScheduler()
+    return _shared_scheduler
@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+"""
+MCP Sessions
+Long-lived stdio JSON-RPC sessions to the MCP tool servers, one per server
+"""
+
+import asyncio
+import itertools
+import json
+import time
+from typing import Dict, List, Any, Optional
+
+from health import CircuitBreaker
+from metrics import counter, gauge, histogram
+
+# Tool output (scan reports) can be far larger than asyncio's 64 KiB default line limit
+MAX_LINE_BYTES = 16 * 1024 * 1024
+
+CALL_SECONDS = histogram("mcp_call_seconds", "Round trip of MCP requests to the tool servers (incl. docker exec)",
+                         ("server", "tool"))
+CALL_ERRORS = counter("mcp_call_errors_total", "MCP requests that failed or timed out", ("server", "tool"))
+IN_FLIGHT = gauge("mcp_in_flight", "MCP requests waiting for a response", ("server",))
+
+
+class MCPSessionError(Exception):
+    """Raised when an MCP session cannot be started or dies with calls in flight"""
+
+
+class MCPSession:
+    """One persistent MCP server process; concurrent calls are matched by JSON-RPC id"""
+
+    def __init__(self, name: str, command: List[str], call_timeout: float = 300):
+        self.name = name
+        self.command = command
+        self.call_timeout = call_timeout
+        self.restarts = 0
+        self._process: Optional[asyncio.subprocess.Process] = None
+        self._reader: Optional[asyncio.Task] = None
+        # Calls waiting on the current process; each process gets its own dict (see _read_loop)
+        self._pending: Dict[int, asyncio.Future] = {}
+        self._ids = itertools.count(1)
+        self._start_lock: Optional[asyncio.Lock] = None
+
+    @property
+    def running(self) -> bool:
+        return self._process is not None and self._process.returncode is None
+
+    async def _ensure_started(self):
+        """Spawn the server process if it isn't running (first call or after it died)"""
+        if self.running:
+            return
+        if self._start_lock is None:
+            self._start_lock = asyncio.Lock()
+        async with self._start_lock:
+            if self.running:
+                return
+            if self._process is not None:
+                self.restarts += 1
+            try:
+                self._process = await asyncio.create_subprocess_exec(
+                    *self.command,
+                    stdin=asyncio.subprocess.PIPE,
+                    stdout=asyncio.subprocess.PIPE,
+                    limit=MAX_LINE_BYTES
+                )
+            except OSError as e:
+                raise MCPSessionError(f"Could not start MCP session '{self.name}': {str(e)}")
+            self._pending = {}
+            self._reader = asyncio.ensure_future(self._read_loop(self._process, self._pending))
+
+    async def _read_loop(self, process: asyncio.subprocess.Process, pending: Dict[int, asyncio.Future]):
+        """Route each response line to the caller waiting on its id
+
+        `pending` belongs to this process only: a dying process's reader can
+        still be cleaning up after a replacement was spawned, and must not
+        fail the calls already sent to the new one.
+        """
+        try:
+            while True:
+                line = await process.stdout.readline()
+                if not line:
+                    break
+                try:
+                    message = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                if not isinstance(message, dict):
+                    continue
+                if "method" in message and "id" not in message:
+                    # Server notification (e.g. notifications/progress), not a response
+                    continue
+                if message.get("id") in pending:
+                    future = pending.pop(message["id"])
+                elif "id" not in message and pending:
+                    # Servers that don't echo ids answer in order - hand it to the oldest call
+                    future = pending.pop(next(iter(pending)))
+                else:
+                    continue
+                if not future.done():
+                    future.set_result(message)
+        except (asyncio.CancelledError, ValueError):
+            pass
+        finally:
+            if process.returncode is None:
+                try:
+                    process.kill()
+                except ProcessLookupError:
+                    pass
+            await process.wait()
+            # Fail every call still waiting on this process; the next call respawns it
+            waiting = list(pending.values())
+            pending.clear()
+            for future in waiting:
+                if not future.done():
+                    future.set_exception(MCPSessionError(f"MCP session '{self.name}' exited"))
+
+    async def request(self, method: str, params: Dict[str, Any],
+                      timeout: Optional[float] = None) -> Dict[str, Any]:
+        """Send one JSON-RPC request and wait for its response"""
+        tool = params.get("name", method) if method == "tools/call" else method
+        started = time.perf_counter()
+        failed = True
+        try:
+            response = await self._send(method, params, timeout)
+            failed = "error" in response
+            return response
+        finally:
+            CALL_SECONDS.observe(time.perf_counter() - started, self.name, tool)
+            if failed:
+                CALL_ERRORS.inc(self.name, tool)
+
+    async def _send(self, method: str, params: Dict[str, Any], timeout: Optional[float]) -> Dict[str, Any]:
+        await self._ensure_started()
+        process, pending = self._process, self._pending
+        request_id = next(self._ids)
+        future = asyncio.get_running_loop().create_future()
+        pending[request_id] = future
+        frame = json.dumps({
+            "jsonrpc": "2.0",
+            "id": request_id,
+            "method": method,
+            "params": params
+        }) + "\n"
+        try:
+            process.stdin.write(frame.encode())
+            await process.stdin.drain()
+            return await asyncio.wait_for(future, timeout or self.call_timeout)
+        except (BrokenPipeError, ConnectionResetError):
+            raise MCPSessionError(f"MCP session '{self.name}' exited")
+        finally:
+            pending.pop(request_id, None)
+
+    async def call_tool(self, tool: str, arguments: Dict[str, Any],
+                        timeout: Optional[float] = None) -> Dict[str, Any]:
+        """Call an MCP tool on this session"""
+        return await self.request("tools/call", {"name": tool, "arguments": arguments}, timeout)
+
+    async def close(self):
+        """Stop the server process"""
+        if self.running:
+            self._process.stdin.close()
+            try:
+                await asyncio.wait_for(self._process.wait(), 5)
+            except asyncio.TimeoutError:
+                self._process.kill()
+        if self._reader is not None:
+            await asyncio.gather(self._reader, return_exceptions=True)
+
+
+class MCPSessionPool:
+    """Lazily started MCP sessions keyed by server name
+
+    Each server has its own circuit breaker: once a server keeps failing,
+    tool calls to it raise MCPSessionError at once until it recovers.
+    """
+
+    def __init__(self, commands: Dict[str, List[str]], call_timeout: float = 300):
+        self.commands = commands
+        self.call_timeout = call_timeout
+        self.sessions: Dict[str, MCPSession] = {}
+        self.breakers: Dict[str, CircuitBreaker] = {}
+        IN_FLIGHT.set_function(lambda: {(name,): len(session._pending) for name, session in self.sessions.items()})
+
+    def get(self, server: str) -> MCPSession:
+        if server not in self.sessions:
+            if server not in self.commands:
+                raise MCPSessionError(f"Unknown MCP server '{server}'")
+            self.sessions[server] = MCPSession(server, self.commands[server], self.call_timeout)
+        return self.sessions[server]
+
+    def breaker(self, server: str) -> CircuitBreaker:
+        if server not in self.breakers:
+            self.breakers[server] = CircuitBreaker(f"mcp:{server}")
+        return self.breakers[server]
+
+    async def call_tool(self, server: str, tool: str, arguments: Dict[str, Any],
+                        timeout: Optional[float] = None) -> Dict[str, Any]:
+        session = self.get(server)
+        breaker = self.breaker(server)
+        if not breaker.allow():
+            raise MCPSessionError(breaker.unavailable(f"MCP server '{server}'"))
+        try:
+            response = await session.call_tool(tool, arguments, timeout)
+        except asyncio.TimeoutError:
+            breaker.record_failure(f"{tool} timed out")
+            raise
+        except MCPSessionError as e:
+            breaker.record_failure(str(e))
+            raise
+        # A JSON-RPC error is the tool's answer; the server itself is fine
+        breaker.record_success()
+        return response
+
+    async def close(self):
+        await asyncio.gather(*(session.close() for session in self.sessions.values()),
+                             return_exceptions=True)
+        self.sessions.clear()
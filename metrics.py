@@ -0,0 +1,291 @@
+#!/usr/bin/env python3
+"""
+Metrics
+In-process histograms, counters and gauges exported in Prometheus text format
+over a small local HTTP endpoint and the `get_metrics` MCP tool
+"""
+
+import asyncio
+import json
+import math
+import os
+import sys
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple, Union
+
+# Seconds: covers a fast dict lookup up to a slow LLM answer or scan
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+RATE_BUCKETS = (1, 2, 5, 10, 20, 30, 50, 75, 100, 150, 200, 300)
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels_text(names: Tuple[str, ...], values: LabelValues, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class Histogram:
+    """Bucketed observations per label set; observe() is a dict lookup and a bisect"""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, description: str, labels: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.name = name
+        self.description = description
+        self.labels = labels
+        self.buckets = tuple(sorted(buckets))
+        # label values -> [per-bucket counts (last is +Inf), sum, count]
+        self._series: Dict[LabelValues, List[Any]] = {}
+
+    def observe(self, value: float, *label_values: str):
+        series = self._series.get(label_values)
+        if series is None:
+            series = self._series[label_values] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+        series[2] += 1
+
+    @contextmanager
+    def time(self, *label_values: str) -> Iterator[None]:
+        """Observe the duration of the block (also across awaits)"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, *label_values)
+
+    def quantile(self, q: float, *label_values: str) -> Optional[float]:
+        """Estimate from the buckets (linear within a bucket), as Prometheus' histogram_quantile does"""
+        series = self._series.get(label_values)
+        if series is None or not series[2]:
+            return None
+        rank = q * series[2]
+        seen = 0
+        lower = 0.0
+        for index, count in enumerate(series[0]):
+            if count and seen + count >= rank:
+                if index == len(self.buckets):
+                    return self.buckets[-1]
+                upper = self.buckets[index]
+                return lower + (upper - lower) * (rank - seen) / count
+            seen += count
+            lower = self.buckets[index] if index < len(self.buckets) else lower
+        return self.buckets[-1]
+
+    def render(self) -> List[str]:
+        lines = []
+        for values, (counts, total, count) in sorted(self._series.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (math.inf,), counts):
+                cumulative += bucket_count
+                le = 'le="%s"' % _number(bound)
+                lines.append(f"{self.name}_bucket{_labels_text(self.labels, values, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels_text(self.labels, values)} {_number(total)}")
+            lines.append(f"{self.name}_count{_labels_text(self.labels, values)} {count}")
+        return lines
+
+    def snapshot(self) -> Dict[str, Any]:
+        result = {}
+        for values, (_, total, count) in sorted(self._series.items()):
+            result[",".join(values) or "_"] = {
+                "count": count,
+                "avg": total / count if count else 0.0,
+                "p50": self.quantile(0.5, *values),
+                "p99": self.quantile(0.99, *values)
+            }
+        return result
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name: str, description: str, labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.description = description
+        self.labels = labels
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, *label_values: str, amount: float = 1):
+        self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self) -> List[str]:
+        return [f"{self.name}{_labels_text(self.labels, values)} {_number(value)}"
+                for values, value in sorted(self._values.items())]
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {",".join(values) or "_": value for values, value in sorted(self._values.items())}
+
+
+class Gauge:
+    """Set directly, or read from a function at export time (queue depths cost nothing until scraped)"""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, description: str, labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.description = description
+        self.labels = labels
+        self._values: Dict[LabelValues, float] = {}
+        self._function: Optional[Callable[[], Union[float, Dict[LabelValues, float]]]] = None
+
+    def set(self, value: float, *label_values: str):
+        self._values[label_values] = value
+
+    def set_function(self, function: Callable[[], Union[float, Dict[LabelValues, float]]]):
+        """`function` returns one value, or {label values: value} for labelled gauges"""
+        self._function = function
+
+    def _current(self) -> Dict[LabelValues, float]:
+        if self._function is None:
+            return self._values
+        try:
+            value = self._function()
+        except Exception:
+            return self._values
+        return value if isinstance(value, dict) else {(): value}
+
+    def render(self) -> List[str]:
+        return [f"{self.name}{_labels_text(self.labels, values)} {_number(value)}"
+                for values, value in sorted(self._current().items())]
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {",".join(values) or "_": value for values, value in sorted(self._current().items())}
+
+
+Metric = Union[Histogram, Counter, Gauge]
+
+
+class MetricsRegistry:
+    """Metrics by name; declaring the same name twice returns the existing metric"""
+
+    def __init__(self):
+        self.metrics: Dict[str, Metric] = {}
+
+    def _get(self, cls, name: str, *args, **kwargs) -> Metric:
+        metric = self.metrics.get(name)
+        if metric is None:
+            metric = self.metrics[name] = cls(name, *args, **kwargs)
+        elif not isinstance(metric, cls):
+            raise ValueError(f"Metric '{name}' already registered as a {metric.kind}")
+        return metric
+
+    def histogram(self, name: str, description: str, labels: Tuple[str, ...] = (),
+                  buckets: Tuple[float, ...] = LATENCY_BUCKETS) -> Histogram:
+        return self._get(Histogram, name, description, labels, buckets)
+
+    def counter(self, name: str, description: str, labels: Tuple[str, ...] = ()) -> Counter:
+        return self._get(Counter, name, description, labels)
+
+    def gauge(self, name: str, description: str, labels: Tuple[str, ...] = ()) -> Gauge:
+        return self._get(Gauge, name, description, labels)
+
+    def render(self) -> str:
+        """Prometheus text exposition format (version 0.0.4)"""
+        lines = []
+        for name in sorted(self.metrics):
+            metric = self.metrics[name]
+            lines.append(f"# HELP {name} {metric.description}")
+            lines.append(f"# TYPE {name} {metric.kind}")
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Compact JSON view: counts, averages and p50/p99 estimates instead of raw buckets"""
+        return {name: metric.snapshot() for name, metric in sorted(self.metrics.items())}
+
+
+REGISTRY = MetricsRegistry()
+histogram = REGISTRY.histogram
+counter = REGISTRY.counter
+gauge = REGISTRY.gauge
+
+
+async def _serve_client(reader: asyncio.StreamReader, writer: asyncio.StreamWriter,
+                        registry: MetricsRegistry):
+    try:
+        request_line = await asyncio.wait_for(reader.readline(), 5)
+        # Drain the headers; nothing in them matters here
+        while (await asyncio.wait_for(reader.readline(), 5)).strip():
+            pass
+        parts = request_line.decode("latin-1").split()
+        path = parts[1].split("?", 1)[0] if len(parts) > 1 else ""
+        if path in ("/metrics", "/"):
+            status, content_type, body = "200 OK", "text/plain; version=0.0.4", registry.render()
+        elif path == "/metrics.json":
+            status, content_type, body = "200 OK", "application/json", json.dumps(registry.snapshot())
+        else:
+            status, content_type, body = "404 Not Found", "text/plain", "Not found\n"
+        data = body.encode()
+        writer.write(f"HTTP/1.1 {status}\r\nContent-Type: {content_type}\r\n"
+                     f"Content-Length: {len(data)}\r\nConnection: close\r\n\r\n".encode() + data)
+        await writer.drain()
+    except (asyncio.TimeoutError, ConnectionError):
+        pass
+    finally:
+        writer.close()
+
+
+async def start_metrics_server(default_port: int = 0, registry: MetricsRegistry = REGISTRY
+                               ) -> Optional[asyncio.AbstractServer]:
+    """Serve /metrics on METRICS_HOST:METRICS_PORT (default 127.0.0.1:default_port; 0 = off)"""
+    port = int(os.getenv("METRICS_PORT", str(default_port)))
+    if port <= 0:
+        return None
+    host = os.getenv("METRICS_HOST", "127.0.0.1")
+    try:
+        server = await asyncio.start_server(
+            lambda reader, writer: _serve_client(reader, writer, registry), host, port)
+    except OSError as e:
+        # stderr: stdout carries the protocol when this runs inside an MCP stdio server
+        print(f"⚠️ Metrics endpoint not started on {host}:{port}: {e}", file=sys.stderr)
+        return None
+    print(f"📈 Metrics on http://{host}:{port}/metrics", file=sys.stderr)
+    return server
+
+
+# MCP tool exposed by every server in this repo
+METRICS_TOOL = {
+    "name": "get_metrics",
+    "description": "Latency histograms, counters and queue depths of this server",
+    "inputSchema": {
+        "type": "object",
+        "properties": {
+            "format": {
+                "type": "string",
+                "enum": ["prometheus", "json"],
+                "description": "prometheus text (default) or a JSON summary with p50/p99"
+            }
+        }
+    }
+}
+
+
+def metrics_tool_result(arguments: Dict[str, Any], registry: MetricsRegistry = REGISTRY) -> Dict[str, Any]:
+    if arguments.get("format") == "json":
+        text = json.dumps(registry.snapshot(), indent=2)
+    else:
+        text = registry.render()
+    return {
+        "result": {
+            "content": [{
+                "type": "text",
+                "text": text
+            }]
+        }
+    }
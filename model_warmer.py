@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+Model Warmer
+Preloads the configured Ollama model at startup and keeps it loaded between questions
+"""
+
+import asyncio
+import os
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional, Union
+
+from ollama_client import OllamaClient, OllamaError, OllamaPool
+
+
+def _match(model: str, running: Dict[str, Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    # /api/ps reports "llama3.2:latest" for a model configured as "llama3.2"
+    return running.get(model) or running.get(f"{model}:latest")
+
+
+def _expires_in(expires_at: Optional[str]) -> Optional[str]:
+    """Human countdown for an /api/ps expires_at timestamp"""
+    if not expires_at:
+        return None
+    try:
+        # Ollama sends nanoseconds and a numeric offset; fromisoformat wants at most microseconds
+        stamp = expires_at.replace("Z", "+00:00")
+        if "." in stamp:
+            head, rest = stamp.split(".", 1)
+            digits = len(rest) - len(rest.lstrip("0123456789"))
+            stamp = f"{head}.{rest[:digits][:6].ljust(6, '0')}{rest[digits:]}"
+        seconds = (datetime.fromisoformat(stamp) - datetime.now(timezone.utc)).total_seconds()
+    except ValueError:
+        return None
+    if seconds > 10 * 365 * 86400:
+        return "never"
+    if seconds <= 0:
+        return "now"
+    return f"{int(seconds // 60)}m" if seconds >= 60 else f"{int(seconds)}s"
+
+
+class ModelWarmer:
+    """Loads the model once at startup, then re-checks /api/ps every `interval` seconds
+
+    If Ollama has unloaded the model (idle expiry, restart, another model
+    pushed it out of memory) it is loaded again in the background, so the
+    load time lands here instead of on the next user's !ask.
+    """
+
+    def __init__(self, client: Union[OllamaClient, OllamaPool], model: str, interval: Optional[float] = None,
+                 load_timeout: Optional[float] = None):
+        self.client = client
+        self.model = model
+        # 0 disables the periodic check; the startup preload still happens
+        self.interval = float(interval if interval is not None else os.getenv("OLLAMA_KEEP_WARM_INTERVAL", "240"))
+        self.load_timeout = float(load_timeout or os.getenv("OLLAMA_LOAD_TIMEOUT", "300"))
+        self.enabled = os.getenv("OLLAMA_PRELOAD", "true").lower() in ("1", "true", "yes")
+        self.loading = False
+        self.loads = 0
+        self.last_load_seconds: Optional[float] = None
+        self.last_error: Optional[str] = None
+        self._task: Optional[asyncio.Task] = None
+        self._state: Optional[Dict[str, Any]] = None
+        self._state_time = 0.0
+
+    def start(self):
+        """Start preloading in the background (idempotent; call from setup_hook)"""
+        if self.enabled and (self._task is None or self._task.done()):
+            self._task = asyncio.ensure_future(self._run())
+
+    async def _run(self):
+        await self.warm()
+        while self.interval > 0:
+            await asyncio.sleep(self.interval)
+            try:
+                loaded = _match(self.model, await self.client.running_models()) is not None
+            except OllamaError as e:
+                self.last_error = str(e)
+                continue
+            if not loaded:
+                await self.warm()
+
+    async def warm(self) -> bool:
+        """Load the model now; returns False if Ollama could not load it"""
+        self.loading = True
+        try:
+            self.last_load_seconds = await self.client.load_model(self.model, timeout=self.load_timeout)
+            self.loads += 1
+            self.last_error = None
+            self._state = None
+            print(f"🔥 Model {self.model} loaded in {self.last_load_seconds:.1f}s")
+            return True
+        except OllamaError as e:
+            self.last_error = str(e)
+            print(f"⚠️ Could not preload model {self.model}: {e}")
+            return False
+        finally:
+            self.loading = False
+
+    def observe(self, running: Optional[Dict[str, Dict[str, Any]]], error: Optional[str] = None):
+        """Cache the load state from an /api/ps listing (None + error when Ollama didn't answer)"""
+        if running is None:
+            self._state = {"loaded": False, "reachable": False, "error": error}
+        else:
+            entry = _match(self.model, running)
+            self._state = {"loaded": entry is not None, "reachable": True}
+            if entry is not None:
+                self._state["size_vram"] = entry.get("size_vram", 0)
+                self._state["expires_at"] = entry.get("expires_at")
+        self._state_time = time.monotonic()
+
+    async def state(self, max_age: float = 5) -> Dict[str, Any]:
+        """Load state from /api/ps (cached for `max_age` seconds)"""
+        if self._state is None or time.monotonic() - self._state_time > max_age:
+            try:
+                self.observe(await self.client.running_models())
+            except OllamaError as e:
+                self.observe(None, str(e))
+        return self._state
+
+    async def probe(self, timeout: Optional[float] = None, endpoint: Optional[OllamaClient] = None) -> str:
+        """Health monitor probe of one node (default: the client): /api/ps past the circuit breaker
+
+        Refreshes the cached state from every node's last listing, so a pool
+        reports the model as loaded while any node has it.
+        """
+        endpoint = endpoint or self.client
+        error = None
+        try:
+            running = await endpoint.probe(timeout)
+        except OllamaError as e:
+            error = str(e)
+            raise
+        finally:
+            self.observe(self.client.last_running(), error)
+        return f"{self.model} {'loaded' if _match(self.model, running) else 'not loaded'}"
+
+    async def summary(self, max_age: float = 5) -> str:
+        if self.loading:
+            return f"🔄 {self.model} loading"
+        state = await self.state(max_age)
+        if not state["reachable"]:
+            return f"❓ {self.model} (Ollama unreachable)"
+        if not state["loaded"]:
+            return f"💤 {self.model} not loaded (next question pays the load time)"
+        text = f"🔥 {self.model} loaded"
+        if state.get("size_vram"):
+            text += f", {state['size_vram'] / 2**30:.1f} GB VRAM"
+        expires = _expires_in(state.get("expires_at"))
+        if expires == "never":
+            text += ", pinned in memory"
+        elif expires is not None:
+            text += f", unloads in {expires}"
+        return text
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
@@ -0,0 +1,573 @@
+#!/usr/bin/env python3
+"""
+Ollama Client
+Shared async HTTP client for Ollama with pooled keep-alive connections
+"""
+
+import asyncio
+import json
+import os
+import time
+from typing import TYPE_CHECKING, Awaitable, Callable, Dict, Any, AsyncIterator, List, Optional, Sequence, Union
+
+from health import OPEN, CircuitBreaker
+from metrics import RATE_BUCKETS, counter, gauge, histogram
+
+REQUEST_SECONDS = histogram("ollama_request_seconds", "Ollama HTTP call time (whole stream for streaming calls)",
+                            ("endpoint",))
+TTFT_SECONDS = histogram("ollama_ttft_seconds", "Time from sending a streaming request to its first token",
+                         ("model",))
+TOKENS_PER_SECOND = histogram("ollama_tokens_per_second", "Generation speed reported by Ollama (eval_count/eval_duration)",
+                              ("model",), RATE_BUCKETS)
+ERRORS = counter("ollama_errors_total", "Failed Ollama calls", ("endpoint",))
+HEDGES = counter("ollama_hedged_total", "Requests re-issued to a second Ollama node after OLLAMA_HEDGE_AFTER", ("model",))
+FAILOVERS = counter("ollama_failovers_total", "Requests retried on another Ollama node after the first one failed",
+                    ("model",))
+NODE_REQUESTS = counter("ollama_node_requests_total", "Requests routed to each Ollama node", ("node",))
+
+if TYPE_CHECKING:
+    import aiohttp
+
+
+def _record_call(path: str, started: float, failed: bool):
+    REQUEST_SECONDS.observe(time.perf_counter() - started, path)
+    if failed:
+        ERRORS.inc(path)
+
+
+def _record_speed(model: str, data: Dict[str, Any]):
+    """Ollama's final response carries eval_count tokens generated in eval_duration nanoseconds"""
+    count, duration = data.get("eval_count"), data.get("eval_duration")
+    if count and duration:
+        TOKENS_PER_SECOND.observe(count / (duration / 1e9), model)
+
+
+class OllamaError(Exception):
+    """Raised when Ollama cannot be reached or answers with an error"""
+
+    def __init__(self, message: str, status: Optional[int] = None):
+        super().__init__(message)
+        self.status = status
+
+
+class OllamaClient:
+    """Async Ollama client - one pooled aiohttp session shared by every caller
+
+    aiohttp is imported on the first request, so processes that never talk to
+    Ollama (MCP servers answering tools/list) don't pay for it at startup.
+
+    Every request goes through `breaker`: timeouts, connection failures and
+    5xx answers count against it, and while it is open requests raise
+    OllamaError immediately instead of waiting out their timeout.
+    """
+
+    def __init__(self, base_url: Optional[str] = None, max_connections: Optional[int] = None,
+                 request_timeout: Optional[float] = None, connect_timeout: Optional[float] = None,
+                 name: str = "ollama"):
+        self.base_url = (base_url or os.getenv("OLLAMA_URL", "http://localhost:11434")).rstrip("/")
+        self.name = name
+        self.max_connections = int(max_connections or os.getenv("OLLAMA_MAX_CONNECTIONS", "16"))
+        self.request_timeout = float(request_timeout or os.getenv("OLLAMA_TIMEOUT", "30"))
+        self.connect_timeout = float(connect_timeout or os.getenv("OLLAMA_CONNECT_TIMEOUT", "5"))
+        # How long Ollama keeps the model loaded after each request ("30m", "-1" = forever, "" = server default)
+        self.keep_alive = os.getenv("OLLAMA_KEEP_ALIVE", "30m")
+        self._session: Optional["aiohttp.ClientSession"] = None
+        self.breaker = CircuitBreaker(name)
+        # Last /api/ps listing (None until one succeeds, or after one failed); OllamaPool places requests by it
+        self.running: Optional[Dict[str, Dict[str, Any]]] = None
+
+    @property
+    def endpoints(self) -> List["OllamaClient"]:
+        """The nodes behind this client (for per-node health checks); OllamaPool has several"""
+        return [self]
+
+    def has_model(self, model: str) -> bool:
+        """Whether the last /api/ps listing had `model` loaded"""
+        # /api/ps reports "llama3.2:latest" for a model configured as "llama3.2"
+        return self.running is not None and (model in self.running or f"{model}:latest" in self.running)
+
+    def last_running(self) -> Optional[Dict[str, Dict[str, Any]]]:
+        return self.running
+
+    def note_loaded(self, model: str):
+        """Count `model` as loaded until the next listing says otherwise"""
+        if self.running is not None and not self.has_model(model):
+            self.running[model] = {"name": model}
+
+    def _check_circuit(self):
+        if not self.breaker.allow():
+            raise OllamaError(self.breaker.unavailable("Ollama"))
+
+    def _record_status(self, status: int):
+        # 4xx (unknown model, bad request) still means Ollama is up
+        if status >= 500:
+            self.breaker.record_failure(f"HTTP {status}")
+        else:
+            self.breaker.record_success()
+
+    def _failed(self, message: str) -> OllamaError:
+        self.breaker.record_failure(message)
+        return OllamaError(message)
+
+    def _get_session(self) -> "aiohttp.ClientSession":
+        """Create the pooled session lazily so it binds to the running loop"""
+        import aiohttp
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.max_connections,
+                limit_per_host=self.max_connections,
+                keepalive_timeout=60,
+                ttl_dns_cache=300
+            )
+            self._session = aiohttp.ClientSession(connector=connector)
+        return self._session
+
+    def _deadline(self, timeout: Optional[float]) -> "aiohttp.ClientTimeout":
+        import aiohttp
+        return aiohttp.ClientTimeout(total=timeout or self.request_timeout, connect=self.connect_timeout)
+
+    async def _request_json(self, method: str, path: str, payload: Optional[Dict[str, Any]] = None,
+                            timeout: Optional[float] = None, guarded: bool = True) -> Dict[str, Any]:
+        """Send one request and decode the JSON body, mapping failures to OllamaError
+
+        `guarded=False` skips the circuit breaker (health probes must reach a
+        backend whose circuit is open to notice it is back).
+        """
+        import aiohttp
+        if guarded:
+            self._check_circuit()
+        session = self._get_session()
+        started = time.perf_counter()
+        failed = True
+        try:
+            async with session.request(method, f"{self.base_url}{path}", json=payload,
+                                       timeout=self._deadline(timeout)) as response:
+                if guarded:
+                    self._record_status(response.status)
+                if response.status != 200:
+                    raise OllamaError(f"Ollama returned HTTP {response.status}", status=response.status)
+                data = await response.json(content_type=None)
+                failed = False
+                return data
+        except asyncio.TimeoutError:
+            message = f"Ollama request timed out after {timeout or self.request_timeout}s"
+            raise self._failed(message) if guarded else OllamaError(message)
+        except aiohttp.ClientError as e:
+            message = f"Ollama connection failed: {str(e)}"
+            raise self._failed(message) if guarded else OllamaError(message)
+        except asyncio.CancelledError:
+            # The caller gave up (e.g. a hedged request another node answered first)
+            failed = False
+            raise
+        finally:
+            _record_call(path, started, failed)
+
+    def _payload(self, payload: Dict[str, Any], options: Dict[str, Any]) -> Dict[str, Any]:
+        if self.keep_alive:
+            payload["keep_alive"] = self.keep_alive
+        payload.update(options)
+        return payload
+
+    async def generate(self, model: str, prompt: str, timeout: Optional[float] = None,
+                       **options: Any) -> str:
+        """Run a non-streaming completion and return the response text"""
+        payload = self._payload({"model": model, "prompt": prompt, "stream": False}, options)
+        data = await self._request_json("POST", "/api/generate", payload, timeout)
+        _record_speed(model, data)
+        return data.get("response", "No response")
+
+    async def chat(self, model: str, messages: List[Dict[str, str]], timeout: Optional[float] = None,
+                   **options: Any) -> str:
+        """Run a non-streaming /api/chat turn and return the assistant message text"""
+        payload = self._payload({"model": model, "messages": messages, "stream": False}, options)
+        data = await self._request_json("POST", "/api/chat", payload, timeout)
+        _record_speed(model, data)
+        return (data.get("message") or {}).get("content") or "No response"
+
+    def stream_generate(self, model: str, prompt: str, timeout: Optional[float] = None,
+                        **options: Any) -> AsyncIterator[str]:
+        """Run a streaming completion and yield response tokens as Ollama emits them"""
+        payload = self._payload({"model": model, "prompt": prompt, "stream": True}, options)
+        return self._stream("/api/generate", payload, lambda chunk: chunk.get("response"), timeout)
+
+    def stream_chat(self, model: str, messages: List[Dict[str, str]], timeout: Optional[float] = None,
+                    **options: Any) -> AsyncIterator[str]:
+        """Run a streaming /api/chat turn and yield assistant tokens as they arrive"""
+        payload = self._payload({"model": model, "messages": messages, "stream": True}, options)
+        return self._stream("/api/chat", payload,
+                            lambda chunk: (chunk.get("message") or {}).get("content"), timeout)
+
+    async def _stream(self, path: str, payload: Dict[str, Any], extract: Callable[[Dict[str, Any]], Optional[str]],
+                      timeout: Optional[float] = None) -> AsyncIterator[str]:
+        """POST a streaming request and yield the text `extract` pulls from each chunk
+
+        Ollama streams one JSON object per line. The deadline applies to the gap
+        between chunks rather than the whole generation, so long answers are fine
+        as long as tokens keep arriving.
+        """
+        import aiohttp
+        self._check_circuit()
+        deadline = aiohttp.ClientTimeout(total=None, connect=self.connect_timeout,
+                                         sock_read=timeout or self.request_timeout)
+        session = self._get_session()
+        model = payload.get("model", "")
+        started = time.perf_counter()
+        first = True
+        failed = True
+        try:
+            async with session.post(f"{self.base_url}{path}", json=payload,
+                                    timeout=deadline) as response:
+                self._record_status(response.status)
+                if response.status != 200:
+                    raise OllamaError(f"Ollama returned HTTP {response.status}", status=response.status)
+                async for line in response.content:
+                    if not line.strip():
+                        continue
+                    chunk = json.loads(line)
+                    if chunk.get("error"):
+                        raise OllamaError(chunk["error"])
+                    text = extract(chunk)
+                    if text:
+                        if first:
+                            TTFT_SECONDS.observe(time.perf_counter() - started, model)
+                            first = False
+                        yield text
+                    if chunk.get("done"):
+                        _record_speed(model, chunk)
+                        break
+                failed = False
+        except asyncio.TimeoutError:
+            raise self._failed(f"Ollama stream stalled for {timeout or self.request_timeout}s")
+        except aiohttp.ClientError as e:
+            raise self._failed(f"Ollama connection failed: {str(e)}")
+        except (GeneratorExit, asyncio.CancelledError):
+            # The caller stopped reading early; not an Ollama failure
+            failed = False
+            raise
+        finally:
+            _record_call(path, started, failed)
+
+    async def load_model(self, model: str, timeout: Optional[float] = None,
+                         keep_alive: Optional[str] = None) -> float:
+        """Load `model` into memory with an empty prompt (no tokens generated); returns seconds taken"""
+        payload = self._payload({"model": model, "prompt": "", "stream": False},
+                                {"keep_alive": keep_alive} if keep_alive else {})
+        started = asyncio.get_running_loop().time()
+        await self._request_json("POST", "/api/generate", payload, timeout)
+        self.note_loaded(model)
+        return asyncio.get_running_loop().time() - started
+
+    async def _ps(self, timeout: Optional[float], guarded: bool) -> Dict[str, Dict[str, Any]]:
+        try:
+            data = await self._request_json("GET", "/api/ps", timeout=timeout, guarded=guarded)
+        except OllamaError:
+            self.running = None
+            raise
+        self.running = {entry.get("name") or entry.get("model"): entry for entry in data.get("models", [])}
+        return self.running
+
+    async def running_models(self, timeout: Optional[float] = 5) -> Dict[str, Dict[str, Any]]:
+        """Models currently loaded by Ollama (/api/ps), keyed by name"""
+        return await self._ps(timeout, guarded=True)
+
+    async def list_models(self, timeout: Optional[float] = 5) -> Dict[str, Any]:
+        """Return the /api/tags listing"""
+        return await self._request_json("GET", "/api/tags", timeout=timeout)
+
+    async def probe(self, timeout: Optional[float] = 5) -> Dict[str, Dict[str, Any]]:
+        """running_models() past the circuit breaker, for health checks (raises OllamaError)"""
+        return await self._ps(timeout, guarded=False)
+
+    async def is_available(self, timeout: Optional[float] = 5) -> bool:
+        """Check whether Ollama answers /api/tags"""
+        try:
+            await self.list_models(timeout=timeout)
+            return True
+        except OllamaError:
+            return False
+
+    async def close(self):
+        """Close the pooled session"""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+
+def _node_name(url: str) -> str:
+    """"http://gpu1:11434/" -> "ollama:gpu1:11434" (breaker, health and metrics label)"""
+    return f"ollama:{url.split('://', 1)[-1].strip('/')}"
+
+
+class OllamaPool:
+    """Several Ollama nodes behind the OllamaClient interface
+
+    Each request goes to the node with the fewest requests in flight, among
+    the nodes whose circuit is not open and, if any, the nodes that have the
+    model loaded (per their last /api/ps, updated by the health probes).
+    A node that serves a model is counted as having it loaded from then on,
+    so one model isn't loaded onto every node.
+
+    With `hedge_after` > 0 a request with no answer (or, when streaming, no
+    first token) after that many seconds is sent to a second node too; the
+    first to answer wins and the other is cancelled. A request that fails
+    on one node before producing anything is retried once on another.
+    """
+
+    def __init__(self, urls: Sequence[str], hedge_after: Optional[float] = None, **options: Any):
+        if not urls:
+            raise ValueError("OllamaPool needs at least one URL")
+        self.nodes = [OllamaClient(url, name=_node_name(url), **options) for url in urls]
+        self.base_url = ",".join(node.base_url for node in self.nodes)
+        self.hedge_after = float(hedge_after if hedge_after is not None else os.getenv("OLLAMA_HEDGE_AFTER", "0"))
+        self.in_flight: Dict[str, int] = {node.name: 0 for node in self.nodes}
+        self._turn = 0
+        gauge("ollama_node_in_flight", "Requests in flight per Ollama node", ("node",)).set_function(
+            lambda: {(name,): count for name, count in self.in_flight.items()})
+
+    @property
+    def endpoints(self) -> List[OllamaClient]:
+        return list(self.nodes)
+
+    def last_running(self) -> Optional[Dict[str, Dict[str, Any]]]:
+        """Models loaded on any node as of the last listings (None if no node answered)"""
+        listings = [node.running for node in self.nodes if node.running is not None]
+        if not listings:
+            return None
+        merged: Dict[str, Dict[str, Any]] = {}
+        for listing in listings:
+            for name, entry in listing.items():
+                merged.setdefault(name, entry)
+        return merged
+
+    def _pick(self, model: str, exclude: Sequence[OllamaClient] = ()) -> Optional[OllamaClient]:
+        """Least-outstanding node among the usable ones, preferring nodes with `model` loaded"""
+        usable = [node for node in self.nodes if node not in exclude
+                  and (node.breaker.state != OPEN or node.breaker.retry_in() <= 0)]
+        if not usable:
+            return None
+        candidates = [node for node in usable if node.has_model(model)] or usable
+        # Rotate the start so ties are spread round-robin instead of always hitting the first node
+        self._turn = (self._turn + 1) % len(candidates)
+        candidates = candidates[self._turn:] + candidates[:self._turn]
+        return min(candidates, key=lambda node: self.in_flight[node.name])
+
+    def _first(self, model: str) -> OllamaClient:
+        node = self._pick(model)
+        if node is None:
+            retry = min(each.breaker.retry_in() for each in self.nodes)
+            raise OllamaError(f"All {len(self.nodes)} Ollama nodes are unavailable; retrying in {retry:.0f}s")
+        return node
+
+    def _acquire(self, node: OllamaClient):
+        self.in_flight[node.name] += 1
+        NODE_REQUESTS.inc(node.name)
+
+    def _release(self, node: OllamaClient, model: str, served: bool):
+        self.in_flight[node.name] -= 1
+        if served:
+            # Ollama loaded it to answer; keep routing this model here
+            node.note_loaded(model)
+
+    @staticmethod
+    def _retryable(error: OllamaError) -> bool:
+        # 4xx (unknown model, bad request) would fail the same way on every node
+        return error.status is None or error.status >= 500
+
+    async def _call(self, model: str, call: Callable[[OllamaClient], Awaitable[Any]]) -> Any:
+        """Run `call` on the best node, hedging and failing over as described on the class"""
+        tasks: Dict[asyncio.Future, OllamaClient] = {}
+        tried: List[OllamaClient] = []
+        error: Optional[OllamaError] = None
+
+        def launch(node: OllamaClient):
+            tried.append(node)
+            self._acquire(node)
+            tasks[asyncio.ensure_future(call(node))] = node
+
+        launch(self._first(model))
+        hedge = self.hedge_after
+        try:
+            while tasks:
+                done, _ = await asyncio.wait(tasks, timeout=hedge or None, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    # Slow: hedge once onto another node and take whichever answers first
+                    hedge = 0
+                    node = self._pick(model, exclude=tried)
+                    if node is not None:
+                        HEDGES.inc(model)
+                        launch(node)
+                    continue
+                for task in done:
+                    node = tasks.pop(task)
+                    try:
+                        result = task.result()
+                    except OllamaError as e:
+                        self._release(node, model, served=False)
+                        if not self._retryable(e):
+                            raise
+                        error = e
+                        continue
+                    except BaseException:
+                        # Anything else (a bad JSON body, a bug) still gives the node back
+                        self._release(node, model, served=False)
+                        raise
+                    self._release(node, model, served=True)
+                    return result
+                if not tasks:
+                    node = self._pick(model, exclude=tried)
+                    if node is not None:
+                        FAILOVERS.inc(model)
+                        launch(node)
+            raise error
+        finally:
+            for task, node in tasks.items():
+                task.cancel()
+                self._release(node, model, served=False)
+            if tasks:
+                await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _stream(self, model: str, start: Callable[[OllamaClient], AsyncIterator[str]]) -> AsyncIterator[str]:
+        """Stream from the node that produces the first token; hedging and failover end there"""
+        pending: Dict[asyncio.Future, OllamaClient] = {}
+        streams: Dict[OllamaClient, AsyncIterator[str]] = {}
+        tried: List[OllamaClient] = []
+        error: Optional[OllamaError] = None
+
+        def launch(node: OllamaClient):
+            tried.append(node)
+            self._acquire(node)
+            streams[node] = start(node).__aiter__()
+            pending[asyncio.ensure_future(streams[node].__anext__())] = node
+
+        async def drop(node: OllamaClient, served: bool):
+            self._release(node, model, served)
+            await streams.pop(node).aclose()
+
+        launch(self._first(model))
+        hedge = self.hedge_after
+        winner: Optional[OllamaClient] = None
+        first: Optional[str] = None
+        try:
+            while winner is None:
+                if not pending:
+                    raise error
+                done, _ = await asyncio.wait(pending, timeout=hedge or None, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    hedge = 0
+                    node = self._pick(model, exclude=tried)
+                    if node is not None:
+                        HEDGES.inc(model)
+                        launch(node)
+                    continue
+                for task in done:
+                    node = pending.pop(task)
+                    try:
+                        first = task.result()
+                    except StopAsyncIteration:
+                        # Finished without a token: still an answer
+                        pass
+                    except OllamaError as e:
+                        await drop(node, served=False)
+                        if not self._retryable(e):
+                            raise
+                        error = e
+                        continue
+                    except BaseException:
+                        await drop(node, served=False)
+                        raise
+                    winner = node
+                    break
+                if winner is None and not pending:
+                    node = self._pick(model, exclude=tried)
+                    if node is not None:
+                        FAILOVERS.inc(model)
+                        launch(node)
+        finally:
+            for task, node in pending.items():
+                task.cancel()
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+            for node in list(pending.values()):
+                await drop(node, served=False)
+
+        served = False
+        try:
+            if first is not None:
+                yield first
+                async for text in streams[winner]:
+                    yield text
+            served = True
+        finally:
+            await drop(winner, served)
+
+    async def generate(self, model: str, prompt: str, timeout: Optional[float] = None, **options: Any) -> str:
+        return await self._call(model, lambda node: node.generate(model, prompt, timeout, **options))
+
+    async def chat(self, model: str, messages: List[Dict[str, str]], timeout: Optional[float] = None,
+                   **options: Any) -> str:
+        return await self._call(model, lambda node: node.chat(model, messages, timeout, **options))
+
+    def stream_generate(self, model: str, prompt: str, timeout: Optional[float] = None,
+                        **options: Any) -> AsyncIterator[str]:
+        return self._stream(model, lambda node: node.stream_generate(model, prompt, timeout, **options))
+
+    def stream_chat(self, model: str, messages: List[Dict[str, str]], timeout: Optional[float] = None,
+                    **options: Any) -> AsyncIterator[str]:
+        return self._stream(model, lambda node: node.stream_chat(model, messages, timeout, **options))
+
+    async def _each(self, call: Callable[[OllamaClient], Awaitable[Any]]) -> List[Any]:
+        """`call` on every node whose circuit lets it through; raises if none succeeded"""
+        nodes = [node for node in self.nodes if node.breaker.state != OPEN or node.breaker.retry_in() <= 0]
+        results = await asyncio.gather(*(call(node) for node in nodes), return_exceptions=True)
+        answers = [result for result in results if not isinstance(result, BaseException)]
+        if not answers:
+            errors = [result for result in results if isinstance(result, BaseException)]
+            raise errors[0] if errors else OllamaError(f"All {len(self.nodes)} Ollama nodes are unavailable")
+        return answers
+
+    async def load_model(self, model: str, timeout: Optional[float] = None,
+                         keep_alive: Optional[str] = None) -> float:
+        """Load `model` on every reachable node, so any of them can take its requests; returns the slowest load"""
+        return max(await self._each(lambda node: node.load_model(model, timeout, keep_alive)))
+
+    async def running_models(self, timeout: Optional[float] = 5) -> Dict[str, Dict[str, Any]]:
+        """Models loaded on any node"""
+        await self._each(lambda node: node.running_models(timeout))
+        return self.last_running() or {}
+
+    async def probe(self, timeout: Optional[float] = 5) -> Dict[str, Dict[str, Any]]:
+        results = await asyncio.gather(*(node.probe(timeout) for node in self.nodes), return_exceptions=True)
+        if all(isinstance(result, BaseException) for result in results):
+            raise results[0]
+        return self.last_running() or {}
+
+    async def list_models(self, timeout: Optional[float] = 5) -> Dict[str, Any]:
+        """/api/tags merged across nodes"""
+        models: Dict[str, Any] = {}
+        for listing in await self._each(lambda node: node.list_models(timeout)):
+            for entry in listing.get("models", []):
+                models.setdefault(entry.get("name") or entry.get("model"), entry)
+        return {"models": list(models.values())}
+
+    async def is_available(self, timeout: Optional[float] = 5) -> bool:
+        """Whether any node answers /api/tags"""
+        try:
+            await self.list_models(timeout=timeout)
+            return True
+        except OllamaError:
+            return False
+
+    async def close(self):
+        await asyncio.gather(*(node.close() for node in self.nodes))
+
+
+_shared_client: Optional[Union[OllamaClient, OllamaPool]] = None
+
+
+def get_ollama_client() -> Union[OllamaClient, OllamaPool]:
+    """Return the process-wide Ollama client (a pool when OLLAMA_URLS lists several nodes)"""
+    global _shared_client
+    if _shared_client is None:
+        urls = [url.strip() for url in os.getenv("OLLAMA_URLS", "").split(",") if url.strip()]
+        _shared_client = OllamaPool(urls) if len(urls) > 1 else OllamaClient(urls[0] if urls else None)
+    return _shared_client
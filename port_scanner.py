@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Async Port Scanner
+In-process TCP connect scanner with bounded concurrency and per-connection timeouts
+"""
+
+import asyncio
+import ipaddress
+import socket
+from typing import Any, AsyncIterator, Dict, Iterable, Iterator, List, Optional, Tuple
+
+DEFAULT_PORTS = "22,80,443,8080,3000,8000,9000"
+MAX_HOSTS = 4096
+
+
+def expand_hosts(spec: str, limit: int = MAX_HOSTS) -> List[str]:
+    """Expand "10.0.0.1, 10.0.1.0/28, host.example" into individual hosts"""
+    hosts: List[str] = []
+    for part in str(spec).split(","):
+        part = part.strip()
+        if not part:
+            continue
+        if "/" in part:
+            network = ipaddress.ip_network(part, strict=False)
+            if network.num_addresses > limit:
+                raise ValueError(f"{part} has more than {limit} addresses")
+            hosts.extend(str(ip) for ip in (network.hosts() if network.num_addresses > 2 else network))
+        else:
+            hosts.append(part)
+        if len(hosts) > limit:
+            raise ValueError(f"More than {limit} hosts requested")
+    return hosts
+
+
+class AsyncPortScanner:
+    """TCP connect scanner; open ports are yielded as soon as they are found"""
+
+    def __init__(self, concurrency: int = 50, timeout: float = 5):
+        self.concurrency = max(1, int(concurrency))
+        self.timeout = float(timeout)
+        self.attempted = 0
+        self.open_count = 0
+
+    @classmethod
+    def from_settings(cls, settings: Dict[str, Any]) -> "AsyncPortScanner":
+        """Build a scanner from TargetManager global_settings (scan_threads, timeout)"""
+        return cls(concurrency=settings.get("scan_threads", 50), timeout=settings.get("timeout", 5))
+
+    async def _resolve(self, host: str) -> Optional[Tuple[int, str]]:
+        """Resolve once per host so every port probe skips DNS; returns (family, address)"""
+        try:
+            infos = await asyncio.get_running_loop().getaddrinfo(host, None, type=socket.SOCK_STREAM)
+        except socket.gaierror:
+            return None
+        return (infos[0][0], infos[0][4][0]) if infos else None
+
+    async def _probe(self, family: int, address: str, port: int) -> bool:
+        # Bare non-blocking socket: much cheaper per probe than a transport/protocol pair
+        sock = socket.socket(family, socket.SOCK_STREAM)
+        sock.setblocking(False)
+        try:
+            await asyncio.wait_for(asyncio.get_running_loop().sock_connect(sock, (address, port)), self.timeout)
+            return True
+        except (OSError, asyncio.TimeoutError):
+            return False
+        finally:
+            sock.close()
+
+    async def scan(self, hosts: List[str], ports: Iterable[int]) -> AsyncIterator[Tuple[str, int]]:
+        """Yield (host, port) for every open port across all hosts (ports: a PortSpec or any iterable)"""
+        resolved = await asyncio.gather(*(self._resolve(host) for host in hosts))
+        probes: Iterator[Tuple[str, Tuple[int, str], int]] = (
+            (host, address, port)
+            for host, address in zip(hosts, resolved) if address
+            for port in ports
+        )
+        found: "asyncio.Queue[Optional[Tuple[str, int]]]" = asyncio.Queue()
+
+        async def worker():
+            # A fixed pool pulling from one shared iterator keeps task count at `concurrency`
+            for host, address, port in probes:
+                self.attempted += 1
+                if await self._probe(address[0], address[1], port):
+                    self.open_count += 1
+                    await found.put((host, port))
+
+        workers = [asyncio.ensure_future(worker()) for _ in range(self.concurrency)]
+        done = asyncio.ensure_future(asyncio.gather(*workers))
+        done.add_done_callback(lambda _: found.put_nowait(None))
+        try:
+            while True:
+                item = await found.get()
+                if item is None:
+                    break
+                yield item
+            await done
+        finally:
+            for task in workers:
+                task.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
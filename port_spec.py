@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""
+Port Specifications
+Port sets parsed once into a 65536-bit bitmap, with ranges, named groups and set operations
+"""
+
+from functools import lru_cache
+from typing import Iterable, Iterator, List, Tuple, Union
+
+MAX_PORT = 65535
+
+# Named groups usable anywhere a port list is accepted, e.g. "top100,8000-8100"
+PORT_GROUPS = {
+    # nmap's 100 most common TCP ports (nmap -F)
+    "top100": "7,9,13,21-23,25-26,37,53,79-81,88,106,110-111,113,119,135,139,143-144,179,199,389,427,"
+              "443-445,465,513-515,543-544,548,554,587,631,646,873,990,993,995,1025-1029,1110,1433,1720,"
+              "1723,1755,1900,2000-2001,2049,2121,2717,3000,3128,3306,3389,3986,4899,5000,5009,5051,5060,"
+              "5101,5190,5357,5432,5631,5666,5800,5900,6000-6001,6646,7070,8000,8008-8009,8080-8081,8443,"
+              "8888,9100,9999-10000,32768,49152-49157",
+    "web": "80,443,3000,5000,8000,8008,8080-8081,8443,8888,9000",
+    "all": f"1-{MAX_PORT}"
+}
+
+
+def _range_bits(start: int, end: int) -> int:
+    if not 0 < start <= end <= MAX_PORT:
+        raise ValueError(f"Invalid port range: {start}-{end}")
+    return (1 << (end + 1)) - (1 << start)
+
+
+@lru_cache(maxsize=1024)
+def _parse_bits(spec: str) -> int:
+    bits = 0
+    for part in spec.split(","):
+        part = part.strip().lower()
+        if not part:
+            continue
+        if part in PORT_GROUPS:
+            bits |= _parse_bits(PORT_GROUPS[part])
+        elif "-" in part:
+            start, end = part.split("-", 1)
+            bits |= _range_bits(int(start), int(end))
+        else:
+            bits |= _range_bits(int(part), int(part))
+    return bits
+
+
+@lru_cache(maxsize=1024)
+def _format_bits(bits: int) -> str:
+    """Canonical string for a bitmap; cached since imports format the same few specs many times"""
+    spec = PortSpec(bits)
+    plain = spec._range_string()
+    parts = []
+    rest = bits
+    for name in sorted(PORT_GROUPS, key=lambda g: -bin(_parse_bits(PORT_GROUPS[g])).count("1")):
+        group = _parse_bits(PORT_GROUPS[name])
+        # Only name a group that is fully included and still covers something
+        if bits & group == group and rest & group:
+            parts.append(name)
+            rest &= ~group
+    if not parts:
+        return plain
+    grouped = ",".join(parts + ([PortSpec(rest)._range_string()] if rest else []))
+    return grouped if len(grouped) < len(plain) else plain
+
+
+class PortSpec:
+    """Immutable set of TCP ports stored as one integer bitmap (bit N set = port N included)
+
+    Union, intersection and difference are single integer operations, so
+    comparing the port sets of many targets never goes back to strings.
+    str() gives the compact serialized form stored in targets.json.
+    """
+
+    __slots__ = ("bits",)
+
+    def __init__(self, bits: int = 0):
+        self.bits = bits
+
+    @classmethod
+    def parse(cls, spec: Union[str, int, Iterable[int], "PortSpec", None]) -> "PortSpec":
+        """Parse "1-1024,top100,web,8443" (also accepts a port, a list of ports or a PortSpec)"""
+        if spec is None:
+            return cls()
+        if isinstance(spec, PortSpec):
+            return spec
+        if isinstance(spec, int):
+            return cls(_range_bits(spec, spec))
+        if isinstance(spec, str):
+            try:
+                return cls(_parse_bits(spec))
+            except ValueError as e:
+                raise ValueError(f"Invalid port spec '{spec}': {e}") from None
+        bits = 0
+        for port in spec:
+            bits |= _range_bits(int(port), int(port))
+        return cls(bits)
+
+    def _runs(self) -> Iterator[Tuple[int, int]]:
+        # Walk the reversed binary string: str.find skips whole gaps at C speed
+        digits = bin(self.bits)[:1:-1]
+        start = digits.find("1")
+        while start != -1:
+            end = digits.find("0", start)
+            if end == -1:
+                end = len(digits)
+            yield start, end - 1
+            start = digits.find("1", end)
+
+    def ranges(self) -> List[Tuple[int, int]]:
+        """Contiguous (first, last) port runs in ascending order"""
+        return list(self._runs())
+
+    def __iter__(self) -> Iterator[int]:
+        for start, end in self._runs():
+            yield from range(start, end + 1)
+
+    def __len__(self) -> int:
+        return bin(self.bits).count("1")
+
+    def __bool__(self) -> bool:
+        return self.bits != 0
+
+    def __contains__(self, port: object) -> bool:
+        return isinstance(port, int) and 0 <= port <= MAX_PORT and bool(self.bits >> port & 1)
+
+    def __or__(self, other: "PortSpec") -> "PortSpec":
+        return PortSpec(self.bits | PortSpec.parse(other).bits)
+
+    def __and__(self, other: "PortSpec") -> "PortSpec":
+        return PortSpec(self.bits & PortSpec.parse(other).bits)
+
+    def __sub__(self, other: "PortSpec") -> "PortSpec":
+        return PortSpec(self.bits & ~PortSpec.parse(other).bits)
+
+    def __eq__(self, other: object) -> bool:
+        return isinstance(other, PortSpec) and self.bits == other.bits
+
+    def __hash__(self) -> int:
+        return hash(self.bits)
+
+    def issubset(self, other: "PortSpec") -> bool:
+        return self.bits & ~PortSpec.parse(other).bits == 0
+
+    @staticmethod
+    def union(specs: Iterable["PortSpec"]) -> "PortSpec":
+        bits = 0
+        for spec in specs:
+            bits |= PortSpec.parse(spec).bits
+        return PortSpec(bits)
+
+    @staticmethod
+    def intersection(specs: Iterable["PortSpec"]) -> "PortSpec":
+        bits = None
+        for spec in specs:
+            spec_bits = PortSpec.parse(spec).bits
+            bits = spec_bits if bits is None else bits & spec_bits
+        return PortSpec(bits or 0)
+
+    def _range_string(self) -> str:
+        return ",".join(str(start) if start == end else f"{start}-{end}" for start, end in self._runs())
+
+    def to_string(self) -> str:
+        """Compact form: ascending ranges, or whole named groups plus ranges when that is shorter"""
+        return _format_bits(self.bits)
+
+    def __str__(self) -> str:
+        return self.to_string()
+
+    def __repr__(self) -> str:
+        return f"PortSpec('{self.to_string()}')"
+
+
+def normalize_ports(spec: Union[str, Iterable[int], PortSpec]) -> str:
+    """Canonical serialized form of a port spec, as stored in targets.json"""
+    return PortSpec.parse(spec).to_string()
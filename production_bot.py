@@ -6,16 +6,76 @@ Update this file with your custom configurations
 import asyncio
 import json
 import os
-import requests
+from typing import Optional
 import discord
 from discord.ext import commands
+from ollama_client import OllamaError, get_ollama_client
+from discord_streaming import StreamingReply
+from discord_outbox import Outbox
+from llm_cache import LLMCache, split_bypass_flag
+from llm_scheduler import PRIORITY_BACKGROUND, get_llm_scheduler
+from prompt_builder import PromptTemplate, RenderedPrompt, get_model_limits
+from conversation import ConversationStore
+from model_warmer import ModelWarmer
+from health import HealthMonitor
+from command_router import CommandContext, CommandRouter, CommandTimings, RateLimiter
+from metrics import start_metrics_server
+from shared_state import get_shared_state
+from sharding import shard_config
+from target_context import TargetContextStore, split_scope_flags
+
+class ConfigurableSecurityBot(commands.AutoShardedBot):
+    # Bump whenever _build_prompt changes so cached answers from the old prompt are not reused
+    PROMPT_VERSION = "2"
+    PROMPT = PromptTemplate("""{system}
+Provide a helpful, accurate security answer to this question:
+
+Question: {question}
+
+If suggesting tools, recommend legitimate security tools and mention they should only be used on authorized targets.""")
+    SYSTEM_PROMPT = "You are a cybersecurity expert assistant."
+    CHAT_SYSTEM_PROMPT = ("You are a cybersecurity expert assistant. Provide helpful, accurate security answers. "
+                          "If suggesting tools, recommend legitimate security tools and mention they should "
+                          "only be used on authorized targets.")
+    CHAT_PROMPT = PromptTemplate("{question}")
 
-class ConfigurableSecurityBot(commands.Bot):
     def __init__(self):
         # Load configuration
         self.token = os.getenv("DISCORD_TOKEN")
-        self.ollama_url = "http://localhost:11434"
+        self.llm = get_ollama_client()
+        self.ollama_url = self.llm.base_url
         self.model = os.getenv("OLLAMA_MODEL", "llama3.2")
+        self.limits = get_model_limits(self.model)
+        self.warmer = ModelWarmer(self.llm, self.model)
+        # Background probe of each Ollama node; !status shows the cached results and failures trip its breaker
+        self.health = HealthMonitor()
+        for endpoint in self.llm.endpoints:
+            self.health.add(endpoint.name, lambda endpoint=endpoint: self.warmer.probe(self.health.timeout, endpoint),
+                            endpoint.breaker)
+        self.outbox = Outbox()
+        self.streaming = os.getenv("LLM_STREAMING", "true").lower() in ("1", "true", "yes")
+        self.cache = LLMCache()
+        self.scheduler = get_llm_scheduler()
+        self.chat_memory = os.getenv("CHAT_MEMORY", "true").lower() in ("1", "true", "yes")
+        summarize = os.getenv("CHAT_SUMMARIZE", "false").lower() in ("1", "true", "yes")
+        # Shared with every other shard process on the host
+        self.state = get_shared_state()
+        self.conversations = ConversationStore(summarizer=self._summarize_history if summarize else None,
+                                               state=self.state)
+        # Default target per guild/channel/user
+        self.contexts = TargetContextStore(self.state)
+        self.metrics_server = None
+        self.timings = CommandTimings()
+        self.rate_limiter = RateLimiter()
+        self.router = CommandRouter(self._reply)
+        self.router.use(self.timings.middleware())
+        self.router.use(self.rate_limiter.middleware())
+        self.router.add("!help", self._send_help)
+        self.router.add("!ask", self._handle_ask)
+        self.router.add("!reset", self._reset)
+        self.router.add("!status", self._send_status)
+        self.router.add("!scan", self._handle_scan)
+        self.router.add("!target", self._set_target)
         
         if not self.token:
             raise ValueError("DISCORD_TOKEN environment variable required")
@@ -25,12 +85,14 @@ class ConfigurableSecurityBot(commands.Bot):
         intents = discord.Intents.default()
         intents.guilds = True
         intents.messages = True
-        super().__init__(command_prefix='!', intents=intents)
+        super().__init__(command_prefix='!', intents=intents, **shard_config())
 
     async def on_ready(self):
         print(f'🤖 Security Bot logged in as {self.user}')
         print(f'📝 Model: {self.model}')
         print('Ready to respond to commands!')
+        # No-op while the keep-warm task is alive; re-warms after a reconnect if it had stopped
+        self.warmer.start()
         
         # Set bot status
         await self.change_presence(activity=discord.Activity(
@@ -38,30 +100,47 @@ class ConfigurableSecurityBot(commands.Bot):
             name="security commands"
         ))
 
+    async def setup_hook(self):
+        # Load the model while Discord connects so the first !ask doesn't pay for it
+        self.warmer.start()
+        self.health.start()
+        self.metrics_server = await start_metrics_server(default_port=9464)
+
+    async def close(self):
+        if self.metrics_server is not None:
+            self.metrics_server.close()
+        await self.outbox.close()
+        self.contexts.flush()
+        await self.state.drain()
+        await self.health.close()
+        await self.warmer.close()
+        await self.llm.close()
+        await super().close()
+
     async def on_message(self, message):
         if message.author == self.user:
             return
 
-        # Handle commands
-        if message.content.startswith('!help'):
-            await self._send_help(message)
-        elif message.content.startswith('!ask '):
-            await self._handle_ask(message)
-        elif message.content.startswith('!status'):
-            await self._send_status(message)
-        elif message.content.startswith('!scan '):
-            await self._handle_scan(message)
-        elif message.content.startswith('!target '):
-            await self._set_target(message)
-
-    async def _send_help(self, message):
+        # Parsed once; unknown commands are ignored
+        await self.router.handle_message(message)
+
+    async def _reply(self, ctx: CommandContext, text: str):
+        await ctx.message.channel.send(text)
+
+    async def _reset(self, ctx: CommandContext):
+        had_history = self.conversations.reset(ctx.channel_id)
+        await ctx.reply("🧹 Conversation reset" if had_history else "No conversation to reset")
+
+    async def _send_help(self, ctx: CommandContext):
         help_text = f"""
 🛡️ **Security Bot Commands:**
 
 `!ask <question>` - Ask AI security questions
+`!ask --fresh <question>` - Ask without using a cached answer
+`!reset` - Forget this channel's conversation
 `!status` - Check bot and LLM status  
-`!scan <target>` - Run basic scan on target
-`!target <domain>` - Set default target
+`!scan [target]` - Run basic scan on target (default: this channel's target)
+`!target <domain> [--me|--guild]` - Set the default target for this channel (just you / whole server)
 `!help` - Show this help
 
 📝 **Current Model:** {self.model}
@@ -72,51 +151,111 @@ class ConfigurableSecurityBot(commands.Bot):
 `!scan example.com`
 `!target vulnweb.com`
         """
-        await message.channel.send(help_text)
+        await ctx.reply(help_text)
+
+    def _build_prompt(self, question: str) -> RenderedPrompt:
+        prompt = self.PROMPT.render(self.limits, system=self.SYSTEM_PROMPT, question=question)
+        if prompt.trimmed:
+            print(f"Prompt for {self.model} trimmed to ~{prompt.tokens} tokens: {', '.join(prompt.trimmed)}")
+        return prompt
+
+    def _completion(self, question: str, channel_id: str, stream: bool):
+        """Chat call with the channel's history when memory is on, else a one-shot generate"""
+        if self.chat_memory:
+            turn = self.CHAT_PROMPT.render(self.limits, question=question)
+            messages = self.conversations.messages(channel_id, self.CHAT_SYSTEM_PROMPT, turn.text, self.limits)
+            call = self.llm.stream_chat if stream else self.llm.chat
+            return call(self.model, messages, options=self.limits.options())
+        prompt = self._build_prompt(question)
+        call = self.llm.stream_generate if stream else self.llm.generate
+        return call(self.model, prompt.text, options=prompt.options)
 
-    async def _handle_ask(self, message):
+    async def _summarize_history(self, text: str) -> str:
+        async with self.scheduler.slot(None, None, PRIORITY_BACKGROUND):
+            return await self.llm.generate(
+                self.model,
+                "Summarize these earlier questions and answers from a security chat in a few short "
+                f"bullet points. Keep hosts, ports, findings and decisions.\n\n{text}",
+                options={"num_ctx": self.limits.num_ctx, "num_predict": 200})
+
+    async def _handle_ask(self, ctx: CommandContext):
+        message = ctx.message
         try:
-            question = message.content[5:]  # Remove '!ask '
+            question, no_cache = split_bypass_flag(ctx.raw_args)
+            if not question:
+                await ctx.reply("Usage: `!ask <question>`")
+                return
+            channel_id = ctx.channel_id
+            # Follow-ups depend on the conversation so far; only opening questions are cacheable
+            key = None
+            if not (self.chat_memory and self.conversations.has_history(channel_id)):
+                version = f"{self.PROMPT_VERSION}-chat" if self.chat_memory else self.PROMPT_VERSION
+                target = self.contexts.get("target", ctx.guild_id, channel_id, ctx.user_id)
+                key = self.cache.make_key(question, self.model, version, target)
+            llm_response = None if no_cache or key is None else await self.cache.get(key)
+            
+            if llm_response is None and self.streaming:
+                await self._stream_ask(message, question, key)
+                return
             
             # Show typing indicator
             async with message.channel.typing():
-                # Query Ollama
-                response = requests.post(f"{self.ollama_url}/api/generate", json={
-                    "model": self.model,
-                    "prompt": f"""You are a cybersecurity expert assistant. 
-Provide a helpful, accurate security answer to this question:
-
-Question: {question}
-
-If suggesting tools, recommend legitimate security tools and mention they should only be used on authorized targets.""",
-                    "stream": False
-                }, timeout=30)
-            
-                if response.status_code == 200:
-                    llm_response = response.json().get("response", "No response")
+                if llm_response is None:
+                    # Query Ollama
+                    try:
+                        async with self.scheduler.slot(str(message.author.id), str(message.channel.id)):
+                            llm_response = await self._completion(question, channel_id, stream=False)
+                    except OllamaError:
+                        await message.channel.send("❌ LLM service unavailable")
+                        return
+                    if key is not None:
+                        await self.cache.put(key, llm_response)
+                if self.chat_memory:
+                    self.conversations.record(channel_id, question, llm_response)
                     
-                    # Split long messages
-                    if len(llm_response) > 1900:
-                        chunks = [llm_response[i:i+1900] for i in range(0, len(llm_response), 1900)]
-                        for i, chunk in enumerate(chunks):
-                            await message.channel.send(f"🤖 **Security AI ({i+1}/{len(chunks)}):**\n{chunk}")
-                    else:
-                        await message.channel.send(f"🤖 **Security AI:**\n{llm_response}")
-                else:
-                    await message.channel.send("❌ LLM service unavailable")
+                # Packed on line/code-block boundaries, paced to the channel's rate limit
+                await self.outbox.send(message.channel, f"🤖 **Security AI:**\n{llm_response}")
                     
         except Exception as e:
             await message.channel.send(f"❌ Error processing question: {str(e)}")
 
-    async def _send_status(self, message):
+    async def _stream_ask(self, message, question: str, cache_key: Optional[str]):
+        """Stream the answer into a message that is edited as tokens arrive"""
+        reply = StreamingReply(message.channel, "🤖 **Security AI:**\n",
+                               continuation_header="🤖 **Security AI (cont.):**\n", limit=1900,
+                               limiter=self.outbox.sender(message.channel).acquire)
+        tokens = []
+        try:
+            async with self.scheduler.slot(str(message.author.id), str(message.channel.id)):
+                async for token in self._completion(question, str(message.channel.id), stream=True):
+                    tokens.append(token)
+                    await reply.feed(token)
+        except OllamaError:
+            if not reply.started:
+                await message.channel.send("❌ LLM service unavailable")
+                return
+            await reply.feed("\n\n⚠️ Response interrupted")
+            await reply.finish()
+            return
+        await reply.finish()
+        answer = "".join(tokens)
+        if self.chat_memory:
+            self.conversations.record(str(message.channel.id), question, answer)
+        if cache_key is not None:
+            await self.cache.put(cache_key, answer)
+
+    async def _send_status(self, ctx: CommandContext):
+        message = ctx.message
         try:
-            # Check Ollama
-            ollama_status = "🟢 Online" if requests.get(f"{self.ollama_url}/api/tags", timeout=5).status_code == 200 else "🔴 Offline"
+            # Ollama node(s) as of the last background probe, not a fresh request
+            ollama_status = "\n  ".join(self.health.summary())
             
             status = f"""
 ✅ **Bot Status:**
 - **LLM Service:** {ollama_status}
-- **Model:** {self.model}
+- **Model:** {await self.warmer.summary(self.health.interval + self.health.timeout)}
+- **LLM Cache:** {self.cache.summary()}
+- **LLM Queue:** {self.scheduler.summary()}
 - **Commands:** Working
 - **Latency:** {round(self.latency * 1000)}ms
 - **Uptime:** {round(self.uptime)} hours
@@ -126,11 +265,12 @@ If suggesting tools, recommend legitimate security tools and mention they should
         except Exception as e:
             await message.channel.send(f"❌ Status check failed: {str(e)}")
 
-    async def _handle_scan(self, message):
+    async def _handle_scan(self, ctx: CommandContext):
+        message = ctx.message
         try:
-            target = message.content[6:].strip()  # Remove '!scan '
+            target = ctx.raw_args or self.contexts.get("target", ctx.guild_id, ctx.channel_id, ctx.user_id)
             if not target:
-                await message.channel.send("Usage: `!scan <target>`")
+                await message.channel.send("Usage: `!scan <target>` (or set one with `!target`)")
                 return
                 
             async with message.channel.typing():
@@ -140,16 +280,21 @@ If suggesting tools, recommend legitimate security tools and mention they should
         except Exception as e:
             await message.channel.send(f"❌ Scan error: {str(e)}")
 
-    async def _set_target(self, message):
+    async def _set_target(self, ctx: CommandContext):
+        message = ctx.message
         try:
-            target = message.content[8:].strip()  # Remove '!target '
-            if not target:
-                await message.channel.send("Usage: `!target <domain>`")
+            scope, args = split_scope_flags(ctx.args)
+            if not args:
+                await message.channel.send("Usage: `!target <domain> [--me|--guild]`")
                 return
-                
-            # Store in bot instance (could add file storage)
-            self.default_target = target
-            await message.channel.send(f"🎯 Default target set to: `{target}`")
+            if scope == "guild" and not ctx.guild_id:
+                await message.channel.send("❌ `--guild` only works in a server channel")
+                return
+
+            target = args[0]
+            # Kept per guild/channel/user and saved in the shared state
+            self.contexts.set(scope, ctx.guild_id, ctx.channel_id, ctx.user_id, target=target)
+            await message.channel.send(f"🎯 Default target set to: `{target}` for this {scope}")
             
         except Exception as e:
             await message.channel.send(f"❌ Target setting error: {str(e)}")
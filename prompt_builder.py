@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+Prompt Builder
+Templates compiled once, with per-model context budgets so prompts never overflow num_ctx
+"""
+
+import json
+import os
+import string
+import sys
+from typing import Any, Dict, List, Optional, Tuple
+
+SECTIONS = ("system", "target", "context", "question")
+
+# Share of the prompt budget each section may use; context takes whatever the others leave
+DEFAULT_SHARES = {"system": 0.25, "target": 0.05, "question": 0.25}
+
+OMISSION = "\n[... {lines} lines / {chars} chars omitted ...]\n"
+
+
+class ModelLimits:
+    """Context window settings for one model"""
+
+    def __init__(self, num_ctx: int = 2048, num_predict: int = 512, chars_per_token: float = 3.5):
+        self.num_ctx = int(num_ctx)
+        # Tokens kept free for the answer; also sent to Ollama as num_predict
+        self.num_predict = int(num_predict)
+        # Rough tokenizer ratio: ~4 for English prose, lower for scan output and code
+        self.chars_per_token = float(chars_per_token)
+
+    @property
+    def prompt_tokens(self) -> int:
+        return max(64, self.num_ctx - self.num_predict)
+
+    def tokens(self, text: str) -> int:
+        """Approximate token count without loading a tokenizer"""
+        return int(len(text) / self.chars_per_token) + 1 if text else 0
+
+    def chars(self, tokens: int) -> int:
+        return max(0, int(tokens * self.chars_per_token))
+
+    def options(self) -> Dict[str, Any]:
+        """Ollama options matching this budget, so Ollama never truncates on its own"""
+        return {"num_ctx": self.num_ctx, "num_predict": self.num_predict}
+
+
+def _load_limits() -> Dict[str, Dict[str, Any]]:
+    # LLM_MODEL_LIMITS: inline JSON or a path to a JSON file, e.g.
+    # {"qwen:0.5b": {"num_ctx": 2048}, "llama3.2": {"num_ctx": 8192, "num_predict": 768}}
+    raw = os.getenv("LLM_MODEL_LIMITS", "").strip()
+    if not raw:
+        return {}
+    try:
+        if not raw.startswith("{"):
+            with open(raw, 'r') as f:
+                raw = f.read()
+        return json.loads(raw)
+    except (OSError, ValueError) as e:
+        print(f"Ignoring LLM_MODEL_LIMITS: {e}", file=sys.stderr)
+        return {}
+
+
+_model_limits: Optional[Dict[str, Dict[str, Any]]] = None
+
+
+def get_model_limits(model: str) -> ModelLimits:
+    """Limits for `model` from LLM_MODEL_LIMITS, falling back to LLM_NUM_CTX / LLM_NUM_PREDICT"""
+    global _model_limits
+    if _model_limits is None:
+        _model_limits = _load_limits()
+    settings = {
+        "num_ctx": int(os.getenv("LLM_NUM_CTX", "2048")),
+        "num_predict": int(os.getenv("LLM_NUM_PREDICT", "512"))
+    }
+    # "llama3.2" also matches "llama3.2:latest"
+    settings.update(_model_limits.get(model) or _model_limits.get(model.split(":")[0]) or {})
+    return ModelLimits(**settings)
+
+
+def condense(text: str) -> str:
+    """Cheap extractive summary: trim trailing space and fold runs of identical lines"""
+    lines = [line.rstrip() for line in text.strip().splitlines()]
+    out: List[str] = []
+    previous, repeats = None, 0
+    for line in lines + [None]:
+        if line == previous:
+            repeats += 1
+            continue
+        if repeats:
+            out.append(f"(previous line repeated {repeats} more times)")
+        repeats = 0
+        if line is not None and not (line == "" and previous == ""):
+            out.append(line)
+        previous = line
+    return "\n".join(out)
+
+
+def trim_to(text: str, max_chars: int) -> Tuple[str, bool]:
+    """Fit text into max_chars keeping whole lines from the head and tail, with a visible marker"""
+    if len(text) <= max_chars:
+        return text, False
+    text = condense(text)
+    if len(text) <= max_chars:
+        return text, True
+    marker_room = len(OMISSION.format(lines=0, chars=0)) + 12
+    keep = max(0, max_chars - marker_room)
+    if keep < 40:
+        return text[:max_chars], True
+    # Scan output usually has the summary at the end, so keep a third for the tail
+    head_end = text.rfind("\n", 0, keep * 2 // 3)
+    if head_end <= 0:
+        head_end = keep * 2 // 3
+    tail_start = text.find("\n", len(text) - (keep - head_end))
+    if tail_start == -1 or tail_start <= head_end:
+        tail_start = len(text) - (keep - head_end)
+    omitted = text[head_end:tail_start]
+    marker = OMISSION.format(lines=omitted.count("\n"), chars=len(omitted))
+    return text[:head_end] + marker + text[tail_start:].lstrip("\n"), True
+
+
+class RenderedPrompt:
+    """Final prompt text plus the Ollama options and trimming report"""
+
+    def __init__(self, text: str, options: Dict[str, Any], tokens: int, trimmed: List[str]):
+        self.text = text
+        self.options = options
+        self.tokens = tokens
+        self.trimmed = trimmed
+
+
+class PromptTemplate:
+    """A prompt with {system}/{target}/{context}/{question} slots, parsed once at construction"""
+
+    def __init__(self, template: str, shares: Optional[Dict[str, float]] = None):
+        self.template = template
+        self.shares = {**DEFAULT_SHARES, **(shares or {})}
+        # Compile: literal chunks and slot names in order, so render is a single join
+        self._parts: List[Tuple[str, Optional[str]]] = []
+        for literal, field, _, _ in string.Formatter().parse(template):
+            if field is not None and field not in SECTIONS:
+                raise ValueError(f"Unknown prompt section: {field}")
+            self._parts.append((literal, field))
+        self.slots = [field for _, field in self._parts if field]
+        self._literal = "".join(literal for literal, _ in self._parts)
+
+    def render(self, limits: ModelLimits, **sections: str) -> RenderedPrompt:
+        """Fill the slots, trimming each section to its share of the model's prompt budget"""
+        budget = limits.chars(limits.prompt_tokens) - len(self._literal)
+        values = {name: str(sections.get(name) or "") for name in self.slots}
+        trimmed = []
+        # Fixed-share sections first; context gets whatever budget they leave
+        for name in [s for s in self.slots if s != "context"] + [s for s in self.slots if s == "context"]:
+            if name == "context":
+                cap = budget
+            else:
+                cap = int(limits.chars(limits.prompt_tokens) * self.shares.get(name, 0.25))
+            values[name], was_trimmed = trim_to(values[name], max(0, min(cap, budget)))
+            if was_trimmed:
+                trimmed.append(name)
+            budget -= len(values[name])
+        text = "".join(literal + (values[field] if field else "") for literal, field in self._parts)
+        return RenderedPrompt(text, limits.options(), limits.tokens(text), trimmed)
@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+"""
+Scan Job Engine
+Background scan jobs with IDs, progress updates, cancellation and kept results
+(optionally mirrored to the shared job table so every shard sees them)
+"""
+
+import asyncio
+import os
+import secrets
+import sys
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from metrics import counter, gauge, histogram
+from shared_state import SharedState
+from sharding import owner_alive
+
+Notifier = Callable[[str, str], Awaitable[None]]
+
+FINISHED_STATES = ("done", "failed", "cancelled")
+
+JOB_SECONDS = histogram("scan_job_seconds", "Scan job run time", ("scan_type",))
+JOBS_FINISHED = counter("scan_jobs_finished_total", "Finished scan jobs by outcome", ("scan_type", "status"))
+
+
+class ScanJob:
+    """One submitted scan and everything known about it"""
+
+    def __init__(self, job_id: str, scan_type: str, target: str, user_id: str, channel_id: str,
+                 runner: Optional[Callable[["ScanJob"], Awaitable[Dict[str, Any]]]], manager: "ScanJobManager"):
+        self.id = job_id
+        self.scan_type = scan_type
+        self.target = target
+        self.user_id = user_id
+        self.channel_id = channel_id
+        self.runner = runner
+        self.status = "queued"
+        self.created = time.time()
+        self.started: Optional[float] = None
+        self.finished: Optional[float] = None
+        self.progress: List[str] = []
+        self.result: Optional[Dict[str, Any]] = None
+        self.error: Optional[str] = None
+        self.task: Optional[asyncio.Task] = None
+        self._manager = manager
+
+    def to_record(self, owner: str) -> Dict[str, Any]:
+        return {"id": self.id, "owner": owner, "scan_type": self.scan_type, "target": self.target,
+                "user_id": self.user_id, "channel_id": self.channel_id, "status": self.status,
+                "created": self.created, "started": self.started, "finished": self.finished,
+                "progress": self.progress[-1:], "result": self.result, "error": self.error}
+
+    @classmethod
+    def from_record(cls, record: Dict[str, Any], manager: "ScanJobManager") -> "ScanJob":
+        """Read-only view of a job stored by another process (or an earlier run of this one)"""
+        job = cls(record["id"], record["scan_type"], record["target"], record["user_id"],
+                  record["channel_id"], None, manager)
+        for field in ("status", "created", "started", "finished", "progress", "result", "error"):
+            setattr(job, field, record[field])
+        return job
+
+    async def report(self, text: str):
+        """Record a progress line and push it to the job's channel"""
+        self.progress.append(text)
+        await self._manager.notify(self, text)
+
+    @property
+    def elapsed(self) -> float:
+        if self.started is None:
+            return 0.0
+        return (self.finished or time.time()) - self.started
+
+    def describe(self) -> str:
+        line = f"`{self.id}` {self.scan_type} on {self.target} - {self.status}"
+        if self.started is not None:
+            line += f" ({self.elapsed:.0f}s)"
+        if self.progress and self.status == "running":
+            line += f" - {self.progress[-1]}"
+        return line
+
+    def result_text(self) -> str:
+        """Plain text of the result content, or the failure reason"""
+        if self.error:
+            return f"❌ {self.error}"
+        if not self.result:
+            return "No result yet"
+        if "error" in self.result:
+            return f"❌ {self.result['error'].get('message', 'Unknown error')}"
+        parts = [item.get("text", "") for item in self.result.get("result", {}).get("content", [])
+                 if item.get("type") == "text"]
+        return "\n".join(parts) or "Scan finished with no output"
+
+
+class ScanJobManager:
+    """Bounded worker pool running scan jobs in the background
+
+    With a shared `store`, every state change is written to its job table
+    under `owner` (unique per process, see sharding.worker_owner), and
+    lookups fall back to it, so !jobs and !result also cover jobs run by
+    other shards or by this shard before a restart. Table writes run on the
+    store's writer thread, never on the event loop.
+    """
+
+    def __init__(self, workers: Optional[int] = None, keep_finished: Optional[int] = None,
+                 notifier: Optional[Notifier] = None, store: Optional[SharedState] = None, owner: str = ""):
+        self.workers = int(workers or os.getenv("SCAN_WORKERS", "2"))
+        self.keep_finished = int(keep_finished or os.getenv("SCAN_RESULTS_KEEP", "100"))
+        self.notifier = notifier
+        self.store = store
+        self.owner = owner
+        self.jobs: "OrderedDict[str, ScanJob]" = OrderedDict()
+        if store is not None:
+            # Jobs left queued or running by processes that are gone died with them;
+            # owners that may still be alive (another host, unknown) are left alone
+            dead = [other for other in store.active_owners() if other != owner and owner_alive(other) is False]
+            if dead:
+                store.write(store.fail_interrupted, dead, on_error=self._report_store_error)
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker_tasks: List[asyncio.Task] = []
+        self._closed = False
+        gauge("scan_jobs", "Scan jobs queued or running", ("status",)).set_function(self._depths)
+
+    def _depths(self) -> Dict[tuple, int]:
+        depths = {("queued",): 0, ("running",): 0}
+        for job in self.jobs.values():
+            if (job.status,) in depths:
+                depths[(job.status,)] += 1
+        return depths
+
+    def _ensure_workers(self):
+        if self._queue is None:
+            self._queue = asyncio.Queue()
+        self._worker_tasks = [t for t in self._worker_tasks if not t.done()]
+        while len(self._worker_tasks) < self.workers:
+            self._worker_tasks.append(asyncio.ensure_future(self._worker()))
+
+    @staticmethod
+    def _report_store_error(error: BaseException):
+        print(f"Scan jobs: saving to shared state failed: {error}", file=sys.stderr)
+
+    def _save(self, job: ScanJob):
+        if self.store is not None:
+            self.store.write(self.store.update_job, job.to_record(self.owner), on_error=self._report_store_error)
+
+    async def notify(self, job: ScanJob, text: str):
+        if self.notifier is None or not job.channel_id:
+            return
+        try:
+            await self.notifier(job.channel_id, text)
+        except Exception as e:
+            print(f"Scan job {job.id}: progress notification failed: {e}", file=sys.stderr)
+
+    def submit(self, scan_type: str, target: str, runner: Callable[[ScanJob], Awaitable[Dict[str, Any]]],
+               user_id: str = "", channel_id: str = "") -> ScanJob:
+        """Queue a scan and return its job immediately"""
+        self._ensure_workers()
+        job_id = secrets.token_hex(3)
+        # Ids are unique across shards: skip ones already in the shared table
+        while job_id in self.jobs or (self.store is not None and self.store.get_job(job_id) is not None):
+            job_id = secrets.token_hex(3)
+        job = ScanJob(job_id, scan_type, target, user_id, channel_id, runner, self)
+        if self.store is not None:
+            self.store.write(self.store.insert_job, job.to_record(self.owner), on_error=self._report_store_error)
+        self.jobs[job_id] = job
+        self._queue.put_nowait(job)
+        self._prune()
+        return job
+
+    async def _worker(self):
+        # close() cancelling a worker mid-job looks like a job cancel below, so the loop checks the flag
+        while not self._closed:
+            job = await self._queue.get()
+            if job.status != "queued":
+                continue
+            job.status = "running"
+            job.started = time.time()
+            self._save(job)
+            job.task = asyncio.ensure_future(job.runner(job))
+            try:
+                job.result = await job.task
+                job.status = "done"
+            except asyncio.CancelledError:
+                if not job.task.cancelled():
+                    raise
+                job.status = "cancelled"
+            except Exception as e:
+                job.status = "failed"
+                job.error = str(e)
+            job.finished = time.time()
+            self._save(job)
+            JOB_SECONDS.observe(job.elapsed, job.scan_type)
+            JOBS_FINISHED.inc(job.scan_type, job.status)
+            if job.status == "done":
+                await job.report(f"✅ Job `{job.id}` finished in {job.elapsed:.0f}s:\n{job.result_text()}")
+            elif job.status == "failed":
+                await job.report(f"❌ Job `{job.id}` failed: {job.error}")
+            self._prune()
+
+    def _prune(self):
+        finished = [job_id for job_id, job in self.jobs.items() if job.status in FINISHED_STATES]
+        for job_id in finished[:max(0, len(finished) - self.keep_finished)]:
+            del self.jobs[job_id]
+        if self.store is not None and finished:
+            self.store.write(self.store.prune_jobs, self.keep_finished, on_error=self._report_store_error)
+
+    def get(self, job_id: str) -> Optional[ScanJob]:
+        job = self.jobs.get(job_id)
+        if job is None and self.store is not None:
+            record = self.store.get_job(job_id)
+            job = ScanJob.from_record(record, self) if record else None
+        return job
+
+    def cancel(self, job_id: str) -> bool:
+        """Cancel a queued or running job; returns False if it already finished"""
+        job = self.jobs.get(job_id)
+        if job is None or job.status in FINISHED_STATES:
+            return False
+        if job.status == "queued":
+            job.status = "cancelled"
+            job.finished = time.time()
+            self._save(job)
+        elif job.task is not None:
+            job.task.cancel()
+        return True
+
+    def list_jobs(self) -> List[ScanJob]:
+        if self.store is None:
+            return list(self.jobs.values())
+        # Local objects win: they carry live progress the table only sees on state changes
+        jobs = [self.jobs.get(record["id"]) or ScanJob.from_record(record, self)
+                for record in self.store.list_jobs(self.keep_finished)]
+        listed = {job.id for job in jobs}
+        jobs.extend(job for job in self.jobs.values() if job.id not in listed)
+        return sorted(jobs, key=lambda job: job.created)
+
+    async def close(self):
+        self._closed = True
+        for job in self.jobs.values():
+            if job.status == "running" and job.task is not None:
+                job.task.cancel()
+        for task in self._worker_tasks:
+            task.cancel()
+        await asyncio.gather(*self._worker_tasks, return_exceptions=True)
+        self._worker_tasks = []
@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+"""
+Sharded Launch
+Runs the Discord bot as N worker processes, each owning a contiguous range of
+gateway shards, and restarts any worker that dies
+"""
+
+import asyncio
+import os
+import signal
+import socket
+import sys
+import time
+from typing import Any, Dict, List, Optional
+
+
+def parse_shard_ids(spec: str) -> List[int]:
+    """"0-3" or "0,2,5" (or a mix) -> sorted shard ids"""
+    ids = set()
+    for part in filter(None, (part.strip() for part in spec.split(","))):
+        first, _, last = part.partition("-")
+        ids.update(range(int(first), int(last or first) + 1))
+    return sorted(ids)
+
+
+def shard_config() -> Dict[str, Any]:
+    """Bot constructor kwargs from SHARD_IDS/SHARD_COUNT; empty (Discord picks) when unset"""
+    count = os.getenv("SHARD_COUNT")
+    if not count:
+        return {}
+    ids = os.getenv("SHARD_IDS")
+    return {"shard_count": int(count), "shard_ids": parse_shard_ids(ids) if ids else None}
+
+
+def worker_name() -> str:
+    """Stable name of this process across restarts: mode plus the shards it owns"""
+    mode = os.getenv("MODE", "mcp")
+    ids = os.getenv("SHARD_IDS")
+    return f"{mode}:{ids}" if ids else mode
+
+
+def worker_owner() -> str:
+    """Unique name of this process for rows it owns in the shared state: worker name, host and pid"""
+    return f"{worker_name()}@{socket.gethostname()}:{os.getpid()}"
+
+
+def owner_alive(owner: str) -> Optional[bool]:
+    """Whether the process behind a worker_owner() name still runs; None if that can't be told from here"""
+    _, _, location = owner.rpartition("@")
+    host, _, pid = location.rpartition(":")
+    if host != socket.gethostname() or not pid.isdigit():
+        # Another host sharing the database, or a name from before owners carried a pid
+        return None
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        # Exists, owned by another user
+        return True
+    return True
+
+
+def shard_ranges(shard_count: int, processes: int) -> List[List[int]]:
+    """Split shards 0..count-1 into `processes` contiguous ranges differing in size by at most one"""
+    processes = max(1, min(processes, shard_count))
+    size, extra = divmod(shard_count, processes)
+    ranges, start = [], 0
+    for index in range(processes):
+        end = start + size + (1 if index < extra else 0)
+        ranges.append(list(range(start, end)))
+        start = end
+    return ranges
+
+
+class Worker:
+    """One bot process and its restart bookkeeping"""
+
+    def __init__(self, index: int, shard_ids: List[int], env: Dict[str, str]):
+        self.index = index
+        self.shard_ids = shard_ids
+        self.env = env
+        self.process: Optional[asyncio.subprocess.Process] = None
+        self.started = 0.0
+        self.restarts = 0
+        self.delay = 0.0
+
+    @property
+    def label(self) -> str:
+        return f"{self.shard_ids[0]}-{self.shard_ids[-1]}"
+
+
+class ShardSupervisor:
+    """Starts one worker per shard range and restarts workers that exit
+
+    A worker that dies within `stable_after` seconds of starting waits twice
+    as long as last time before the next start (from `restart_delay` up to
+    `max_delay`), so a bot that cannot log in does not spin; one that ran
+    longer restarts after `restart_delay` again.
+    """
+
+    def __init__(self, command: List[str], shard_count: int, processes: int,
+                 restart_delay: float = 1.0, max_delay: float = 60.0, stable_after: float = 60.0,
+                 grace: float = 10.0):
+        self.command = command
+        self.shard_count = shard_count
+        self.restart_delay = restart_delay
+        self.max_delay = max_delay
+        self.stable_after = stable_after
+        self.grace = grace
+        self.workers = [Worker(index, ids, self._environment(index, ids))
+                        for index, ids in enumerate(shard_ranges(shard_count, processes))]
+        self._stopping = asyncio.Event()
+
+    def _environment(self, index: int, shard_ids: List[int]) -> Dict[str, str]:
+        env = dict(os.environ)
+        env.update({"MODE": "discord", "SHARD_COUNT": str(self.shard_count),
+                    "SHARD_IDS": f"{shard_ids[0]}-{shard_ids[-1]}"})
+        # One metrics port per worker (METRICS_PORT=0 keeps them all off)
+        base = int(os.getenv("METRICS_PORT", "9464"))
+        env["METRICS_PORT"] = str(base + index if base > 0 else 0)
+        return env
+
+    async def _start(self, worker: Worker):
+        worker.process = await asyncio.create_subprocess_exec(*self.command, env=worker.env)
+        worker.started = time.monotonic()
+        print(f"🧩 Shards {worker.label} started (pid {worker.process.pid})", file=sys.stderr)
+
+    async def _watch(self, worker: Worker):
+        while not self._stopping.is_set():
+            await self._start(worker)
+            code = await worker.process.wait()
+            if self._stopping.is_set():
+                break
+            lived = time.monotonic() - worker.started
+            worker.delay = (self.restart_delay if lived >= self.stable_after
+                            else min(self.max_delay, max(self.restart_delay, worker.delay * 2)))
+            worker.restarts += 1
+            print(f"⚠️ Shards {worker.label} exited with {code} after {lived:.0f}s; "
+                  f"restarting in {worker.delay:.0f}s (restart {worker.restarts})", file=sys.stderr)
+            try:
+                await asyncio.wait_for(self._stopping.wait(), worker.delay)
+            except asyncio.TimeoutError:
+                pass
+
+    async def run(self):
+        """Supervise until stop() (or SIGINT/SIGTERM), then shut every worker down"""
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sig, self.stop)
+            except (NotImplementedError, RuntimeError):
+                pass
+        print(f"🧩 {self.shard_count} shards over {len(self.workers)} processes", file=sys.stderr)
+        watchers = [asyncio.ensure_future(self._watch(worker)) for worker in self.workers]
+        await self._stopping.wait()
+        await asyncio.gather(*(self._terminate(worker) for worker in self.workers))
+        await asyncio.gather(*watchers, return_exceptions=True)
+
+    def stop(self):
+        self._stopping.set()
+
+    async def _terminate(self, worker: Worker):
+        process = worker.process
+        if process is None or process.returncode is not None:
+            return
+        process.terminate()
+        try:
+            await asyncio.wait_for(process.wait(), self.grace)
+        except asyncio.TimeoutError:
+            process.kill()
+            await process.wait()
+
+
+def run_supervisor(argv: Optional[List[str]] = None):
+    # Bots import this module for shard_config(); only the supervisor needs argparse
+    import argparse
+    parser = argparse.ArgumentParser(description="Run the Discord bot as supervised shard worker processes")
+    parser.add_argument("--shards", type=int, default=int(os.getenv("SHARD_COUNT", "2")),
+                        help="Total gateway shards (SHARD_COUNT)")
+    parser.add_argument("--processes", type=int, default=int(os.getenv("SHARD_PROCESSES", "0")),
+                        help="Worker processes (SHARD_PROCESSES, default one per shard)")
+    parser.add_argument("--bot", default="discord_bot.py", help="Bot script each worker runs")
+    args = parser.parse_args(argv)
+    command = [sys.executable, "-u", os.path.join(os.path.dirname(os.path.abspath(__file__)), args.bot)]
+    supervisor = ShardSupervisor(command, args.shards, args.processes or args.shards)
+    asyncio.run(supervisor.run())
+
+
+if __name__ == "__main__":
+    run_supervisor()
@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+"""
+Shared State
+SQLite (WAL) store that every bot process and shard on the host reads and writes:
+namespaced key/value context (targets, conversations) and the scan job table
+"""
+
+import asyncio
+import itertools
+import json
+import os
+import sqlite3
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+JOB_COLUMNS = ("id", "owner", "scan_type", "target", "user_id", "channel_id", "status",
+               "created", "started", "finished", "progress", "result", "error")
+
+_memory_ids = itertools.count(1)
+
+
+def _report(error: BaseException):
+    # stderr: stdout carries the protocol when this runs inside an MCP stdio server
+    print(f"Shared state write failed: {error}", file=sys.stderr)
+
+
+class SharedState:
+    """One SQLite database shared across processes
+
+    Every write is its own short transaction, so a value written by one shard
+    is what the next read in any other shard returns. Writes block while
+    another process holds the write lock (up to `timeout` seconds), so on an
+    event loop they go through write(), which runs them in order on one
+    writer thread with its own connection. Reads use a second connection on
+    the calling thread: under WAL a reader never waits for a writer, and
+    `read_timeout` bounds the rare cases where it would.
+    """
+
+    def __init__(self, path: Optional[str] = None, timeout: float = 5.0, read_timeout: float = 0.25):
+        self.path = path or os.getenv("SHARED_STATE_PATH",
+                                      os.path.expanduser("~/.cache/security-bot/shared_state.db"))
+        if self.path == ":memory:":
+            # Two connections need a named shared-cache database to see the same data
+            target, uri = f"file:shared-state-{next(_memory_ids)}?mode=memory&cache=shared", True
+        else:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            target, uri = self.path, False
+        # Autocommit: each statement commits on its own, nothing is held open between awaits.
+        # Created here, then only used on the writer thread.
+        self._writer = sqlite3.connect(target, timeout=timeout, isolation_level=None, uri=uri,
+                                       check_same_thread=False)
+        self._writer.execute("PRAGMA journal_mode=WAL")
+        # Same durability knob as the JSON writer: none -> OFF, fsync -> NORMAL, full -> FULL
+        synchronous = {"none": "OFF", "fsync": "NORMAL", "full": "FULL"}.get(
+            os.getenv("PERSIST_DURABILITY", "fsync").lower(), "NORMAL")
+        self._writer.execute(f"PRAGMA synchronous={synchronous}")
+        self._writer.executescript("""
+            CREATE TABLE IF NOT EXISTS kv (
+                namespace TEXT NOT NULL,
+                key TEXT NOT NULL,
+                value TEXT NOT NULL,
+                updated REAL NOT NULL,
+                PRIMARY KEY (namespace, key)
+            );
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                owner TEXT NOT NULL,
+                scan_type TEXT,
+                target TEXT,
+                user_id TEXT,
+                channel_id TEXT,
+                status TEXT NOT NULL,
+                created REAL NOT NULL,
+                started REAL,
+                finished REAL,
+                progress TEXT,
+                result TEXT,
+                error TEXT
+            );
+            CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs(status, finished);
+        """)
+        self.db = sqlite3.connect(target, timeout=read_timeout, isolation_level=None, uri=uri)
+        if uri:
+            # Shared cache locks tables instead of waiting, so the in-memory test store skips read locks
+            self.db.execute("PRAGMA read_uncommitted=1")
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="shared-state")
+
+    def write(self, method: Callable[..., Any], *args: Any,
+              on_error: Optional[Callable[[BaseException], None]] = _report) -> Any:
+        """Run a write method (set, set_many, update_job, ...) on the writer thread
+
+        Inside a running event loop this returns at once with an asyncio
+        future (await it for the result); a failure is passed to `on_error`
+        on the loop. Without a loop it waits and returns the result.
+        """
+        future = self._executor.submit(method, *args)
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            try:
+                return future.result()
+            except Exception as e:
+                if on_error is None:
+                    raise
+                on_error(e)
+                return None
+        wrapped = asyncio.wrap_future(future, loop=loop)
+        if on_error is not None:
+            wrapped.add_done_callback(
+                lambda done: on_error(done.exception()) if not done.cancelled() and done.exception() else None)
+        return wrapped
+
+    async def drain(self):
+        """Wait until every write submitted so far has finished (writes run in submission order)"""
+        await asyncio.wrap_future(self._executor.submit(lambda: None))
+
+    # Key/value context
+
+    def get(self, namespace: str, key: str, default: Any = None) -> Any:
+        row = self.db.execute("SELECT value FROM kv WHERE namespace = ? AND key = ?",
+                              (namespace, key)).fetchone()
+        return json.loads(row[0]) if row else default
+
+    def items(self, namespace: str) -> Dict[str, Any]:
+        rows = self.db.execute("SELECT key, value FROM kv WHERE namespace = ?", (namespace,))
+        return {key: json.loads(value) for key, value in rows}
+
+    # set, set_many, delete, expire and the job writes block: call them through write() on an event loop
+
+    def set(self, namespace: str, key: str, value: Any):
+        self._writer.execute("INSERT OR REPLACE INTO kv (namespace, key, value, updated) VALUES (?, ?, ?, ?)",
+                             (namespace, key, json.dumps(value), time.time()))
+
+    def set_many(self, namespace: str, values: Dict[str, Any]):
+        """Write several keys in one transaction; a None value deletes the key"""
+        now = time.time()
+        self._writer.execute("BEGIN IMMEDIATE")
+        try:
+            for key, value in values.items():
+                if value is None:
+                    self._writer.execute("DELETE FROM kv WHERE namespace = ? AND key = ?", (namespace, key))
+                else:
+                    self._writer.execute(
+                        "INSERT OR REPLACE INTO kv (namespace, key, value, updated) VALUES (?, ?, ?, ?)",
+                        (namespace, key, json.dumps(value), now))
+            self._writer.execute("COMMIT")
+        except BaseException:
+            self._writer.execute("ROLLBACK")
+            raise
+
+    def delete(self, namespace: str, key: str) -> bool:
+        return self._writer.execute("DELETE FROM kv WHERE namespace = ? AND key = ?", (namespace, key)).rowcount > 0
+
+    def expire(self, namespace: str, max_age: float) -> int:
+        """Drop keys not written for `max_age` seconds"""
+        return self._writer.execute("DELETE FROM kv WHERE namespace = ? AND updated < ?",
+                                    (namespace, time.time() - max_age)).rowcount
+
+    # Scan jobs
+
+    def _job_row(self, record: Dict[str, Any]) -> tuple:
+        row = dict(record)
+        row["progress"] = json.dumps(row.get("progress") or [])
+        row["result"] = json.dumps(row["result"]) if row.get("result") is not None else None
+        return tuple(row.get(column) for column in JOB_COLUMNS)
+
+    def _job_record(self, row: tuple) -> Dict[str, Any]:
+        record = dict(zip(JOB_COLUMNS, row))
+        record["progress"] = json.loads(record["progress"] or "[]")
+        record["result"] = json.loads(record["result"]) if record["result"] else None
+        return record
+
+    def insert_job(self, record: Dict[str, Any]) -> bool:
+        """Add a new job; returns False if another process already holds that id"""
+        try:
+            self._writer.execute(f"INSERT INTO jobs ({', '.join(JOB_COLUMNS)}) "
+                                 f"VALUES ({', '.join('?' * len(JOB_COLUMNS))})", self._job_row(record))
+            return True
+        except sqlite3.IntegrityError:
+            return False
+
+    def update_job(self, record: Dict[str, Any]):
+        columns = JOB_COLUMNS[1:]
+        row = self._job_row(record)
+        self._writer.execute(f"UPDATE jobs SET {', '.join(f'{c} = ?' for c in columns)} WHERE id = ?",
+                             row[1:] + row[:1])
+
+    def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        row = self.db.execute(f"SELECT {', '.join(JOB_COLUMNS)} FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._job_record(row) if row else None
+
+    def list_jobs(self, limit: int = 100) -> List[Dict[str, Any]]:
+        """Active jobs plus the newest `limit` finished ones, oldest first"""
+        rows = self.db.execute(f"""
+            SELECT {', '.join(JOB_COLUMNS)} FROM jobs WHERE status IN ('queued', 'running')
+            UNION ALL
+            SELECT * FROM (SELECT {', '.join(JOB_COLUMNS)} FROM jobs WHERE status NOT IN ('queued', 'running')
+                           ORDER BY finished DESC LIMIT ?)
+        """, (limit,)).fetchall()
+        return sorted((self._job_record(row) for row in rows), key=lambda record: record["created"])
+
+    def prune_jobs(self, keep: int) -> int:
+        """Drop finished jobs beyond the newest `keep`"""
+        return self._writer.execute("""
+            DELETE FROM jobs WHERE status NOT IN ('queued', 'running') AND id NOT IN (
+                SELECT id FROM jobs WHERE status NOT IN ('queued', 'running') ORDER BY finished DESC LIMIT ?)
+        """, (keep,)).rowcount
+
+    def active_owners(self) -> List[str]:
+        """Owners of jobs still marked queued or running"""
+        rows = self.db.execute("SELECT DISTINCT owner FROM jobs WHERE status IN ('queued', 'running')")
+        return [owner for owner, in rows]
+
+    def fail_interrupted(self, owners: Iterable[str]) -> int:
+        """Mark queued or running jobs of `owners` (processes known to be dead) as failed"""
+        now = time.time()
+        return sum(self._writer.execute("""
+            UPDATE jobs SET status = 'failed', finished = ?, error = 'Interrupted: the worker running it exited'
+            WHERE owner = ? AND status IN ('queued', 'running')
+        """, (now, owner)).rowcount for owner in owners)
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+        self._writer.close()
+        self.db.close()
+
+
+_shared_state: Optional[SharedState] = None
+
+
+def get_shared_state() -> SharedState:
+    """The process-wide store (one connection per process)"""
+    global _shared_state
+    if _shared_state is None:
+        _shared_state = SharedState()
+    return _shared_state
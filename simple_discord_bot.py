@@ -5,36 +5,51 @@ Simple Discord Bot - No privileged intents required
 import asyncio
 import json
 import os
-import requests
 import discord
 from discord.ext import commands
+from ollama_client import OllamaError, get_ollama_client
+from llm_scheduler import get_llm_scheduler
+from prompt_builder import PromptTemplate, get_model_limits
+from command_router import CommandContext, CommandRouter, RateLimiter
 
 class SimpleSecurityBot(commands.Bot):
+    PROMPT = PromptTemplate("You are a cybersecurity assistant. Answer this question: {question}")
+
     def __init__(self):
         intents = discord.Intents.default()
         intents.guilds = True
         intents.messages = True
         super().__init__(command_prefix='!', intents=intents)
-        self.ollama_url = "http://localhost:11434"
+        self.llm = get_ollama_client()
+        self.scheduler = get_llm_scheduler()
+        self.ollama_url = self.llm.base_url
+        self.limits = get_model_limits("qwen:0.5b")
+        self.router = CommandRouter(self._reply)
+        self.router.use(RateLimiter().middleware())
+        self.router.add("!help", self._send_help)
+        self.router.add("!ask", self._handle_ask)
+        self.router.add("!status", self._send_status)
 
     async def on_ready(self):
         print(f'🤖 Security Bot logged in as {self.user}')
         print('Ready to respond to commands!')
         print('Available commands: !help, !ask, !status')
 
+    async def close(self):
+        await self.llm.close()
+        await super().close()
+
     async def on_message(self, message):
         if message.author == self.user:
             return
 
         # Handle simple commands without privileged intents
-        if message.content.startswith('!help'):
-            await self._send_help(message)
-        elif message.content.startswith('!ask '):
-            await self._handle_ask(message)
-        elif message.content.startswith('!status'):
-            await self._send_status(message)
+        await self.router.handle_message(message)
+
+    async def _reply(self, ctx: CommandContext, text: str):
+        await ctx.message.channel.send(text)
 
-    async def _send_help(self, message):
+    async def _send_help(self, ctx: CommandContext):
         help_text = """
 🛡️ **Security Bot Commands:**
 
@@ -44,36 +59,38 @@ class SimpleSecurityBot(commands.Bot):
 
 Example: `!ask what is a port scan?`
         """
-        await message.channel.send(help_text)
+        await ctx.reply(help_text)
 
-    async def _handle_ask(self, message):
+    async def _handle_ask(self, ctx: CommandContext):
+        message = ctx.message
         try:
-            question = message.content[5:]  # Remove '!ask '
+            question = ctx.raw_args
+            if not question:
+                await ctx.reply("Usage: `!ask <question>`")
+                return
             
             # Query Ollama
-            response = requests.post(f"{self.ollama_url}/api/generate", json={
-                "model": "qwen:0.5b",
-                "prompt": f"You are a cybersecurity assistant. Answer this question: {question}",
-                "stream": False
-            }, timeout=30)
-            
-            if response.status_code == 200:
-                llm_response = response.json().get("response", "No response")
-                await message.channel.send(f"🤖 **Security AI:** {llm_response}")
-            else:
+            try:
+                prompt = self.PROMPT.render(self.limits, question=question)
+                async with self.scheduler.slot(str(message.author.id), str(message.channel.id)):
+                    llm_response = await self.llm.generate("qwen:0.5b", prompt.text, options=prompt.options)
+            except OllamaError:
                 await message.channel.send("❌ LLM service unavailable")
+                return
+            
+            await message.channel.send(f"🤖 **Security AI:** {llm_response}")
                 
         except Exception as e:
             await message.channel.send(f"❌ Error: {str(e)}")
 
-    async def _send_status(self, message):
+    async def _send_status(self, ctx: CommandContext):
         status = """
 ✅ **Bot Status:**
 - LLM: Connected to Ollama
 - Model: qwen:0.5b
 - Commands: Working
         """
-        await message.channel.send(status)
+        await ctx.reply(status)
 
 async def main():
     token = "YOURDISCORDTOKEN"
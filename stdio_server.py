@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+"""
+MCP stdio transport
+Non-blocking stdin reader and stdout writer with concurrent, out-of-order request dispatch
+"""
+
+import asyncio
+import contextvars
+import json
+import os
+import sys
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from metrics import counter, gauge, histogram, start_metrics_server
+
+MAX_LINE_BYTES = 16 * 1024 * 1024
+
+Handler = Callable[[Dict[str, Any]], Awaitable[Dict[str, Any]]]
+
+REQUEST_SECONDS = histogram("mcp_server_request_seconds", "Time this MCP server spent handling a request",
+                            ("tool",))
+REQUEST_ERRORS = counter("mcp_server_errors_total", "Requests this MCP server answered with an error", ("tool",))
+IN_FLIGHT = gauge("mcp_server_in_flight", "Requests being handled by this MCP server")
+OUTPUT_QUEUED = gauge("mcp_server_output_queued", "Responses waiting to be written to stdout")
+
+# Writer of the serve_stdio loop handling the current request (unset outside a request)
+_current_writer: "contextvars.ContextVar[Optional[StdoutWriter]]" = contextvars.ContextVar(
+    "mcp_stdout_writer", default=None)
+
+
+async def _open_stdin() -> asyncio.StreamReader:
+    """Wrap stdin in a StreamReader, falling back to a reader thread for regular files"""
+    loop = asyncio.get_running_loop()
+    reader = asyncio.StreamReader(limit=MAX_LINE_BYTES)
+    try:
+        await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader), sys.stdin)
+        return reader
+    except (ValueError, OSError):
+        pass
+
+    def pump():
+        # Runs in a worker thread: stdin is a regular file the event loop can't poll
+        for line in iter(sys.stdin.buffer.readline, b""):
+            loop.call_soon_threadsafe(reader.feed_data, line)
+        loop.call_soon_threadsafe(reader.feed_eof)
+
+    loop.run_in_executor(None, pump)
+    return reader
+
+
+class StdoutWriter:
+    """Batches response lines onto stdout; a bounded queue pushes back on fast producers"""
+
+    def __init__(self, max_queued: int = 256):
+        self._queue: "asyncio.Queue[Optional[bytes]]" = asyncio.Queue(maxsize=max_queued)
+        self._transport_writer: Optional[asyncio.StreamWriter] = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        loop = asyncio.get_running_loop()
+        # A tty is usually shared with stderr; making it non-blocking would break stderr prints
+        if not sys.stdout.isatty():
+            try:
+                transport, protocol = await loop.connect_write_pipe(
+                    asyncio.streams.FlowControlMixin, sys.stdout)
+                self._transport_writer = asyncio.StreamWriter(transport, protocol, None, loop)
+            except (ValueError, OSError):
+                self._transport_writer = None
+        self._task = asyncio.ensure_future(self._run())
+
+    async def write(self, message: Dict[str, Any]):
+        """Queue one JSON message; waits when the output side is falling behind"""
+        await self._queue.put((json.dumps(message) + "\n").encode())
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        closing = False
+        while not closing:
+            item = await self._queue.get()
+            batch: List[bytes] = []
+            # Drain whatever else is already waiting so one write carries many responses
+            while True:
+                if item is None:
+                    closing = True
+                    break
+                batch.append(item)
+                if self._queue.empty():
+                    break
+                item = self._queue.get_nowait()
+            if not batch:
+                continue
+            data = b"".join(batch)
+            if self._transport_writer is not None:
+                self._transport_writer.write(data)
+                await self._transport_writer.drain()
+            else:
+                await loop.run_in_executor(None, self._blocking_write, data)
+
+    @staticmethod
+    def _blocking_write(data: bytes):
+        sys.stdout.buffer.write(data)
+        sys.stdout.buffer.flush()
+
+    async def close(self):
+        """Flush everything queued and stop the writer"""
+        await self._queue.put(None)
+        if self._task is not None:
+            await self._task
+        if self._transport_writer is not None:
+            self._transport_writer.close()
+
+
+async def serve_stdio(handler: Handler, max_in_flight: Optional[int] = None):
+    """Serve JSON-RPC requests from stdin until EOF
+
+    Each request is handled in its own task (at most max_in_flight at once,
+    default MCP_MAX_IN_FLIGHT) and its response is written as soon as it is
+    ready, tagged with the request id, so a slow tools/call never holds up
+    the requests behind it. Setting METRICS_PORT also serves /metrics over HTTP.
+    """
+    if max_in_flight is None:
+        max_in_flight = int(os.getenv("MCP_MAX_IN_FLIGHT", "16"))
+    reader = await _open_stdin()
+    writer = StdoutWriter()
+    await writer.start()
+    metrics_server = await start_metrics_server()
+    slots = asyncio.Semaphore(max_in_flight)
+    in_flight = set()
+
+    IN_FLIGHT.set_function(lambda: len(in_flight))
+    OUTPUT_QUEUED.set_function(writer._queue.qsize)
+
+    async def dispatch(request: Dict[str, Any]):
+        _current_writer.set(writer)
+        method = request.get("method", "")
+        tool = (request.get("params") or {}).get("name", method) if method == "tools/call" else method
+        started = time.perf_counter()
+        try:
+            try:
+                response = await handler(request)
+            except Exception as e:
+                response = {"error": {"code": -32603, "message": str(e)}}
+            REQUEST_SECONDS.observe(time.perf_counter() - started, tool)
+            if "error" in response:
+                REQUEST_ERRORS.inc(tool)
+            if "id" in request:
+                response = {"jsonrpc": "2.0", "id": request["id"], **response}
+            await writer.write(response)
+        finally:
+            slots.release()
+
+    try:
+        while True:
+            try:
+                line = await reader.readline()
+            except ValueError:
+                # Line exceeded MAX_LINE_BYTES; skip it like any other unparseable input
+                continue
+            if not line:
+                break
+            try:
+                request = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if not isinstance(request, dict):
+                continue
+            await slots.acquire()
+            task = asyncio.ensure_future(dispatch(request))
+            in_flight.add(task)
+            task.add_done_callback(in_flight.discard)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if in_flight:
+            await asyncio.gather(*in_flight, return_exceptions=True)
+        await writer.close()
+        if metrics_server is not None:
+            metrics_server.close()
+
+
+async def send_notification(method: str, params: Dict[str, Any]):
+    """Send a JSON-RPC notification from inside a request handler (no-op when not serving stdio)"""
+    writer = _current_writer.get()
+    if writer is not None:
+        await writer.write({"jsonrpc": "2.0", "method": method, "params": params})
+
+
+async def report_progress(request_params: Dict[str, Any], progress: int, total: Optional[int] = None,
+                          message: Optional[str] = None):
+    """MCP notifications/progress for a request that asked for it with _meta.progressToken"""
+    token = (request_params.get("_meta") or {}).get("progressToken")
+    if token is None:
+        return
+    params: Dict[str, Any] = {"progressToken": token, "progress": progress}
+    if total is not None:
+        params["total"] = total
+    if message:
+        params["message"] = message
+    await send_notification("notifications/progress", params)
@@ -4,27 +4,48 @@ Target Configuration Service
 Central place to manage targets, ports, and configurations
 """
 
+import asyncio
+import csv
+import io
 import json
 import os
-from typing import Dict, List, Any, Optional
+import sqlite3
+import sys
+from typing import Dict, Iterable, Iterator, List, Any, Optional, Tuple
 from datetime import datetime
+from target_store import JsonTargetStore, TargetStore, open_target_store
+from port_spec import PortSpec
+from stdio_server import report_progress, serve_stdio
+from metrics import METRICS_TOOL, metrics_tool_result
+
+IMPORT_FORMATS = ("csv", "ndjson")
+# Column order for CSV export; other keys are kept by NDJSON only
+CSV_FIELDS = ["name", "ip", "ports", "description", "type", "tags", "created", "updated"]
+IMPORT_BATCH_SIZE = 5000
 
 class TargetManager:
-    def __init__(self, config_file: str = "/app/config/targets.json"):
+    def __init__(self, config_file: str = "/app/config/targets.json", backend: Optional[str] = None):
         self.config_file = config_file
-        self.targets = self._load_targets()
+        self.store = self._open_store(backend)
         
-    def _load_targets(self) -> Dict[str, Any]:
-        """Load targets from file"""
+    def _open_store(self, backend: Optional[str]) -> TargetStore:
+        """Open the storage backend (TARGET_STORE=json|sqlite), seeding defaults when empty"""
         try:
-            if os.path.exists(self.config_file):
-                with open(self.config_file, 'r') as f:
-                    return json.load(f)
-            else:
-                return self._create_default_config()
-        except Exception as e:
-            print(f"Error loading targets: {e}")
-            return self._create_default_config()
+            store = open_target_store(self.config_file, backend)
+        except (ValueError, OSError, sqlite3.Error) as e:
+            if backend or os.getenv("TARGET_STORE", "json").lower() != "json":
+                raise
+            # Unreadable targets.json: start over from defaults like before
+            print(f"Error loading targets: {e}", file=sys.stderr)
+            store = JsonTargetStore(self.config_file, load=False)
+        if store.is_empty():
+            store.import_data(self._create_default_config())
+        return store
+    
+    @property
+    def targets(self) -> Dict[str, Any]:
+        """Snapshot of all targets in the targets.json layout"""
+        return self.store.export_data()
     
     def _create_default_config(self) -> Dict[str, Any]:
         """Create default target configuration"""
@@ -57,80 +78,250 @@ class TargetManager:
         }
     
     def save_targets(self) -> bool:
-        """Save targets to file"""
-        try:
-            os.makedirs(os.path.dirname(self.config_file), exist_ok=True)
-            with open(self.config_file, 'w') as f:
-                json.dump(self.targets, f, indent=2)
-            return True
-        except Exception as e:
-            print(f"Error saving targets: {e}")
-            return False
+        """Save targets to storage"""
+        return self.store.save()
+    
+    def flush(self) -> bool:
+        """Write any deferred target changes to disk"""
+        return self.store.flush()
     
     def set_current_target(self, target_name: str) -> bool:
         """Set the current active target"""
-        if target_name in self.targets["targets"]:
-            self.targets["current_target"] = target_name
-            return self.save_targets()
+        if self.store.has_target(target_name):
+            return self.store.set_current_target(target_name)
         return False
     
     def get_current_target(self) -> Optional[Dict[str, Any]]:
         """Get current target configuration"""
-        current = self.targets.get("current_target")
-        if current and current in self.targets["targets"]:
-            return self.targets["targets"][current]
+        current = self.store.get_current_target()
+        if current:
+            return self.store.get_target(current)
         return None
     
+    def get_target(self, name: str) -> Optional[Dict[str, Any]]:
+        """Get one target configuration"""
+        return self.store.get_target(name)
+    
+    @staticmethod
+    def _normalize_ports(config: Dict[str, Any], key: str = "ports") -> Dict[str, Any]:
+        """Store port specs in compact canonical form; raises ValueError on a bad spec"""
+        if config.get(key):
+            config[key] = str(PortSpec.parse(config[key]))
+        return config
+    
     def add_target(self, name: str, config: Dict[str, Any]) -> bool:
         """Add new target"""
-        self.targets["targets"][name] = {
+        return self.store.put_target(name, self._normalize_ports({
             **config,
             "created": datetime.now().isoformat()
-        }
-        return self.save_targets()
+        }))
     
     def list_targets(self) -> List[Dict[str, Any]]:
         """List all targets"""
+        current = self.store.get_current_target()
         targets_list = []
-        for name, config in self.targets["targets"].items():
+        for name, config in self.store.list_targets():
             targets_list.append({
                 "name": name,
                 **config,
-                "is_current": name == self.targets.get("current_target")
+                "port_spec": self.get_ports(name, config),
+                "is_current": name == current
             })
         return targets_list
     
+    def get_ports(self, name: str, config: Optional[Dict[str, Any]] = None) -> PortSpec:
+        """Parsed port set of a target, falling back to global default_ports"""
+        if config is None:
+            config = self.store.get_target(name) or {}
+        spec = config.get("ports") or self.store.get_global_settings().get("default_ports")
+        try:
+            return PortSpec.parse(spec)
+        except ValueError:
+            # Hand-edited targets.json with a bad spec: list it without ports rather than fail
+            return PortSpec()
+    
+    def combine_ports(self, names: List[str], operation: str = "union") -> PortSpec:
+        """Union, intersection or difference (first minus the rest) of several targets' ports"""
+        specs = [self.get_ports(name) for name in names]
+        if operation == "union":
+            return PortSpec.union(specs)
+        if operation == "intersection":
+            return PortSpec.intersection(specs)
+        if operation == "difference":
+            return specs[0] - PortSpec.union(specs[1:]) if specs else PortSpec()
+        raise ValueError(f"Unknown port set operation: {operation}")
+    
+    def find_targets(self, ip: Optional[str] = None, target_type: Optional[str] = None,
+                     tag: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Find targets by ip, type and/or tag"""
+        return [{"name": name, **config} for name, config in self.store.find_targets(ip, target_type, tag)]
+    
     def delete_target(self, name: str) -> bool:
         """Delete a target"""
-        if name in self.targets["targets"]:
-            del self.targets["targets"][name]
+        if self.store.delete_target(name):
             # If this was current target, reset it
-            if self.targets.get("current_target") == name:
-                self.targets["current_target"] = list(self.targets["targets"].keys())[0] if self.targets["targets"] else None
-            return self.save_targets()
+            if self.store.get_current_target() == name:
+                self.store.set_current_target(self.store.first_target_name())
+            return True
         return False
     
     def update_target(self, name: str, updates: Dict[str, Any]) -> bool:
         """Update target configuration"""
-        if name in self.targets["targets"]:
-            self.targets["targets"][name].update(updates)
-            self.targets["targets"][name]["updated"] = datetime.now().isoformat()
-            return self.save_targets()
+        config = self.store.get_target(name)
+        if config is not None:
+            config.update(self._normalize_ports(dict(updates)))
+            config["updated"] = datetime.now().isoformat()
+            return self.store.put_target(name, config)
         return False
     
     def get_global_settings(self) -> Dict[str, Any]:
         """Get global settings"""
-        return self.targets.get("global_settings", {})
+        return self.store.get_global_settings()
     
     def update_global_settings(self, settings: Dict[str, Any]) -> bool:
         """Update global settings"""
-        self.targets["global_settings"].update(settings)
-        return self.save_targets()
+        settings = self._normalize_ports(dict(settings), "default_ports")
+        return self.store.set_global_settings({**self.store.get_global_settings(), **settings})
+    
+    def export_json(self, path: str) -> bool:
+        """Export all targets to a file in the targets.json layout"""
+        try:
+            with open(path, 'w') as f:
+                json.dump(self.store.export_data(), f, indent=2)
+            return True
+        except Exception as e:
+            print(f"Error exporting targets: {e}", file=sys.stderr)
+            return False
+    
+    def import_json(self, path: str) -> bool:
+        """Import targets from a file in the targets.json layout"""
+        try:
+            with open(path, 'r') as f:
+                return self.store.import_data(json.load(f))
+        except Exception as e:
+            print(f"Error importing targets: {e}", file=sys.stderr)
+            return False
+    
+    def _validate_row(self, row: Dict[str, Any], created: str) -> Tuple[str, Dict[str, Any]]:
+        """Turn one imported row into (name, config); raises ValueError describing the problem"""
+        config = {str(key).strip().lower(): value for key, value in row.items()
+                  if key is not None and value not in (None, "")}
+        name = str(config.pop("name", "")).strip()
+        if not name:
+            raise ValueError("missing name")
+        if not config.get("ip"):
+            raise ValueError("missing ip")
+        if isinstance(config.get("tags"), str):
+            # CSV cells carry tags as "web;prod"
+            config["tags"] = [tag.strip() for tag in config["tags"].split(";") if tag.strip()]
+        config.setdefault("created", created)
+        return name, self._normalize_ports(config)
+    
+    @staticmethod
+    def _read_rows(lines: Iterable[str], fmt: str) -> Iterator[Tuple[int, Any]]:
+        """Yield (line number, row dict or ValueError) without reading the whole input"""
+        if fmt == "csv":
+            reader = csv.DictReader(lines)
+            for row in reader:
+                if None in row:
+                    yield reader.line_num, ValueError("more cells than header columns")
+                else:
+                    yield reader.line_num, row
+        elif fmt == "ndjson":
+            for line_no, line in enumerate(lines, 1):
+                if not line.strip():
+                    continue
+                try:
+                    row = json.loads(line)
+                except json.JSONDecodeError as e:
+                    yield line_no, ValueError(f"invalid JSON: {e.msg}")
+                    continue
+                yield line_no, row if isinstance(row, dict) else ValueError("not a JSON object")
+        else:
+            raise ValueError(f"Unknown format '{fmt}', expected one of: {', '.join(IMPORT_FORMATS)}")
+    
+    def iter_import(self, lines: Iterable[str], fmt: str = "csv",
+                    batch_size: int = IMPORT_BATCH_SIZE) -> Iterator[Dict[str, Any]]:
+        """Validate and upsert rows in batches; yields running totals after each stored batch
+        
+        Every batch is one store.put_targets call, i.e. one transaction (SQLite) or
+        one write-behind save (JSON). Rows that fail validation are skipped and
+        listed in "errors" as (line, message).
+        """
+        stats: Dict[str, Any] = {"rows": 0, "imported": 0, "errors": [], "batches": 0}
+        created = datetime.now().isoformat()
+        batch: Dict[str, Dict[str, Any]] = {}
+        
+        def store_batch():
+            self.store.put_targets(list(batch.items()))
+            stats["imported"] += len(batch)
+            stats["batches"] += 1
+            batch.clear()
+        
+        for line_no, row in self._read_rows(lines, fmt):
+            stats["rows"] += 1
+            try:
+                if isinstance(row, Exception):
+                    raise row
+                name, config = self._validate_row(row, created)
+            except ValueError as e:
+                stats["errors"].append((line_no, str(e)))
+                continue
+            batch[name] = config
+            if len(batch) >= batch_size:
+                store_batch()
+                yield stats
+        if batch or not stats["batches"]:
+            if batch:
+                store_batch()
+            yield stats
+    
+    def import_rows(self, lines: Iterable[str], fmt: str = "csv",
+                    batch_size: int = IMPORT_BATCH_SIZE) -> Dict[str, Any]:
+        """Import a whole CSV/NDJSON stream; returns the final totals"""
+        stats: Dict[str, Any] = {}
+        for stats in self.iter_import(lines, fmt, batch_size):
+            pass
+        return stats
+    
+    def export_rows(self, fmt: str = "csv") -> Iterator[str]:
+        """Yield all targets as CSV or NDJSON lines (each ending in a newline)"""
+        if fmt not in IMPORT_FORMATS:
+            raise ValueError(f"Unknown format '{fmt}', expected one of: {', '.join(IMPORT_FORMATS)}")
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, CSV_FIELDS, extrasaction="ignore", lineterminator="\n")
+        if fmt == "csv":
+            writer.writeheader()
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+        for name, config in self.store.list_targets():
+            if fmt == "ndjson":
+                yield json.dumps({"name": name, **config}) + "\n"
+                continue
+            tags = config.get("tags")
+            writer.writerow({**config, "name": name,
+                             "tags": ";".join(map(str, tags)) if isinstance(tags, list) else tags})
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
 
 # For MCP integration
 class TargetConfigMCP:
     def __init__(self):
         self.manager = TargetManager()
+        # import_targets / export_targets only read and write files under this directory
+        self.transfer_dir = os.path.realpath(os.getenv(
+            "TARGET_TRANSFER_DIR", os.path.join(os.path.dirname(self.manager.config_file), "transfer")))
+
+    def _transfer_path(self, path: str) -> str:
+        """Resolve a caller's import/export `path` inside transfer_dir; raises ValueError if it points outside"""
+        if os.path.isabs(path):
+            raise ValueError(f"'path' must be relative to the transfer directory, got {path}")
+        resolved = os.path.realpath(os.path.join(self.transfer_dir, path))
+        if os.path.commonpath([resolved, self.transfer_dir]) != self.transfer_dir:
+            raise ValueError(f"'path' must stay inside the transfer directory, got {path}")
+        return resolved
     
     async def handle_request(self, request: Dict[str, Any]) -> Dict[str, Any]:
         """Handle MCP requests for target management"""
@@ -187,13 +378,59 @@ class TargetConfigMCP:
                             "properties": {
                                 "name": {"type": "string", "description": "Target name"},
                                 "ip": {"type": "string", "description": "Target IP address"},
-                                "ports": {"type": "string", "description": "Ports to scan"},
+                                "ports": {"type": "string", "description": "Ports to scan, e.g. 22,80,8000-8100,top100,web"},
                                 "description": {"type": "string", "description": "Target description"},
                                 "type": {"type": "string", "description": "Target type"}
                             },
                             "required": ["name", "ip"]
                         }
-                    }
+                    },
+                    {
+                        "name": "compare_ports",
+                        "description": "Union, intersection or difference of the port sets of several targets",
+                        "inputSchema": {
+                            "type": "object",
+                            "properties": {
+                                "targets": {
+                                    "type": "array",
+                                    "items": {"type": "string"},
+                                    "description": "Target names"
+                                },
+                                "operation": {
+                                    "type": "string",
+                                    "enum": ["union", "intersection", "difference"],
+                                    "description": "Set operation (difference: first target minus the others)"
+                                }
+                            },
+                            "required": ["targets"]
+                        }
+                    },
+                    {
+                        "name": "import_targets",
+                        "description": "Bulk add/update targets from CSV or NDJSON (columns: name, ip, ports, description, type, tags)",
+                        "inputSchema": {
+                            "type": "object",
+                            "properties": {
+                                "path": {"type": "string", "description": "File to read, relative to the service's transfer directory"},
+                                "data": {"type": "string", "description": "Inline CSV/NDJSON text (instead of path)"},
+                                "format": {"type": "string", "enum": list(IMPORT_FORMATS),
+                                           "description": "Input format (default: from file extension, else csv)"},
+                                "batch_size": {"type": "integer", "description": f"Rows per stored batch (default: {IMPORT_BATCH_SIZE})"}
+                            }
+                        }
+                    },
+                    {
+                        "name": "export_targets",
+                        "description": "Export all targets as CSV or NDJSON",
+                        "inputSchema": {
+                            "type": "object",
+                            "properties": {
+                                "path": {"type": "string", "description": "File to write, relative to the service's transfer directory (default: return inline)"},
+                                "format": {"type": "string", "enum": list(IMPORT_FORMATS), "description": "Output format (default: csv)"}
+                            }
+                        }
+                    },
+                    METRICS_TOOL
                 ]
             }
         }
@@ -220,7 +457,9 @@ class TargetConfigMCP:
                 output = "Configured targets:\n"
                 for target in targets:
                     marker = "🎯" if target["is_current"] else "  "
-                    output += f"{marker} {target['name']}: {target['ip']}:{target.get('ports', 'N/A')} - {target.get('description', 'No description')}\n"
+                    ports = target["port_spec"]
+                    port_text = f"{ports} ({len(ports)} ports)" if ports else "N/A"
+                    output += f"{marker} {target['name']}: {target['ip']}:{port_text} - {target.get('description', 'No description')}\n"
                 return {"result": {"content": [{"type": "text", "text": output}]}}
             
             elif tool_name == "add_target":
@@ -232,40 +471,88 @@ class TargetConfigMCP:
                 else:
                     return {"error": {"code": -32603, "message": "Failed to add target"}}
             
+            elif tool_name == "compare_ports":
+                names = arguments["targets"]
+                missing = [name for name in names if self.manager.get_target(name) is None]
+                if missing:
+                    return {"error": {"code": -32602, "message": f"Unknown targets: {', '.join(missing)}"}}
+                operation = arguments.get("operation", "union")
+                ports = self.manager.combine_ports(names, operation)
+                text = f"{operation.capitalize()} of {', '.join(names)}: {ports or 'no ports'} ({len(ports)} ports)"
+                return {"result": {"content": [{"type": "text", "text": text}]}}
+            
+            elif tool_name == "import_targets":
+                return await self._import_targets(arguments, params)
+            
+            elif tool_name == "export_targets":
+                return self._export_targets(arguments)
+            
+            elif tool_name == "get_metrics":
+                return metrics_tool_result(arguments)
+            
             else:
                 return {"error": {"code": -32602, "message": f"Tool '{tool_name}' not found"}}
                 
         except Exception as e:
             return {"error": {"code": -32603, "message": f"Tool execution failed: {str(e)}"}}
 
-if __name__ == "__main__":
-    import asyncio
-    import sys
-    import json
+    async def _import_targets(self, arguments: Dict[str, Any], params: Dict[str, Any]) -> Dict[str, Any]:
+        """Stream rows into the store batch by batch, sending MCP progress between batches"""
+        path = arguments.get("path")
+        if not path and "data" not in arguments:
+            return {"error": {"code": -32602, "message": "Provide 'path' or 'data'"}}
+        if path:
+            try:
+                path = self._transfer_path(path)
+            except ValueError as e:
+                return {"error": {"code": -32602, "message": str(e)}}
+        fmt = (arguments.get("format") or ("ndjson" if str(path).endswith((".ndjson", ".jsonl")) else "csv")).lower()
+        batch_size = max(1, int(arguments.get("batch_size") or IMPORT_BATCH_SIZE))
+        source = open(path, 'r', newline='') if path else io.StringIO(arguments["data"], newline='')
+        stats: Dict[str, Any] = {}
+        with source:
+            for stats in self.manager.iter_import(source, fmt, batch_size):
+                await report_progress(params, stats["rows"],
+                                      message=f"{stats['imported']} imported, {len(stats['errors'])} rejected")
+                print(f"Import: {stats['rows']} rows, {stats['imported']} imported", file=sys.stderr)
+                # Let other requests run between batches
+                await asyncio.sleep(0)
+        errors = stats["errors"]
+        output = (f"Imported {stats['imported']} targets from {stats['rows']} rows "
+                  f"in {stats['batches']} batches, {len(errors)} rejected")
+        for line_no, message in errors[:20]:
+            output += f"\n  line {line_no}: {message}"
+        if len(errors) > 20:
+            output += f"\n  ... and {len(errors) - 20} more"
+        return {"result": {"content": [{"type": "text", "text": output}]}}
     
+    def _export_targets(self, arguments: Dict[str, Any]) -> Dict[str, Any]:
+        fmt = (arguments.get("format") or "csv").lower()
+        lines = self.manager.export_rows(fmt)
+        name = arguments.get("path")
+        if not name:
+            return {"result": {"content": [{"type": "text", "text": "".join(lines)}]}}
+        try:
+            path = self._transfer_path(name)
+        except ValueError as e:
+            return {"error": {"code": -32602, "message": str(e)}}
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        count = 0
+        with open(path, 'w', newline='') as f:
+            for line in lines:
+                f.write(line)
+                count += 1
+        count -= 1 if fmt == "csv" else 0
+        return {"result": {"content": [{"type": "text", "text": f"Exported {count} targets to {name}"}]}}
+
+if __name__ == "__main__":
     server = TargetConfigMCP()
     
     async def run_stdio_server():
         print("Target Config MCP Server started on stdio", file=sys.stderr)
-        
-        while True:
-            try:
-                line = sys.stdin.readline()
-                if not line:
-                    break
-                
-                request = json.loads(line.strip())
-                response = await server.handle_request(request)
-                
-                print(json.dumps(response))
-                sys.stdout.flush()
-                
-            except json.JSONDecodeError:
-                continue
-            except KeyboardInterrupt:
-                break
-            except Exception as e:
-                print(json.dumps({"error": {"code": -32603, "message": str(e)}}))
-                sys.stdout.flush()
+        try:
+            await serve_stdio(server.handle_request)
+        finally:
+            server.manager.flush()
     
     asyncio.run(run_stdio_server())
\ No newline at end of file
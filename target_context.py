@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+"""
+Target Context
+Active target and scan defaults kept per guild, channel and user, each falling
+back to the wider scope, so teams in different channels don't overwrite each other
+"""
+
+import asyncio
+import os
+import sys
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from shared_state import SharedState
+
+# Most specific first; a lookup takes each field from the first scope that sets it
+SCOPES = ("user", "channel", "guild", "global")
+SCOPE_FLAGS = {"--me": "user", "--channel": "channel", "--guild": "guild"}
+NAMESPACE = "target_context"
+
+
+def scope_key(scope: str, guild_id: str = "", channel_id: str = "", user_id: str = "") -> str:
+    if scope == "user":
+        return f"user:{guild_id}:{channel_id}:{user_id}"
+    if scope == "channel":
+        return f"channel:{guild_id}:{channel_id}"
+    if scope == "guild":
+        return f"guild:{guild_id}"
+    if scope == "global":
+        return "global"
+    raise ValueError(f"Unknown context scope: {scope}")
+
+
+def split_scope_flags(args: List[str], default: str = "channel") -> Tuple[str, List[str]]:
+    """`--me` / `--channel` / `--guild` anywhere in the arguments -> (scope, remaining arguments)"""
+    scope = default
+    rest = []
+    for arg in args:
+        if arg.lower() in SCOPE_FLAGS:
+            scope = SCOPE_FLAGS[arg.lower()]
+        else:
+            rest.append(arg)
+    return scope, rest
+
+
+class TargetContextStore:
+    """Keyed context entries (a small dict of fields each) with LRU eviction and lazy persistence
+
+    Entries are loaded from the shared state on first use and kept in memory
+    for `ttl` seconds, including "nothing set here" so repeated fallbacks cost
+    no database reads; after that the next lookup reloads them, so a change
+    made by another shard shows up within `ttl`. Entries with unsaved local
+    changes are never reloaded over. At most `max_entries` are held (least
+    recently used go first). Changes are
+    written in one batch `window` seconds after the first one (immediately
+    without a running loop or with window <= 0), and a changed entry that is
+    evicted before then is written on the way out.
+    """
+
+    def __init__(self, state: Optional[SharedState] = None, max_entries: Optional[int] = None,
+                 window: Optional[float] = None, ttl: Optional[float] = None):
+        self.state = state
+        self.max_entries = int(max_entries or os.getenv("TARGET_CONTEXT_SIZE", "4096"))
+        self.ttl = float(ttl if ttl is not None else os.getenv("TARGET_CONTEXT_TTL", "5"))
+        self.window = float(window if window is not None else os.getenv("PERSIST_WINDOW", "0.5"))
+        self.hits = 0
+        self.loads = 0
+        self.writes = 0
+        self._entries: "OrderedDict[str, Optional[Dict[str, Any]]]" = OrderedDict()
+        # key -> time.monotonic() when the entry was loaded or last set here
+        self._fresh: Dict[str, float] = {}
+        self._dirty: Set[str] = set()
+        self._handle: Optional[asyncio.TimerHandle] = None
+
+    def _chain(self, guild_id: str, channel_id: str, user_id: str) -> List[Tuple[str, str]]:
+        """(scope, key) pairs a lookup walks; scopes whose ids are unknown are skipped"""
+        chain = []
+        if channel_id and user_id:
+            chain.append(("user", scope_key("user", guild_id, channel_id, user_id)))
+        if channel_id:
+            chain.append(("channel", scope_key("channel", guild_id, channel_id)))
+        if guild_id:
+            chain.append(("guild", scope_key("guild", guild_id)))
+        chain.append(("global", "global"))
+        return chain
+
+    def _entry(self, key: str) -> Optional[Dict[str, Any]]:
+        if key in self._entries and (self.state is None or key in self._dirty
+                                     or time.monotonic() - self._fresh[key] < self.ttl):
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return self._entries[key]
+        self.loads += 1
+        entry = self.state.get(NAMESPACE, key) if self.state is not None else None
+        self._remember(key, entry)
+        return entry
+
+    def _remember(self, key: str, entry: Optional[Dict[str, Any]]):
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        self._fresh[key] = time.monotonic()
+        while len(self._entries) > self.max_entries:
+            old_key, old_entry = self._entries.popitem(last=False)
+            del self._fresh[old_key]
+            if old_key in self._dirty:
+                # Written before it is forgotten so the next load sees it
+                self._dirty.discard(old_key)
+                self._write({old_key: old_entry})
+
+    def get(self, field: str, guild_id: str = "", channel_id: str = "", user_id: str = "",
+            default: Any = None) -> Any:
+        """A field's value from the most specific scope that sets it"""
+        for _, key in self._chain(guild_id, channel_id, user_id):
+            entry = self._entry(key)
+            if entry and field in entry:
+                return entry[field]
+        return default
+
+    def resolve(self, guild_id: str = "", channel_id: str = "", user_id: str = "") -> Dict[str, Tuple[Any, str]]:
+        """Every field in effect here as field -> (value, scope it came from)"""
+        resolved: Dict[str, Tuple[Any, str]] = {}
+        for scope, key in self._chain(guild_id, channel_id, user_id):
+            for field, value in (self._entry(key) or {}).items():
+                resolved.setdefault(field, (value, scope))
+        return resolved
+
+    def set(self, scope: str, guild_id: str = "", channel_id: str = "", user_id: str = "", **values: Any):
+        """Set fields at one scope; a None value clears the field there"""
+        key = scope_key(scope, guild_id, channel_id, user_id)
+        entry = dict(self._entry(key) or {})
+        for field, value in values.items():
+            if value is None:
+                entry.pop(field, None)
+            else:
+                entry[field] = value
+        self._remember(key, entry or None)
+        if self.state is None:
+            return
+        self._dirty.add(key)
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            loop = None
+        if loop is None or self.window <= 0:
+            self.flush()
+        elif self._handle is None:
+            self._handle = loop.call_later(self.window, self.flush)
+
+    def _write(self, batch: Dict[str, Optional[Dict[str, Any]]]):
+        def failed(error: BaseException):
+            # stderr: stdout carries the protocol when this runs inside an MCP stdio server
+            print(f"Saving target context failed: {error}", file=sys.stderr)
+            # Keep what is still in memory pending so the next flush retries it
+            self._dirty.update(key for key in batch if key in self._entries)
+
+        # Runs on the shared state's writer thread; the loop only queues it
+        self.state.write(self.state.set_many, NAMESPACE, batch, on_error=failed)
+        self.writes += len(batch)
+
+    def flush(self):
+        """Write pending changes now (timer callback and shutdown hook)"""
+        if self._handle is not None:
+            self._handle.cancel()
+            self._handle = None
+        if not self._dirty:
+            return
+        batch = {key: self._entries.get(key) for key in self._dirty}
+        self._dirty = set()
+        self._write(batch)
+
+    def stats(self) -> Dict[str, int]:
+        return {"entries": len(self._entries), "pending": len(self._dirty), "hits": self.hits,
+                "loads": self.loads, "writes": self.writes}
@@ -0,0 +1,322 @@
+#!/usr/bin/env python3
+"""
+Target Storage Backends
+JSON file (default, original targets.json layout) and indexed SQLite storage for TargetManager
+"""
+
+import copy
+import json
+import os
+import sqlite3
+from typing import Dict, List, Any, Optional, Tuple
+from write_behind import WriteBehindFile
+
+
+class TargetStore:
+    """Storage backend interface used by TargetManager"""
+
+    def get_current_target(self) -> Optional[str]:
+        raise NotImplementedError
+
+    def set_current_target(self, name: Optional[str]) -> bool:
+        raise NotImplementedError
+
+    def get_target(self, name: str) -> Optional[Dict[str, Any]]:
+        raise NotImplementedError
+
+    def has_target(self, name: str) -> bool:
+        return self.get_target(name) is not None
+
+    def list_targets(self) -> List[Tuple[str, Dict[str, Any]]]:
+        raise NotImplementedError
+
+    def first_target_name(self) -> Optional[str]:
+        targets = self.list_targets()
+        return targets[0][0] if targets else None
+
+    def put_target(self, name: str, config: Dict[str, Any]) -> bool:
+        """Insert or replace one target"""
+        raise NotImplementedError
+
+    def put_targets(self, targets: List[Tuple[str, Dict[str, Any]]]) -> bool:
+        """Insert or replace many targets with a single persistence step"""
+        return all([self.put_target(name, config) for name, config in targets])
+
+    def delete_target(self, name: str) -> bool:
+        raise NotImplementedError
+
+    def find_targets(self, ip: Optional[str] = None, target_type: Optional[str] = None,
+                     tag: Optional[str] = None) -> List[Tuple[str, Dict[str, Any]]]:
+        """Targets matching every given filter"""
+        matches = []
+        for name, config in self.list_targets():
+            if ip is not None and config.get("ip") != ip:
+                continue
+            if target_type is not None and config.get("type") != target_type:
+                continue
+            if tag is not None and tag not in config.get("tags", []):
+                continue
+            matches.append((name, config))
+        return matches
+
+    def get_global_settings(self) -> Dict[str, Any]:
+        raise NotImplementedError
+
+    def set_global_settings(self, settings: Dict[str, Any]) -> bool:
+        raise NotImplementedError
+
+    def export_data(self) -> Dict[str, Any]:
+        """Whole store in the targets.json layout"""
+        return {
+            "current_target": self.get_current_target(),
+            "targets": {name: config for name, config in self.list_targets()},
+            "global_settings": self.get_global_settings()
+        }
+
+    def import_data(self, data: Dict[str, Any]) -> bool:
+        """Load a targets.json-layout dict, adding to or replacing existing targets"""
+        raise NotImplementedError
+
+    def is_empty(self) -> bool:
+        return not self.list_targets() and not self.get_global_settings()
+
+    def save(self) -> bool:
+        """Persist pending changes; backends that write per change just return True"""
+        return True
+
+    def flush(self) -> bool:
+        """Force any deferred writes to disk"""
+        return True
+
+    def close(self):
+        self.flush()
+
+
+class JsonTargetStore(TargetStore):
+    """The original layout: everything in one JSON document, saved through a write-behind writer"""
+
+    def __init__(self, config_file: str, load: bool = True):
+        self.config_file = config_file
+        self.data: Dict[str, Any] = {"current_target": None, "targets": {}, "global_settings": {}}
+        if load and os.path.exists(self.config_file):
+            with open(self.config_file, 'r') as f:
+                self.data = json.load(f)
+            self.data.setdefault("targets", {})
+            self.data.setdefault("global_settings", {})
+        self.writer = WriteBehindFile(self.config_file, lambda: self.data)
+
+    def save(self) -> bool:
+        return self.writer.mark_dirty()
+
+    def flush(self) -> bool:
+        return self.writer.flush()
+
+    def get_current_target(self) -> Optional[str]:
+        return self.data.get("current_target")
+
+    def set_current_target(self, name: Optional[str]) -> bool:
+        self.data["current_target"] = name
+        return self.save()
+
+    def get_target(self, name: str) -> Optional[Dict[str, Any]]:
+        return self.data["targets"].get(name)
+
+    def list_targets(self) -> List[Tuple[str, Dict[str, Any]]]:
+        return list(self.data["targets"].items())
+
+    def first_target_name(self) -> Optional[str]:
+        return next(iter(self.data["targets"]), None)
+
+    def put_target(self, name: str, config: Dict[str, Any]) -> bool:
+        self.data["targets"][name] = config
+        return self.save()
+
+    def put_targets(self, targets: List[Tuple[str, Dict[str, Any]]]) -> bool:
+        self.data["targets"].update(targets)
+        return self.save()
+
+    def delete_target(self, name: str) -> bool:
+        if name not in self.data["targets"]:
+            return False
+        del self.data["targets"][name]
+        return self.save()
+
+    def get_global_settings(self) -> Dict[str, Any]:
+        return self.data.get("global_settings", {})
+
+    def set_global_settings(self, settings: Dict[str, Any]) -> bool:
+        self.data["global_settings"] = settings
+        return self.save()
+
+    def export_data(self) -> Dict[str, Any]:
+        return copy.deepcopy(self.data)
+
+    def import_data(self, data: Dict[str, Any]) -> bool:
+        self.data["targets"].update(data.get("targets", {}))
+        if data.get("global_settings"):
+            self.data["global_settings"] = data["global_settings"]
+        if data.get("current_target"):
+            self.data["current_target"] = data["current_target"]
+        return self.save()
+
+
+class SqliteTargetStore(TargetStore):
+    """SQLite (WAL) storage with one row per target and indexes on name, ip, type and tags"""
+
+    def __init__(self, db_file: str):
+        self.db_file = db_file
+        os.makedirs(os.path.dirname(self.db_file) or ".", exist_ok=True)
+        self.db = sqlite3.connect(self.db_file)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        # Same durability knob as the JSON writer: none -> OFF, fsync -> NORMAL, full -> FULL
+        synchronous = {"none": "OFF", "fsync": "NORMAL", "full": "FULL"}.get(
+            os.getenv("PERSIST_DURABILITY", "fsync").lower(), "NORMAL")
+        self.db.execute(f"PRAGMA synchronous={synchronous}")
+        self.db.execute("PRAGMA foreign_keys=ON")
+        self.db.executescript("""
+            CREATE TABLE IF NOT EXISTS meta (
+                key TEXT PRIMARY KEY,
+                value TEXT
+            );
+            CREATE TABLE IF NOT EXISTS targets (
+                name TEXT PRIMARY KEY,
+                ip TEXT,
+                type TEXT,
+                config TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS target_tags (
+                name TEXT NOT NULL REFERENCES targets(name) ON DELETE CASCADE,
+                tag TEXT NOT NULL,
+                PRIMARY KEY (name, tag)
+            );
+            CREATE INDEX IF NOT EXISTS idx_targets_ip ON targets(ip);
+            CREATE INDEX IF NOT EXISTS idx_targets_type ON targets(type);
+            CREATE INDEX IF NOT EXISTS idx_target_tags_tag ON target_tags(tag);
+        """)
+        self.db.commit()
+
+    def _get_meta(self, key: str) -> Any:
+        row = self.db.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def _set_meta(self, key: str, value: Any):
+        self.db.execute("INSERT INTO meta (key, value) VALUES (?, ?) "
+                        "ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+                        (key, json.dumps(value)))
+
+    def _write_target(self, name: str, config: Dict[str, Any]):
+        """Upsert one row and its tags without committing"""
+        self.db.execute(
+            "INSERT INTO targets (name, ip, type, config) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT(name) DO UPDATE SET ip = excluded.ip, type = excluded.type, config = excluded.config",
+            (name, config.get("ip"), config.get("type"), json.dumps(config)))
+        self.db.execute("DELETE FROM target_tags WHERE name = ?", (name,))
+        tags = config.get("tags") or []
+        if isinstance(tags, list):
+            self.db.executemany("INSERT OR IGNORE INTO target_tags (name, tag) VALUES (?, ?)",
+                                [(name, str(tag)) for tag in tags])
+
+    def get_current_target(self) -> Optional[str]:
+        return self._get_meta("current_target")
+
+    def set_current_target(self, name: Optional[str]) -> bool:
+        with self.db:
+            self._set_meta("current_target", name)
+        return True
+
+    def get_target(self, name: str) -> Optional[Dict[str, Any]]:
+        row = self.db.execute("SELECT config FROM targets WHERE name = ?", (name,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def has_target(self, name: str) -> bool:
+        return self.db.execute("SELECT 1 FROM targets WHERE name = ?", (name,)).fetchone() is not None
+
+    def list_targets(self) -> List[Tuple[str, Dict[str, Any]]]:
+        return [(name, json.loads(config))
+                for name, config in self.db.execute("SELECT name, config FROM targets ORDER BY rowid")]
+
+    def put_target(self, name: str, config: Dict[str, Any]) -> bool:
+        with self.db:
+            self._write_target(name, config)
+        return True
+
+    def put_targets(self, targets: List[Tuple[str, Dict[str, Any]]]) -> bool:
+        # One transaction and one statement per table for the whole batch
+        with self.db:
+            self.db.executemany(
+                "INSERT INTO targets (name, ip, type, config) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(name) DO UPDATE SET ip = excluded.ip, type = excluded.type, config = excluded.config",
+                [(name, config.get("ip"), config.get("type"), json.dumps(config)) for name, config in targets])
+            self.db.executemany("DELETE FROM target_tags WHERE name = ?", [(name,) for name, _ in targets])
+            self.db.executemany("INSERT OR IGNORE INTO target_tags (name, tag) VALUES (?, ?)",
+                                [(name, str(tag)) for name, config in targets
+                                 if isinstance(config.get("tags"), list) for tag in config["tags"]])
+        return True
+
+    def delete_target(self, name: str) -> bool:
+        with self.db:
+            deleted = self.db.execute("DELETE FROM targets WHERE name = ?", (name,)).rowcount
+        return deleted > 0
+
+    def first_target_name(self) -> Optional[str]:
+        row = self.db.execute("SELECT name FROM targets ORDER BY rowid LIMIT 1").fetchone()
+        return row[0] if row else None
+
+    def find_targets(self, ip: Optional[str] = None, target_type: Optional[str] = None,
+                     tag: Optional[str] = None) -> List[Tuple[str, Dict[str, Any]]]:
+        query = "SELECT t.name, t.config FROM targets t"
+        clauses, params = [], []
+        if tag is not None:
+            query += " JOIN target_tags g ON g.name = t.name AND g.tag = ?"
+            params.append(tag)
+        if ip is not None:
+            clauses.append("t.ip = ?")
+            params.append(ip)
+        if target_type is not None:
+            clauses.append("t.type = ?")
+            params.append(target_type)
+        if clauses:
+            query += " WHERE " + " AND ".join(clauses)
+        query += " ORDER BY t.rowid"
+        return [(name, json.loads(config)) for name, config in self.db.execute(query, params)]
+
+    def get_global_settings(self) -> Dict[str, Any]:
+        return self._get_meta("global_settings") or {}
+
+    def set_global_settings(self, settings: Dict[str, Any]) -> bool:
+        with self.db:
+            self._set_meta("global_settings", settings)
+        return True
+
+    def import_data(self, data: Dict[str, Any]) -> bool:
+        with self.db:
+            for name, config in data.get("targets", {}).items():
+                self._write_target(name, config)
+            if data.get("global_settings"):
+                self._set_meta("global_settings", data["global_settings"])
+            if data.get("current_target"):
+                self._set_meta("current_target", data["current_target"])
+        return True
+
+    def is_empty(self) -> bool:
+        return (self.db.execute("SELECT 1 FROM targets LIMIT 1").fetchone() is None
+                and self.db.execute("SELECT 1 FROM meta LIMIT 1").fetchone() is None)
+
+    def close(self):
+        self.db.close()
+
+
+def open_target_store(config_file: str, backend: Optional[str] = None) -> TargetStore:
+    """Open the backend selected by `backend` or TARGET_STORE (json | sqlite)"""
+    backend = (backend or os.getenv("TARGET_STORE", "json")).lower()
+    if backend == "sqlite":
+        db_file = os.getenv("TARGET_DB") or os.path.splitext(config_file)[0] + ".db"
+        store = SqliteTargetStore(db_file)
+        # First start on SQLite: carry over an existing targets.json
+        if store.is_empty() and os.path.exists(config_file):
+            with open(config_file, 'r') as f:
+                store.import_data(json.load(f))
+        return store
+    if backend == "json":
+        return JsonTargetStore(config_file)
+    raise ValueError(f"Unknown target store backend: {backend}")
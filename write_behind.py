@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+Write-Behind Persistence
+Coalesced, atomic (temp file + fsync + rename) JSON saves for config and target files
+"""
+
+import asyncio
+import atexit
+import json
+import os
+import sys
+import tempfile
+import threading
+import weakref
+from typing import Any, Callable, Optional, Tuple
+
+from metrics import counter, histogram
+
+# none: rename only; fsync: fsync the file before rename; full: also fsync the directory after
+DURABILITY_MODES = ("none", "fsync", "full")
+
+_writers: "weakref.WeakSet[WriteBehindFile]" = weakref.WeakSet()
+
+WRITE_SECONDS = histogram("persist_write_seconds", "Atomic JSON save time (serialize excluded)", ("file",))
+COALESCED = counter("persist_coalesced_total", "Saves merged into an already pending write", ("file",))
+
+
+def atomic_write_text(path: str, text: str, durability: str = "fsync"):
+    """Replace `path` with `text` so readers see either the old or the new file, never a partial one"""
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=f".{os.path.basename(path)}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, 'w') as f:
+            f.write(text)
+            f.flush()
+            if durability != "none":
+                os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+    if durability == "full":
+        dir_fd = os.open(directory, os.O_RDONLY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+
+
+class WriteBehindFile:
+    """One JSON file whose saves within `window` seconds collapse into a single atomic write
+
+    mark_dirty() is called after every change. Inside a running event loop the
+    write is scheduled `window` seconds later; the snapshot is serialized on the
+    loop thread (so it is consistent) and the disk write runs in an executor.
+    Without a running loop, or with window <= 0, the write happens immediately.
+    A failed background write is retried after `window`, doubling up to
+    MAX_RETRY_DELAY seconds while it keeps failing.
+    """
+
+    MAX_RETRY_DELAY = 30.0
+
+    def __init__(self, path: str, snapshot: Callable[[], Any], window: Optional[float] = None,
+                 durability: Optional[str] = None, indent: Optional[int] = 2):
+        self.path = path
+        self.snapshot = snapshot
+        self.window = float(window if window is not None else os.getenv("PERSIST_WINDOW", "0.5"))
+        self.durability = (durability or os.getenv("PERSIST_DURABILITY", "fsync")).lower()
+        if self.durability not in DURABILITY_MODES:
+            raise ValueError(f"Unknown durability mode: {self.durability}")
+        self.indent = indent
+        self.writes = 0
+        self.coalesced = 0
+        self._dirty = False
+        self._handle: Optional[asyncio.TimerHandle] = None
+        self._retry_delay = 0.0
+        self._sequence = 0
+        self._written_sequence = 0
+        self._write_lock = threading.Lock()
+        _writers.add(self)
+
+    def _serialize(self) -> Tuple[int, str]:
+        self._dirty = False
+        self._sequence += 1
+        return self._sequence, json.dumps(self.snapshot(), indent=self.indent)
+
+    def _write(self, sequence: int, text: str):
+        with self._write_lock:
+            # A newer snapshot already landed (sync flush raced a background write)
+            if sequence <= self._written_sequence:
+                return
+            with WRITE_SECONDS.time(os.path.basename(self.path)):
+                atomic_write_text(self.path, text, self.durability)
+            self._written_sequence = sequence
+            self.writes += 1
+
+    def mark_dirty(self) -> bool:
+        """Record a change; returns False only when an immediate write failed"""
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            loop = None
+        if loop is None or self.window <= 0:
+            self._dirty = True
+            return self.flush()
+        if self._handle is not None:
+            # A write is already scheduled and will pick this change up
+            self.coalesced += 1
+            COALESCED.inc(os.path.basename(self.path))
+            return True
+        self._dirty = True
+        self._handle = loop.call_later(self.window, self._flush_in_background, loop)
+        return True
+
+    def _flush_in_background(self, loop: asyncio.AbstractEventLoop):
+        self._handle = None
+        if not self._dirty:
+            return
+        sequence, text = self._serialize()
+        future = loop.run_in_executor(None, self._write, sequence, text)
+        future.add_done_callback(lambda done: self._report_failure(done, loop))
+
+    def _report_failure(self, future: "asyncio.Future", loop: asyncio.AbstractEventLoop):
+        if future.cancelled():
+            return
+        if future.exception() is None:
+            self._retry_delay = 0.0
+            return
+        # stderr: stdout carries the protocol when this runs inside an MCP stdio server
+        print(f"Error saving {self.path}: {future.exception()}", file=sys.stderr)
+        # Keep the change pending and retry it, backing off while the disk keeps failing
+        self._dirty = True
+        self._retry_delay = min(self.MAX_RETRY_DELAY, max(self.window, self._retry_delay * 2))
+        if self._handle is None and not loop.is_closed():
+            self._handle = loop.call_later(self._retry_delay, self._flush_in_background, loop)
+
+    def flush(self) -> bool:
+        """Write any pending change now (shutdown hook and write-through path)"""
+        if self._handle is not None:
+            self._handle.cancel()
+            self._handle = None
+        if not self._dirty:
+            return True
+        try:
+            self._write(*self._serialize())
+            return True
+        except Exception as e:
+            print(f"Error saving {self.path}: {e}", file=sys.stderr)
+            self._dirty = True
+            return False
+
+
+def flush_all() -> bool:
+    """Flush every write-behind file in the process; call on shutdown"""
+    return all([writer.flush() for writer in list(_writers)])
+
+
+atexit.register(flush_all)